@@ -11,7 +11,8 @@ through the `AmiraFile` class which automatically handles both `AmiraMesh` and
 
 The only required argument is the name of the file to be read. By default, data streams
 are loaded but can be turned off (for quick reading) by
-setting `load_stream=False`. Additional `kwargs` are passed to the `AmiraHeader` class
+setting `load_stream=False` or deferred until the `data` of each stream is accessed by
+setting `load_streams='lazy'`. Additional `kwargs` are passed to the `AmiraHeader` class
 call.
 
 There is a `read` method which (if data streams have not yet been read) will read
@@ -20,19 +21,31 @@ the data streams.
 An `AmiraFile` object may be printed to view the hierarchy of entities above or
 passed to `repr` to view the instatiation call that represents it.
 
+Many files are opened on a pool of worker processes by `open_many` which yields the
+result for each file as soon as it is done.
+
+The `peek` function reads only the essentials of a header (file type, format, arrays,
+data streams and materials) for cataloguing many files quickly.
+
 """
 
+import itertools
+import multiprocessing
 import sys
 
-from .core import Block
-from .data_stream import set_data_stream
-from .header import AmiraHeader
+from . import grammar
+from .core import Block, _str
+from .data_stream import load_data_streams, set_data_stream
+from .header import AmiraHeader, peek
+from .source import is_path, open_source
 
 if sys.version_info[0] > 2:
+    import queue
     from shutil import get_terminal_size
 
     _get_terminal_size = get_terminal_size
 else:
+    import Queue as queue
     from backports.shutil_get_terminal_size import get_terminal_size
 
     _get_terminal_size = get_terminal_size
@@ -42,9 +55,10 @@ WIDTH = _get_terminal_size().columns
 
 class AmiraFile(Block):
     """Main entry point for working with Amira files"""
-    __slots__ = ('_fn', '_load_streams', '_meta' '_header', '_data_streams')
+    __slots__ = ('_fn', '_load_streams', '_meta' '_header', '_data_streams', '_source', '_owns_source', '_reopens_source',
+                 '_workers')
 
-    def __init__(self, fn, load_streams=True, *args, **kwargs):
+    def __init__(self, fn, load_streams=True, streams=None, workers=None, *args, **kwargs):
         """Initialise a new AmiraFile object given the Amira file.
 
         Passes additional args/kwargs to AmiraHeader class for initialisation of the reading process
@@ -55,15 +69,85 @@ class AmiraFile(Block):
             af = AmiraFile('file.am')
             print(af)
 
-        :param str fn: Amira file name
-        :param bool load_streams: whether (default) or not to load data streams
+        The file is kept open for reading data streams until ``close()`` is called, the object is garbage
+        collected or, when used as a context manager, the ``with`` block is left. A file opened by name is
+        closed as soon as its data streams have been read (unless ``load_streams='lazy'``) and opened
+        again by name for any later reads:
+
+        .. code:: python
+
+            with AmiraFile('file.am', load_streams='lazy') as af:
+                labels = af.data_streams.Labels.data
+
+        Uncompressed binary data streams can be memory-mapped instead of read into memory
+        by passing ``mmap=True`` and the parsed header can be kept on disk for re-opening the
+        file by passing ``cache=True`` or ``cache='<directory>'``; both are forwarded to the AmiraHeader.
+        Passing ``stream_index=True`` as well indexes HxZip and HxByteRLE data streams so that slices and
+        regions are decoded from the nearest access point instead of from the start of the stream:
+
+        .. code:: python
+
+            with AmiraFile('file.am', load_streams='lazy', cache=True, stream_index=True) as af:
+                slice1900 = af.data_streams.Data.read_region(z=slice(1900, 1901))
+
+        Files with many data streams are read faster by decoding the streams concurrently on
+        a pool of ``workers`` threads; the data streams are attached in the order of the file regardless:
+
+        .. code:: python
+
+            af = AmiraFile('tetramesh.am', workers=8)
+
+        :param fn: Amira file name, a seekable binary file-like object (e.g. ``io.BytesIO``, an open file)
+            or the file content in a buffer (e.g. ``bytes``, ``memoryview``, ``mmap.mmap``); gzip, bzip2
+            and xz compressed files (e.g. ``file.am.gz``) are decompressed as they are read
+        :param load_streams: whether (``True``; default) or not (``False``) to load data streams or
+            ``'lazy'`` to read and decode each data stream on first access to its ``data`` attribute
+        :param list streams: names and/or indices of the AmiraMesh data streams to load (or a single name or
+            index); the remaining data streams are attached without their data [default: None i.e. all data streams]
+        :param int workers: the number of threads on which to read and decode AmiraMesh data streams
+            concurrently or to parse a single large ASCII data stream [default: None i.e. one data stream
+            after the other]
+
+        Further keyword arguments are passed to `AmiraHeader` e.g. ``native_endian=True`` to convert binary
+        data in the other byte order to the native byte order as it is decoded.
         """
-        super(AmiraFile, self).__init__(fn)
-        self._fn = fn
+        try:
+            assert load_streams in (True, False, 'lazy')
+        except AssertionError:
+            raise ValueError("load_streams must be True, False or 'lazy'")
+        try:
+            assert workers is None or int(workers) >= 1
+        except AssertionError:
+            raise ValueError("workers must be a positive integer")
+        self._workers = workers
+        if isinstance(streams, (str, _str, int)):
+            # a single data stream name or index
+            streams = [streams]
+        if streams is not None:
+            try:
+                streams = list(streams)
+                assert all(isinstance(stream, (str, _str, int)) and not isinstance(stream, bool) for stream in streams)
+            except (AssertionError, TypeError):
+                raise ValueError("streams must be a data stream name or index or a list of them")
+        # a single open file shared by the header and all data streams
+        self._source = open_source(fn)
+        self._owns_source = self._source is not fn
+        self._reopens_source = self._owns_source and is_path(fn)
+        # in-memory data and file-like objects have no file name
+        self._fn = self._source.name
+        super(AmiraFile, self).__init__(self._fn if self._fn is not None else '<{}>'.format(type(fn).__name__))
         self._load_streams = load_streams
+        self._streams = streams
         self._streams_loaded = False
+        try:
+            self._load(*args, **kwargs)
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self, *args, **kwargs):
         # the header contains a lot of information relied on for reading streams
-        self._header = AmiraHeader(fn, load_streams=load_streams, *args, **kwargs)
+        self._header = AmiraHeader(self._source, load_streams=self._load_streams is True, *args, **kwargs)
         # meta block
         super(AmiraFile, self).add_attr('meta', Block('meta'))
         self.meta.add_attr('file', self._fn)
@@ -72,26 +156,119 @@ class AmiraFile(Block):
         self.meta.add_attr('streams_loaded', self._load_streams)
         # header block
         super(AmiraFile, self).add_attr('header', self._header)
+        if self._streams is not None and self._header.filetype == "AmiraMesh":
+            for stream in self._streams:
+                if not [ds for ds in self._header._data_streams_block_list if self._is_selected(ds, [stream])]:
+                    raise ValueError("no data stream with name or index '{}'".format(stream))
         # data streams block
         super(AmiraFile, self).add_attr(Block('data_streams'))
         if self._load_streams:
             self.read()
             self._streams_loaded = True
 
-    def read(self):
-        """Read the data streams if they are not read yet"""
+    def read(self, workers=None, into=None):
+        """Read the data streams if they are not read yet
+
+        Only the AmiraMesh data streams selected by ``streams`` are read; the others are attached
+        without their data. In ``'lazy'`` mode the AmiraMesh data stream blocks are only attached to ``data_streams``;
+        each one is read and decoded on first access to its ``data`` attribute. HyperSurface files
+        have a single data stream whose structure is only known once it is read so it is read at once.
+
+        AmiraMesh data streams can be decoded into arrays owned by the caller instead of new arrays by
+        mapping their names or indices to arrays of their shape in ``into``; these data streams are read
+        into the arrays even if they are not selected, in ``'lazy'`` mode or have been read before:
+
+        .. code:: python
+
+            stack = numpy.empty((len(fns),) + shape, dtype=numpy.uint8)
+            for t, fn in enumerate(fns):
+                with AmiraFile(fn, load_streams=False) as af:
+                    af.read(into={'Labels': stack[t]})
+
+        :param int workers: the number of threads on which to read and decode AmiraMesh data streams
+            concurrently [default: None i.e. the ``workers`` the file was opened with]
+        :param dict into: arrays to decode AmiraMesh data streams into by data stream name or index
+            (see ``AmiraMeshDataStream.get_data``) [default: None]
+        """
+        if workers is None:
+            workers = self._workers
+        workers = int(workers) if workers is not None else None
+        outs = self._match_into(into)
         if not self._streams_loaded:
             if self._header.filetype == "AmiraMesh":
+                streams = [
+                    ds for ds in self._header._data_streams_block_list if int(ds.data_index) in outs or
+                    (self._load_streams != 'lazy' and self._is_selected(ds, self._streams))
+                ]
+                load_data_streams(streams, workers=workers, outs=[outs.get(int(ds.data_index)) for ds in streams])
+                # attached in file order however the data streams were loaded
                 for ds in self._header._data_streams_block_list:
-                    ds.read()
-                    ds.add_attr('data', ds.get_data())
+                    ds.lazy = self._load_streams == 'lazy'
                     self.data_streams.add_attr(ds)
             elif self._header.filetype == "HyperSurface":
                 block = set_data_stream('Data', self._header)
-                block.read()
+                block.read(workers=workers)
                 self.data_streams.add_attr(block)
-            self._load_streams = self._header.load_streams = True
+            if self._load_streams != 'lazy':
+                self._load_streams = True
+            self._header.load_streams = True
             self._streams_loaded = True
+            if self._load_streams is True:
+                self._release_source()
+        elif outs:
+            streams = [ds for ds in self._header._data_streams_block_list if int(ds.data_index) in outs]
+            load_data_streams(streams, workers=workers, outs=[outs.get(int(ds.data_index)) for ds in streams])
+
+    def _match_into(self, into):
+        """The indices of the AmiraMesh data streams named in ``into`` mapped to their arrays"""
+        outs = dict()
+        if not into:
+            return outs
+        try:
+            assert self._header.filetype == "AmiraMesh"
+        except AssertionError:
+            raise ValueError("only AmiraMesh data streams can be read into arrays")
+        for stream, out in into.items():
+            blocks = [ds for ds in self._header._data_streams_block_list if self._is_selected(ds, [stream])]
+            try:
+                assert blocks
+            except AssertionError:
+                raise ValueError("no data stream with name or index '{}'".format(stream))
+            outs[int(blocks[0].data_index)] = out
+        return outs
+
+    def _release_source(self):
+        """Close a file opened by name once its data streams are read; the header opens it again for later reads"""
+        if self._reopens_source and not self._source.closed:
+            self._header._source = None
+            self._source.close()
+
+    def close(self):
+        """Close the Amira file; data streams which have not been read can no longer be read"""
+        if self._owns_source:
+            self._source.close()
+
+    def __del__(self):
+        # a file opened by name is closed even if close() is never called; data streams which outlive this
+        # object are read through the header which opens the file again
+        try:
+            self._release_source()
+        except AttributeError:
+            # not fully initialised
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _is_selected(ds, streams):
+        """Whether the data stream block is selected by name or index in streams (None selects all)"""
+        if streams is None:
+            return True
+        return ds.name in streams or int(ds.data_index) in streams
 
     def __repr__(self):
         return "AmiraFile('{}', read={})".format(self._fn, self._read)
@@ -107,4 +284,113 @@ class AmiraFile(Block):
         return string
 
 
-__all__ = ['AmiraFile', 'AmiraHeader']
+def _open_one(path, func, kwargs):
+    """Open a single file for `open_many` returning ``(path, result, error)`` instead of raising"""
+    try:
+        af = AmiraFile(path, **kwargs)
+    except Exception as e:
+        return path, None, e
+    if func is None:
+        return path, af, None
+    try:
+        return path, func(af), None
+    except Exception as e:
+        return path, None, e
+    finally:
+        af.close()
+
+
+def _open_in_worker(path, func, kwargs):
+    """Open a single file for `open_many` in a worker process"""
+    path, result, error = _open_one(path, func, kwargs)
+    if isinstance(result, AmiraFile):
+        # the result is sent to the calling process where the file is opened again
+        result.close()
+    return path, result, error
+
+
+def _init_worker():
+    # compile the header grammar once per worker instead of once per file
+    grammar.warm()
+
+
+def open_many(paths, workers=None, load_streams=None, streams=None, func=None, max_pending=None, **kwargs):
+    """Open many Amira files on a pool of worker processes
+
+    Each file is opened as an `AmiraFile` in a worker process and ``func`` is applied to it there so that only
+    what ``func`` returns is sent back. Without ``func`` the `AmiraFile` itself is sent back and the file is
+    opened again so that its data streams can be read; such `AmiraFile` objects should be closed when done
+    with. The data of the data streams loaded in the worker is sent back too so without ``func`` the files are
+    opened with ``load_streams='lazy'`` unless ``load_streams`` is given; each data stream is then read in
+    this process on first access to its ``data`` attribute.
+    Results are yielded in the order in which the files are done. At most ``max_pending`` files are
+    opened ahead of the results consumed so that the memory taken by results stays bounded.
+
+    .. code:: python
+
+        import ahds
+
+        def shapes(af):
+            return {name: getattr(af.data_streams, name).data.shape for name in af.data_streams.attrs()}
+
+        for path, result, error in ahds.open_many(paths, workers=8, func=shapes):
+            if error is not None:
+                print(path, 'failed:', error)
+
+    :param paths: an iterable of Amira file names
+    :param int workers: the number of worker processes; ``1`` opens the files one after the other in this
+        process [default: None i.e. the number of CPUs]
+    :param load_streams: passed to `AmiraFile` [default: None i.e. ``True`` with ``func`` and ``'lazy'``
+        without]
+    :param list streams: passed to `AmiraFile`
+    :param func: a function taking an open `AmiraFile` and returning a picklable result; a module level
+        function when ``workers`` is greater than one [default: None i.e. return the `AmiraFile`]
+    :param int max_pending: the largest number of files being opened or whose results are waiting to be
+        consumed [default: None i.e. twice the number of workers]
+    :return iterator results: tuples ``(path, result, error)`` where ``error`` is the exception raised
+        (and ``result`` is ``None``) if the file could not be opened or ``func`` failed
+    """
+    try:
+        assert workers is None or int(workers) >= 1
+    except AssertionError:
+        raise ValueError("workers must be a positive integer")
+    workers = multiprocessing.cpu_count() if workers is None else int(workers)
+    try:
+        assert max_pending is None or int(max_pending) >= 1
+    except AssertionError:
+        raise ValueError("max_pending must be a positive integer")
+    max_pending = 2 * workers if max_pending is None else int(max_pending)
+    if load_streams is None:
+        # without func the data would be loaded only to be pickled back to this process
+        load_streams = True if func is not None else 'lazy'
+    kwargs.update(load_streams=load_streams, streams=streams)
+    if workers == 1:
+        for path in paths:
+            yield _open_one(path, func, kwargs)
+        return
+    done = queue.Queue()
+    # forked workers inherit the compiled grammar; others compile it in _init_worker
+    grammar.warm()
+    pool = multiprocessing.Pool(workers, initializer=_init_worker)
+    try:
+        paths = iter(paths)
+        pending = 0
+        while True:
+            for path in itertools.islice(paths, max_pending - pending):
+                callbacks = dict(callback=done.put)
+                if sys.version_info[0] > 2:
+                    # e.g. a result which can not be pickled
+                    callbacks['error_callback'] = lambda error, path=path: done.put((path, None, error))
+                pool.apply_async(_open_in_worker, (path, func, kwargs), **callbacks)
+                pending += 1
+            if not pending:
+                break
+            result = done.get()
+            pending -= 1
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+__all__ = ['AmiraFile', 'AmiraHeader', 'open_many', 'peek']
@@ -26,6 +26,9 @@ def parse_args():
     parser.add_argument('file', nargs='+', help='a valid Amira file with an optional block path')
     parser.add_argument('-s', '--load-streams', default=False, action='store_true',
                         help="whether to load data streams or not [default: False]")
+    parser.add_argument('--stream', dest='streams', metavar='STREAM', default=None, action='append',
+                        help="name or index of a data stream to load (repeat for several streams); "
+                             "implies -s/--load-streams [default: all data streams]")
     parser.add_argument('-d', '--debug', default=False, action='store_true',
                         help="display debugging information [default: False]")
     parser.add_argument('-l', '--literal', default=False, action='store_true',
@@ -40,22 +43,29 @@ def main():
 
     _file, _paths = set_file_and_paths(args)
 
-    af = get_amira_file(_file, args)
-
-    if args.literal:
-        print(get_literal(af, args), file=sys.stderr)
-    if args.debug:
-        print(get_debug(af, args), file=sys.stderr)
-    # always show paths
-    print(get_paths(_paths, af), file=sys.stderr)
+    with get_amira_file(_file, args) as af:
+        if args.literal:
+            print(get_literal(af, args), file=sys.stderr)
+        if args.debug:
+            print(get_debug(af, args), file=sys.stderr)
+        # always show paths
+        print(get_paths(_paths, af), file=sys.stderr)
     return os.EX_OK
 
 
 def get_amira_file(_file, args):
-    af = AmiraFile(_file, load_streams=args.load_streams, debug=args.debug)
+    streams = get_streams(args)
+    af = AmiraFile(_file, load_streams=args.load_streams or streams is not None, streams=streams, debug=args.debug)
     return af
 
 
+def get_streams(args):
+    """Data stream names with data stream indices converted to integers"""
+    if args.streams is None:
+        return None
+    return [int(stream) if stream.isdigit() else stream for stream in args.streams]
+
+
 def get_paths(_paths, af):
     if _paths:
         string = ""
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+aio
+===
+
+An ``asyncio`` front end for reading Amira (R) files (Python 3.5 and later).
+
+Opening a file (reading and parsing the header) and reading and decoding data streams block. The coroutines
+in this module run them on an executor so that the event loop carries on meanwhile:
+
+.. code:: python
+
+    from ahds.aio import open_amira
+
+    async def labels(fn):
+        async with await open_amira(fn, load_streams='lazy') as af:
+            stream = af.stream('Labels')
+            data = await stream.aread()
+            async for start, block in stream.aiter_slices(chunk=8):
+                ...
+
+All blocking work goes through an `AsyncLoader` which holds the executor to use (the event loop's default
+executor unless given) and the largest number of blocking calls that run at the same time. A single loader may
+be shared by many files to limit the concurrency of a whole service:
+
+.. code:: python
+
+    from concurrent.futures import ThreadPoolExecutor
+    from ahds.aio import AsyncLoader, open_amira
+
+    loader = AsyncLoader(executor=ThreadPoolExecutor(8), limit=16)
+    files = await asyncio.gather(*[open_amira(fn, loader=loader) for fn in fns])
+
+"""
+from __future__ import print_function
+
+import asyncio
+import functools
+
+from . import AmiraFile
+
+# the loop of the running coroutine (asyncio.get_running_loop is new in Python 3.7)
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class AsyncLoader(object):
+    """Runs the blocking calls of reading Amira (R) files on an executor with limited concurrency"""
+
+    def __init__(self, executor=None, limit=None):
+        """
+        :param executor: a ``concurrent.futures.Executor`` [default: None i.e. the event loop's default executor]
+        :param int limit: the largest number of blocking calls run at the same time [default: None i.e. no limit]
+        """
+        try:
+            assert limit is None or int(limit) >= 1
+        except AssertionError:
+            raise ValueError("limit must be a positive integer")
+        self._executor = executor
+        self._limit = None if limit is None else int(limit)
+        # the semaphore belongs to the event loop it is created in
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def executor(self):
+        return self._executor
+
+    @property
+    def limit(self):
+        return self._limit
+
+    async def run(self, func, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` on the executor and return its result"""
+        loop = _get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if self._limit is None:
+            return await loop.run_in_executor(self._executor, call)
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._limit)
+            self._loop = loop
+        async with self._semaphore:
+            return await loop.run_in_executor(self._executor, call)
+
+
+# used when no loader is given
+_default_loader = AsyncLoader()
+
+
+async def open_amira(fn, loader=None, **kwargs):
+    """Open an Amira (R) file without blocking the event loop
+
+    :param fn: an Amira file name or any other object accepted by `AmiraFile`
+    :param loader: the `AsyncLoader` to run blocking calls [default: None i.e. the default executor without limit]
+    :param kwargs: passed to `AmiraFile` e.g. ``load_streams='lazy'``
+    :return af: an `AsyncAmiraFile`
+    """
+    loader = _default_loader if loader is None else loader
+    amira_file = await loader.run(AmiraFile, fn, **kwargs)
+    return AsyncAmiraFile(amira_file, loader)
+
+
+class AsyncAmiraFile(object):
+    """An `AmiraFile` whose blocking methods are coroutines
+
+    Other attributes (e.g. ``header``, ``meta`` and ``data_streams``) are those of the `AmiraFile`.
+    """
+
+    def __init__(self, amira_file, loader=None):
+        """
+        :param amira_file: an open `AmiraFile`
+        :param loader: the `AsyncLoader` to run blocking calls [default: None i.e. the default loader]
+        """
+        self._amira_file = amira_file
+        self._loader = _default_loader if loader is None else loader
+
+    @property
+    def amira_file(self):
+        """The underlying `AmiraFile`"""
+        return self._amira_file
+
+    @property
+    def streams(self):
+        """The AmiraMesh data streams in the order of the file as `AsyncDataStream` objects"""
+        return [AsyncDataStream(stream, self._loader) for stream in self._amira_file.header._data_streams_block_list]
+
+    def stream(self, name):
+        """The data stream with the given name or index as an `AsyncDataStream`
+
+        :param name: the name or index of an AmiraMesh data stream or a data stream attached to ``data_streams``
+        """
+        for stream in self._amira_file.header._data_streams_block_list:
+            if AmiraFile._is_selected(stream, [name]):
+                return AsyncDataStream(stream, self._loader)
+        try:
+            return AsyncDataStream(getattr(self._amira_file.data_streams, name), self._loader)
+        except (AttributeError, TypeError):
+            raise ValueError("no data stream with name or index '{}'".format(name))
+
+    async def aread(self, workers=None, into=None):
+        """Read the data streams if they are not read yet (see `AmiraFile.read`)"""
+        await self._loader.run(self._amira_file.read, workers=workers, into=into)
+
+    async def aclose(self):
+        """Close the file"""
+        await self._loader.run(self._amira_file.close)
+
+    def close(self):
+        self._amira_file.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def __getattr__(self, name):
+        if name == '_amira_file':
+            raise AttributeError(name)
+        return getattr(self._amira_file, name)
+
+    def __repr__(self):
+        return "AsyncAmiraFile({!r})".format(self._amira_file)
+
+
+class AsyncDataStream(object):
+    """A data stream whose blocking methods are coroutines
+
+    Other attributes (e.g. ``name``, ``shape`` and ``data_shape``) are those of the data stream.
+    """
+
+    def __init__(self, stream, loader=None):
+        """
+        :param stream: an `AmiraDataStream`
+        :param loader: the `AsyncLoader` to run blocking calls [default: None i.e. the default loader]
+        """
+        self._stream = stream
+        self._loader = _default_loader if loader is None else loader
+
+    @property
+    def stream(self):
+        """The underlying `AmiraDataStream`"""
+        return self._stream
+
+    async def aread(self, out=None):
+        """Read (if not yet read) and decode the stream data; the same as accessing ``data``
+
+        :param np.ndarray out: an array to decode into (see `AmiraDataStream.load`) [default: None]
+        :return np.ndarray data: the decoded data
+        """
+        return await self._loader.run(self._stream.load, out=out)
+
+    async def aread_region(self, z=None, y=None, x=None):
+        """Read and decode part of the stream data (see `AmiraMeshDataStream.read_region`)"""
+        return await self._loader.run(self._stream.read_region, z=z, y=y, x=x)
+
+    def aiter_slices(self, chunk=16, start=None, stop=None):
+        """Iterate over the decoded data in blocks of slices with ``async for``
+
+        See `AmiraMeshDataStream.iter_slices` for the arguments; each block is read and decoded on the executor.
+
+        :return iterator blocks: an asynchronous iterator of tuples ``(start, array)``
+        """
+        return AsyncSliceIterator(self._stream.iter_slices(chunk=chunk, start=start, stop=stop), self._loader)
+
+    def __getattr__(self, name):
+        if name == '_stream':
+            raise AttributeError(name)
+        return getattr(self._stream, name)
+
+    def __repr__(self):
+        return "AsyncDataStream({!r})".format(self._stream.name)
+
+
+# returned by next() in the executor at the end of the blocks; StopIteration can not be set on a future
+_end = object()
+
+
+class AsyncSliceIterator(object):
+    """Asynchronous iterator over the blocks of ``iter_slices`` advancing the generator on the executor"""
+
+    def __init__(self, blocks, loader):
+        self._blocks = blocks
+        self._loader = loader
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        block = await self._loader.run(next, self._blocks, _end)
+        if block is _end:
+            raise StopAsyncIteration
+        return block
+
+    async def aclose(self):
+        """Stop iterating before the end of the blocks"""
+        await self._loader.run(self._blocks.close)
+
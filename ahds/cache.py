@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+cache
+=====
+
+Persistent on-disk caches which allow ``ahds`` to skip work when the same Amira (R) file is opened again.
+
+A cache is selected using the ``cache`` argument which is either:
+
+* ``True`` to keep a sidecar file next to the Amira (R) file e.g. ``file.am.ahds-header`` or
+
+* the name of a directory in which to keep cache files for all Amira (R) files.
+
+Every cache entry records the absolute path, size and modification time of the Amira (R) file it was created
+from. An entry whose record does not match the file any more is ignored and replaced when next written.
+
+Cache files are Python pickles and should only be read from locations that are trusted.
+
+Decompressed data streams are cached as ``.npy`` files (e.g. ``file.am.ahds-stream-1.npy``) which are mapped
+with ``numpy.memmap`` instead of being decompressed again. Their records also hold a hash of the header and the
+shape and type of the data.
+
+Decoded data streams may also be kept in memory for the lifetime of the process in an `ArrayCache` which
+is shared by all files opened afterwards once it is enabled:
+
+.. code:: python
+
+    from ahds import cache
+
+    cache.set_array_cache(4 << 30)  # keep up to 4 GiB of decoded data streams
+
+Entries are keyed by the same identity of the file (path, size and modification time) and the data stream
+so that modified files are decoded again.
+
+"""
+from __future__ import print_function
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import warnings
+
+import numpy as np
+
+# bumped whenever the layout of cached data changes so that old entries are ignored
+CACHE_VERSION = 1
+
+CACHE_SUFFIX = '.ahds-{}'
+
+# os.replace is atomic on all platforms but is missing from Python2
+_replace = getattr(os, 'replace', os.rename)
+
+
+def source_key(fn):
+    """The identity of the file against which cache entries are validated
+
+    :param str fn: file name
+    :return tuple key: absolute path, size and modification time of the file
+    """
+    stat = os.stat(fn)
+    return os.path.abspath(fn), stat.st_size, stat.st_mtime
+
+
+def cache_filename(fn, cache, kind):
+    """The name of the cache file holding ``kind`` data for the file ``fn``
+
+    :param str fn: file name
+    :param cache: ``True`` for a sidecar file or the name of the cache directory
+    :param str kind: the kind of cached data e.g. ``header``
+    :return str cache_fn: the cache file name
+    """
+    suffix = CACHE_SUFFIX.format(kind)
+    if cache is True:
+        return fn + suffix
+    path_hash = hashlib.sha1(os.path.abspath(fn).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache, '{}-{}{}'.format(os.path.basename(fn), path_hash, suffix))
+
+
+def read_cache(fn, cache, kind):
+    """Read cached data for the file ``fn`` if it exists and is valid
+
+    :param str fn: file name
+    :param cache: ``True`` for a sidecar file or the name of the cache directory
+    :param str kind: the kind of cached data e.g. ``header``
+    :return data: the cached data or ``None`` if there is no valid entry
+    """
+    try:
+        with open(cache_filename(fn, cache, kind), 'rb') as f:
+            version, key, data = pickle.load(f)
+    except Exception:  # missing, unreadable or corrupt cache files are all cache misses
+        return None
+    if version != CACHE_VERSION or key != source_key(fn):
+        return None
+    return data
+
+
+def write_cache(fn, cache, kind, data):
+    """Write data to the cache for the file ``fn``
+
+    The cache file is replaced atomically so that concurrent readers see either the old or the new entry.
+    Failure to write the cache only issues a warning.
+
+    :param str fn: file name
+    :param cache: ``True`` for a sidecar file or the name of the cache directory
+    :param str kind: the kind of cached data e.g. ``header``
+    :param data: picklable data to cache
+    """
+    cache_fn = cache_filename(fn, cache, kind)
+    try:
+        fd, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_fn)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((CACHE_VERSION, source_key(fn), data), f, pickle.HIGHEST_PROTOCOL)
+            _replace(tmp_fn, cache_fn)
+        except Exception:
+            os.remove(tmp_fn)
+            raise
+    except (IOError, OSError) as e:
+        warnings.warn("unable to write cache file '{}': {}".format(cache_fn, e))
+
+
+def read_array(fn, cache, kind, check):
+    """Map the array cached for the file ``fn`` read-only if it exists and is valid
+
+    :param str fn: file name
+    :param cache: ``True`` for a sidecar file or the name of the cache directory
+    :param str kind: the kind of cached array e.g. ``stream-1``
+    :param tuple check: the header hash, shape and dtype string the cached array must have been written with
+    :return np.memmap array: the mapped array or ``None`` if there is no valid entry
+    """
+    if read_cache(fn, cache, kind) != check:
+        return None
+    try:
+        array = np.load(cache_filename(fn, cache, kind + '.npy'), mmap_mode='r')
+    except Exception:  # missing, unreadable or corrupt cache files are all cache misses
+        return None
+    if (array.shape, array.dtype.str) != tuple(check[1:]):
+        return None
+    return array
+
+
+def write_array(fn, cache, kind, check, fill):
+    """Write an array to the cache for the file ``fn`` as a ``.npy`` file and map it read-only
+
+    ``fill`` writes the array straight into the mapped ``.npy`` file so that it is never held in memory.
+    The file is replaced atomically before its record is written.
+
+    :param str fn: file name
+    :param cache: ``True`` for a sidecar file or the name of the cache directory
+    :param str kind: the kind of cached array e.g. ``stream-1``
+    :param tuple check: the header hash, shape and dtype string of the array
+    :param fill: a function called with the writable ``numpy.memmap`` to fill
+    :return np.memmap array: the mapped array or ``None`` if it could not be written
+    """
+    array_fn = cache_filename(fn, cache, kind + '.npy')
+    try:
+        fd, tmp_fn = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(array_fn)), suffix='.tmp')
+        os.close(fd)
+        try:
+            array = np.lib.format.open_memmap(tmp_fn, mode='w+', dtype=np.dtype(check[2]), shape=check[1])
+            try:
+                fill(array)
+                array.flush()
+            finally:
+                del array
+            _replace(tmp_fn, array_fn)
+        except Exception:
+            os.remove(tmp_fn)
+            raise
+    except (IOError, OSError) as e:
+        warnings.warn("unable to write cache file '{}': {}".format(array_fn, e))
+        return None
+    write_cache(fn, cache, kind, check)
+    return read_array(fn, cache, kind, check)
+
+
+class ArrayCache(object):
+    """A thread-safe least-recently-used cache of decoded arrays whose total size is limited to a byte budget
+
+    Cached arrays are read-only and are handed out as read-only views. Arrays larger than the budget are not
+    cached; others evict the least recently used arrays until they fit.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param int max_bytes: the largest number of bytes of all cached arrays together
+        """
+        try:
+            assert int(max_bytes) >= 0
+        except AssertionError:
+            raise ValueError("max_bytes must be a non-negative integer")
+        self._max_bytes = int(max_bytes)
+        self._nbytes = 0
+        self._arrays = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        """The byte budget"""
+        return self._max_bytes
+
+    @property
+    def nbytes(self):
+        """The number of bytes of all cached arrays"""
+        return self._nbytes
+
+    def get(self, key):
+        """The cached array for ``key`` as a read-only view or ``None`` if it is not cached"""
+        with self._lock:
+            array = self._arrays.pop(key, None)
+            if array is None:
+                return None
+            # most recently used last
+            self._arrays[key] = array
+        return array.view()
+
+    def put(self, key, array):
+        """Cache ``array`` under ``key`` evicting the least recently used arrays to keep within the budget
+
+        :param key: a hashable key
+        :param np.ndarray array: the array to cache; it is made read-only
+        :return np.ndarray view: a read-only view of ``array``
+        """
+        array.flags.writeable = False
+        with self._lock:
+            old = self._arrays.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            if array.nbytes <= self._max_bytes:
+                while self._nbytes + array.nbytes > self._max_bytes:
+                    self._nbytes -= self._arrays.pop(next(iter(self._arrays))).nbytes
+                self._arrays[key] = array
+                self._nbytes += array.nbytes
+        return array.view()
+
+    def clear(self):
+        """Drop all cached arrays"""
+        with self._lock:
+            self._arrays.clear()
+            self._nbytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._arrays
+
+    def __len__(self):
+        with self._lock:
+            return len(self._arrays)
+
+    def __repr__(self):
+        return "ArrayCache(max_bytes={}) with {} arrays of {} bytes".format(self._max_bytes, len(self), self._nbytes)
+
+
+# the process-wide cache of decoded data streams; disabled unless set
+_array_cache = None
+
+
+def set_array_cache(max_bytes):
+    """Enable, resize or (``max_bytes=None``) disable the process-wide cache of decoded data streams
+
+    Files opened with the default ``array_cache=None`` use the cache which is in place when they are opened.
+
+    :param int max_bytes: the byte budget of the cache or ``None`` to disable it
+    :return cache: the new `ArrayCache` or ``None``
+    """
+    global _array_cache
+    _array_cache = None if max_bytes is None else ArrayCache(max_bytes)
+    return _array_cache
+
+
+def get_array_cache():
+    """The process-wide `ArrayCache` or ``None`` if it is disabled"""
+    return _array_cache
@@ -192,6 +192,9 @@ class Block(object):
         self.move_attr(new_name, attr)
 
     def __getattr__(self, name):
+        if name == '_attrs':
+            # not yet set e.g. while unpickling
+            raise AttributeError(name)
         try:
             return self._attrs[name]
         except KeyError:
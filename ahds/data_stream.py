@@ -14,19 +14,28 @@ Both classes inherit from `AmiraDataStream` class, which handles common function
 
 * initialisation with the header metadata
 * the `get_data` method calls each subclass's `_decode` method
+* the `data` property which reads and decodes the stream on first access
 
 """
 from __future__ import print_function
 
+import bisect
 import re
 import sys
 # todo: remove as soon as DataStreams class is removed
 import warnings
 import zlib
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
 
+from .cache import read_array, source_key, write_array
 from .core import _dict_iter_keys, _dict_iter_values, ListBlock, deprecated
 from .grammar import _hyper_surface_file
 
@@ -196,18 +205,457 @@ except ImportError:
 
         return output
 
+# try to import the native resumable byterle_decode_into and fallback to python implementation
+try:
+    if sys.version_info[0] > 2:
+        from ahds.decoders import byterle_decode_into
+    else:
+        from .decoders import byterle_decode_into
+except ImportError:
+    def byterle_decode_into(data, output, state=(0, 0, 0)):
+        """If the C-ext. failed to compile or is unimportable use this slower Python equivalent
+
+        :param str data: part of a raw stream of data to be unpacked
+        :param output: a writable buffer (e.g. ``np.ndarray`` of ``np.uint8``) to receive the unpacked bytes
+        :param tuple state: the state returned by the previous call or ``(0, 0, 0)`` at the start of the stream
+        :return tuple result: the number of bytes written to ``output``, the number of bytes consumed
+            from ``data`` and the state to pass to the next call
+        """
+        from warnings import warn
+        warn("using pure-Python (instead of Python C-extension) implementation of byterle_decode_into")
+
+        input_data = np.frombuffer(data, dtype=_np_ubytelittle, count=len(data))
+        output = np.frombuffer(output, dtype=np.uint8)
+        mode, remaining, value = state
+        i = j = 0
+        while True:
+            if mode == 0:  # get count
+                if i >= len(input_data) or j >= len(output):
+                    break
+                no = int(input_data[i])
+                i += 1
+                remaining = no & 0x7f
+                mode = 1 if no > 127 else 2
+            elif mode == 1:  # copy literal bytes
+                n = min(remaining, len(output) - j, len(input_data) - i)
+                output[j:j + n] = input_data[i:i + n]
+                i += n
+                j += n
+                remaining -= n
+                if remaining:
+                    break
+                mode = 0
+            elif mode == 2:  # get the value to repeat
+                if i >= len(input_data):
+                    break
+                value = int(input_data[i])
+                i += 1
+                mode = 3
+            else:  # repeat value
+                n = min(remaining, len(output) - j)
+                output[j:j + n] = value
+                j += n
+                remaining -= n
+                if remaining:
+                    break
+                mode = 0
+        return j, i, (mode, remaining, value)
+
+# try to import the native run index builder and fallback to python implementation
+try:
+    if sys.version_info[0] > 2:
+        from ahds.decoders import byterle_build_index
+    else:
+        from .decoders import byterle_build_index
+except ImportError:
+    def byterle_build_index(data, span):
+        """If the C-ext. failed to compile or is unimportable use this slower Python equivalent
+
+        :param str data: a raw stream of data to be indexed
+        :param int span: the minimum number of unpacked bytes between run boundaries in the index
+        :return list points: tuples ``(in, out)`` of the offsets of run boundaries in ``data`` and
+            in the unpacked data
+        """
+        from warnings import warn
+        warn("using pure-Python (instead of Python C-extension) implementation of byterle_build_index")
+
+        data = bytearray(data)
+        points = list()
+        i = j = 0
+        last = -span
+        while i < len(data):
+            if j - last >= span:
+                points.append((i, j))
+                last = j
+            no = data[i]
+            if no > 127:
+                i += 1 + (no & 0x7f)
+                j += no & 0x7f
+            else:
+                i += 2
+                j += no
+        return points
+
+# try to import the native index builder for HxZip streams; it is only available if the C-ext. links zlib
+try:
+    if sys.version_info[0] > 2:
+        from ahds.decoders import hxzip_build_index
+    else:
+        from .decoders import hxzip_build_index
+except ImportError:
+    hxzip_build_index = None
+
+# decompression is resumed from an HxZip access point with a preset dictionary which zlib takes on Python 3.3+
+_ZLIB_ZDICT = sys.version_info[:2] >= (3, 3)
+
+# try to import the native ASCII number parser which runs without the GIL; without it numpy parses ASCII
+# data streams on a single thread
+try:
+    if sys.version_info[0] > 2:
+        from ahds.decoders import ascii_count, ascii_decode_into
+    else:
+        from .decoders import ascii_count, ascii_decode_into
+except ImportError:
+    ascii_count = ascii_decode_into = None
+
 # define common alias for the selected byterle_decoder implementation
 hxbyterle_decode = byterle_decoder
+hxbyterle_decode_into = byterle_decode_into
+hxbyterle_build_index = byterle_build_index
+
+
+# number of bytes of a data stream read from the file at a time when the stream is decoded incrementally
+STREAM_BLOCK_SIZE = 1 << 20
+
+# the smallest number of bytes of an ASCII data stream parsed on a thread of its own
+ASCII_CHUNK_SIZE = 1 << 22
+
+# default number of decoded bytes between the access points in the index of a compressed stream
+STREAM_INDEX_SPAN = 1 << 24
+
+# the largest number of bytes between two rows of a region which are read together with the gap between them
+REGION_READ_GAP = 1 << 16
 
 
 def hxzip_decode(data, output_size):
     """Decode HxZip data stream
 
+    The data is decompressed in windows of at most ``STREAM_BLOCK_SIZE`` bytes straight into the output array.
+
     :param str data: a raw stream of data to be unpacked
     :param int output_size: the number of items when ``data`` is uncompressed
     :return np.array output: an array of ``np.uint8``
+    :raises ValueError: if ``data`` does not decompress to exactly ``output_size`` bytes or is corrupt
+    """
+    decoder = StreamDecoder('HxZip', [data])
+    output = decoder.fill(np.empty(output_size, dtype=_np_ubytelittle))
+    decoder.finish()
+    return output
+
+
+def _shift_bits(blocks, shift):
+    """Shift the bits of a stream given in ``blocks`` so that it starts at bit ``shift`` of its first byte
+
+    Deflate streams are read from the least significant bit of each byte upwards so the result is the same
+    deflate stream starting on a byte boundary.
     """
-    return np.frombuffer(zlib.decompress(data), dtype=_np_ubytelittle, count=output_size)
+    carry = None
+    for block in blocks:
+        data = np.frombuffer(block, dtype=np.uint8)
+        if carry is not None:
+            data = np.concatenate([carry, data])
+        if len(data) > 1:
+            yield ((data[:-1] >> shift) | (data[1:] << (8 - shift))).astype(np.uint8).tobytes()
+        carry = data[-1:]
+    if carry is not None:
+        yield (carry >> shift).astype(np.uint8).tobytes()
+
+
+class StreamDecoder(object):
+    """Incremental decoder of the raw bytes of a binary data stream
+
+    The raw bytes are taken from an iterable of blocks (e.g. successive reads from the file) as they are
+    needed. Successive calls to `fill` decode successive parts of the stream so that the whole stream never
+    has to be held in memory in either its raw or its decoded form.
+    """
+
+    def __init__(self, stream_format, blocks, zdict=None):
+        """
+        :param str stream_format: the format of the stream: ``None`` (uncompressed), ``'HxZip'`` or ``'HxByteRLE'``
+        :param blocks: an iterable of the raw bytes of the stream in blocks
+        :param bytes zdict: the preceding 32 KiB of output when an HxZip stream is decompressed from an access
+            point onwards; ``blocks`` are then raw deflate data without a zlib header [default: None]
+        """
+        try:
+            assert stream_format in (None, 'HxZip', 'HxByteRLE')
+        except AssertionError:
+            raise ValueError('unknown data stream format: \'{}\''.format(stream_format))
+        try:
+            assert zdict is None or _ZLIB_ZDICT
+        except AssertionError:
+            raise ValueError('HxZip streams can only be decompressed from an access point on Python 3.3+')
+        self._format = stream_format
+        self._blocks = iter(blocks)
+        self._pending = memoryview(b'')
+        self._exhausted = False
+        self._decompressor = zlib.decompressobj() if zdict is None else zlib.decompressobj(-zlib.MAX_WBITS, zdict)
+        self._state = (0, 0, 0)
+
+    def _next_block(self):
+        """Take the next block of raw bytes once the pending bytes are used up"""
+        if not len(self._pending) and not self._exhausted:
+            self._pending = memoryview(next(self._blocks, b''))
+            self._exhausted = not len(self._pending)
+
+    def _decompress(self, max_length):
+        """Decompress at most ``max_length`` bytes from the pending bytes of an HxZip stream"""
+        try:
+            data = self._decompressor.decompress(self._pending, max_length)
+        except zlib.error as e:
+            raise ValueError('corrupt HxZip data stream: {}'.format(e))
+        self._pending = memoryview(self._decompressor.unconsumed_tail)
+        return data
+
+    def fill(self, output):
+        """Decode the next ``len(output)`` bytes of the stream into ``output``
+
+        :param np.ndarray output: a writable one dimensional array of ``np.uint8``
+        :return np.ndarray output: the filled array
+        :raises ValueError: if the stream ends before ``output`` is filled or is corrupt
+        """
+        filled = 0
+        while filled < len(output):
+            self._next_block()
+            if self._format is None:
+                produced = min(len(self._pending), len(output) - filled)
+                output[filled:filled + produced] = np.frombuffer(self._pending[:produced], dtype=np.uint8)
+                self._pending = self._pending[produced:]
+            elif self._format == 'HxZip':
+                # bound the size of each piece of decompressed data
+                data = self._decompress(min(len(output) - filled, STREAM_BLOCK_SIZE))
+                produced = len(data)
+                output[filled:filled + produced] = np.frombuffer(data, dtype=np.uint8)
+            else:
+                produced, consumed, self._state = hxbyterle_decode_into(self._pending, output[filled:], self._state)
+                self._pending = self._pending[consumed:]
+            if not produced and self._exhausted:
+                raise ValueError('data stream ended after {} of {} bytes'.format(filled, len(output)))
+            filled += produced
+        return output
+
+    def finish(self):
+        """Check that the stream ends where the last output ended
+
+        The rest of an HxZip stream is decompressed up to its end so that its checksum is verified. Other
+        streams do not mark their end so there is nothing to check.
+
+        :raises ValueError: if the stream holds more data, ends before its end marker or is corrupt
+        """
+        if self._format != 'HxZip':
+            return
+        while not self._decompressor.eof:
+            self._next_block()
+            if len(self._pending):
+                data = self._decompress(1)
+            elif self._exhausted:
+                data = self._decompressor.flush()
+                if not data and not self._decompressor.eof:
+                    raise ValueError('HxZip data stream ended before its end marker')
+            else:
+                continue
+            if data:
+                raise ValueError('HxZip data stream holds more data than its shape')
+
+    def skip(self, size):
+        """Decode and discard the next ``size`` bytes of the stream"""
+        scratch = np.empty(min(size, STREAM_BLOCK_SIZE), dtype=np.uint8)
+        while size > 0:
+            self.fill(scratch[:min(size, len(scratch))])
+            size -= len(scratch)
+
+
+_ascii_space = re.compile(br'\s')
+_ascii_number = re.compile(br'\S')
+
+
+def _ascii_parse(data, dtype):
+    """Parse whitespace separated numbers the way ASCII data streams have always been parsed"""
+    return np.fromstring(data, dtype=dtype, sep="\n \t")
+
+
+def _ascii_parse_into(data, output):
+    """Parse the numbers of ``data`` into ``output`` returning whether it holds exactly ``len(output)`` numbers"""
+    items, consumed = ascii_decode_into(data, output, output.dtype.kind, output.dtype.itemsize)
+    return items == len(output) and consumed == len(data)
+
+
+def _ascii_chunks(data, size):
+    """The bounds of the chunks of at least ``size`` bytes of the text ``data`` each starting with a number"""
+    first = _ascii_number.search(data)
+    if first is None:
+        return [(0, len(data))]
+    bounds = [0]
+    position = first.start() + size
+    while position < len(data):
+        space = _ascii_space.search(data, position)
+        number = _ascii_number.search(data, space.end()) if space is not None else None
+        if number is None:
+            break
+        bounds.append(number.start())
+        position = number.start() + size
+    bounds.append(len(data))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def ascii_decode(data, dtype, count, workers=None):
+    """Parse the whitespace separated numbers of an ASCII data stream
+
+    The numbers are parsed by the C-extension without holding the GIL straight into a preallocated array.
+    Streams of more than ``ASCII_CHUNK_SIZE`` bytes are split between numbers into chunks of about
+    ``ASCII_CHUNK_SIZE`` bytes; the numbers in each chunk are counted and then the chunks are parsed
+    concurrently into their slices of the array. The result is the same as parsing the whole stream with
+    ``numpy.fromstring``: a stream which does not hold exactly ``count`` numbers, or holds words which numpy
+    may read differently, is parsed by numpy, as are all streams if the C-extension is not available.
+
+    :param bytes data: the text of the data stream
+    :param dtype: the numpy data type of the numbers
+    :param int count: the number of numbers in the data stream
+    :param int workers: the number of threads to use [default: None i.e. one]
+    :return np.array output: a flat array of the numbers
+    """
+    dtype = np.dtype(dtype)
+    if ascii_decode_into is None or not dtype.isnative or dtype.kind not in 'fiu' or \
+            (dtype.kind == 'f' and dtype.itemsize not in (4, 8)):
+        return _ascii_parse(data, dtype)
+    output = np.empty(count, dtype=dtype)
+    if workers is None or workers <= 1 or len(data) < 2 * ASCII_CHUNK_SIZE:
+        return output if _ascii_parse_into(data, output) else _ascii_parse(data, dtype)
+    # chunks are views of data so that they are not copied
+    view = memoryview(data)
+    chunks = [view[start:end] for start, end in _ascii_chunks(data, ASCII_CHUNK_SIZE)]
+    pool = ThreadPool(min(workers, len(chunks)))
+    try:
+        counts = pool.map(ascii_count, chunks, chunksize=1)
+        if sum(counts) != count:
+            # parsing stops at the first text which is not a number so only the whole stream gives the same result
+            return _ascii_parse(data, dtype)
+        starts = np.cumsum([0] + counts[:-1])
+        parsed = pool.map(lambda index: _ascii_parse_into(
+            chunks[index], output[starts[index]:starts[index] + counts[index]]), range(len(chunks)), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return output if all(parsed) else _ascii_parse(data, dtype)
+
+
+def _check_out(out, shape, dtype):
+    """Check that decoded data of ``shape`` and ``dtype`` can be written to the array ``out``"""
+    try:
+        assert isinstance(out, np.ndarray) and out.shape == tuple(shape)
+    except AssertionError:
+        raise ValueError('out must be an array of shape {}'.format(tuple(shape)))
+    try:
+        assert out.flags.writeable
+    except AssertionError:
+        raise ValueError('out must be writeable')
+    try:
+        assert np.can_cast(dtype, out.dtype, casting='same_kind')
+    except AssertionError:
+        raise ValueError('unable to decode data of type {} into an array of type {}'.format(dtype, out.dtype))
+
+
+def _out_bytes(out, dtype):
+    """The bytes of ``out`` if decoded data of ``dtype`` can be written straight into them or ``None``"""
+    if out.dtype == dtype and out.flags.c_contiguous:
+        return out.reshape(-1).view(np.uint8)
+    return None
+
+
+def _fill_swapped(decoder, output, dtype):
+    """Fill the bytes ``output`` from ``decoder`` reversing the bytes of each item of ``dtype``
+
+    The bytes are reversed window by window right after each window is decoded while it is still in the cache.
+    """
+    window = max(STREAM_BLOCK_SIZE // dtype.itemsize, 1) * dtype.itemsize
+    for start in range(0, len(output), window):
+        decoder.fill(output[start:start + window]).view(dtype).byteswap(inplace=True)
+    return output
+
+
+def _to_native(array):
+    """Reverse the bytes of the items of ``array`` in place and view them in the native byte order"""
+    array.byteswap(inplace=True)
+    return array.view(array.dtype.newbyteorder('='))
+
+
+def _copy_into(out, data):
+    """Copy the decoded ``data`` into ``out`` converting the type if necessary"""
+    np.copyto(out, data, casting='same_kind')
+    return out
+
+
+class SharedArray(object):
+    """An array in a block of ``multiprocessing.shared_memory`` (Python 3.8 or later)
+
+    Pickling a `SharedArray` only pickles the name of the shared memory and the shape and dtype of the array;
+    unpickling it (e.g. in another process) attaches to the same shared memory without copying the data.
+    """
+
+    def __init__(self, name, shape, dtype, create=False):
+        """
+        :param str name: the name of the shared memory; ``None`` creates shared memory with a unique name
+        :param tuple shape: the shape of the array
+        :param dtype: the dtype of the array
+        :param bool create: whether to create new shared memory or attach to existing shared memory
+        """
+        self._shape = tuple(int(n) for n in shape)
+        self._dtype = np.dtype(dtype)
+        size = int(np.prod(self._shape)) * self._dtype.itemsize
+        # shared memory can not be empty
+        self._shm = shared_memory.SharedMemory(name=name, create=create or name is None, size=max(size, 1))
+        self._array = np.ndarray(self._shape, dtype=self._dtype, buffer=self._shm.buf)
+
+    @property
+    def name(self):
+        """The name of the shared memory"""
+        return self._shm.name
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def array(self):
+        """A ``numpy`` array viewing the shared memory; it must not be used after ``close``"""
+        if self._array is None:
+            raise ValueError("shared memory '{}' is closed".format(self.name))
+        return self._array
+
+    def close(self):
+        """Detach from the shared memory in this process"""
+        if self._array is not None:
+            self._array = None
+            self._shm.close()
+
+    def unlink(self):
+        """Free the shared memory once every process has closed it; called once by its creator"""
+        self._shm.unlink()
+
+    def __reduce__(self):
+        return type(self), (self.name, self._shape, self._dtype.str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return "SharedArray('{}', {}, '{}')".format(self.name, self._shape, self._dtype.str)
 
 
 def set_data_stream(name, header):
@@ -218,13 +666,50 @@ def set_data_stream(name, header):
         return AmiraHxSurfaceDataStream(name, header)
 
 
+def load_data_streams(streams, workers=None, outs=None):
+    """Load (read and decode) the data of several data streams
+
+    The data streams of a file are independent so with ``workers`` greater than one they are loaded
+    concurrently on a pool of threads. Reading uses positional reads on the shared source and zlib and
+    the HxByteRLE decoder release the GIL, so the streams are decoded in parallel.
+
+    A single data stream is loaded on this thread and, if it is a large ASCII data stream, parsed on
+    ``workers`` threads; data streams loaded concurrently are each parsed on the thread loading them.
+
+    :param list streams: the `AmiraDataStream` objects to load
+    :param int workers: the number of threads to use [default: None i.e. load one after the other]
+    :param list outs: the arrays to decode each data stream into or ``None`` for a new array
+        [default: None i.e. new arrays for all data streams]
+    """
+    if outs is None:
+        outs = [None] * len(streams)
+    if workers is None or workers <= 1 or len(streams) <= 1:
+        for stream, out in zip(streams, outs):
+            stream.load(out=out, workers=workers)
+        return
+    # the data streams of each file are located by a single scan before the threads need them
+    headers = dict((id(stream._header), stream._header) for stream in streams
+                   if isinstance(stream, AmiraMeshDataStream))
+    for header in headers.values():
+        header.stream_offsets
+    pool = ThreadPool(min(workers, len(streams)))
+    try:
+        # re-raises the first error after the remaining streams are done
+        pool.map(lambda args: args[0].load(out=args[1]), list(zip(streams, outs)), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
 class AmiraDataStream(ListBlock):
     """"""
-    __slots__ = ('_stream_data', '_header')
+    __slots__ = ('_stream_data', '_header', '_native_endian', '_lazy')
 
     def __init__(self, name, header):
         self._header = header  # contains metadata for extracting streams
         self._stream_data = None
+        self._native_endian = None
+        self._lazy = False
         super(AmiraDataStream, self).__init__(name)
 
     @property
@@ -232,53 +717,582 @@ class AmiraDataStream(ListBlock):
         """Reports whether data streams are loaded or not"""
         return self._header.load_streams
 
-    def get_data(self):
-        """Decode and return the stream data in this stream"""
+    @property
+    def native_endian(self):
+        """Whether binary data is converted to the native byte order when it is decoded
+
+        Defaults to the ``native_endian`` setting of the header; setting it affects data decoded afterwards.
+        Memory-mapped data keeps the byte order of the file.
+        """
+        return self._header.native_endian if self._native_endian is None else self._native_endian
+
+    @native_endian.setter
+    def native_endian(self, value):
+        self._native_endian = bool(value)
+
+    @property
+    def lazy(self):
+        """Whether the ``data`` attribute reads and decodes the stream on first access (``load_streams='lazy'``)
+
+        Otherwise ``data`` only exists once the stream has been loaded (see `load`).
+        """
+        return self._lazy
+
+    @lazy.setter
+    def lazy(self, value):
+        self._lazy = bool(value)
+
+    @property
+    def data(self):
+        """The decoded stream data; kept once loaded and, if ``lazy``, read and decoded on first access"""
+        if 'data' not in self._attrs and not self._lazy:
+            raise AttributeError('attribute data not found')
+        return self.load()
+
+    def load(self, out=None, workers=None):
+        """Read (if not yet read) and decode the stream data and keep the result as the ``data`` attribute
+
+        :param np.ndarray out: an array of the shape of the data to decode into; it becomes the ``data``
+            attribute or, if the data has been decoded before, the data is copied into it [default: None]
+        :param int workers: the number of threads on which to parse a large ASCII data stream
+            [default: None i.e. one]
+        :return np.ndarray data: the decoded data
+        """
+        if 'data' not in self._attrs:
+            if self._stream_data is None:
+                self.read()
+            self._attrs['data'] = self.get_data(out=out, workers=workers)
+        elif out is not None and out is not self._attrs['data']:
+            _check_out(out, self._attrs['data'].shape, self._attrs['data'].dtype)
+            return _copy_into(out, self._attrs['data'])
+        return self._attrs['data']
+
+    def get_data(self, out=None, workers=None):
+        """Decode and return the stream data in this stream
+
+        :param np.ndarray out: an array of the shape of the data to decode into [default: None i.e. a new array]
+        :param int workers: the number of threads on which to parse a large ASCII data stream
+            [default: None i.e. one]
+        :return np.ndarray data: the decoded data (``out`` if given)
+        """
         try:
-            assert len(self._stream_data) > 0
+            assert self._stream_data is not None and len(self._stream_data) > 0
         except AssertionError:
             raise ValueError('empty stream found')
-        return self._decode(self._stream_data)
+        data = self._decode(self._stream_data, workers=workers)
+        if out is not None:
+            _check_out(out, data.shape, data.dtype)
+            return _copy_into(out, data)
+        return data
 
 
 class AmiraMeshDataStream(AmiraDataStream):
     """Class that defines an AmiraMesh data stream"""
 
     def read(self):
-        """Extract the data streams from the AmiraMesh file"""
-        with open(self._header.filename, 'rb') as f:
-            # rewind the file pointer to the end of the header
-            f.seek(len(self._header))
-            start = int(self.data_index)  # this data streams index
-            end = start + 1
-            if self._header.data_stream_count == start:  # this is the last stream
-                data = f.read()
-                _regex = ".*?\n@{}\n(?P<stream>.*)\n".format(start).encode('ASCII')
-                regex = re.compile(_regex, re.S)
-                match = regex.match(data)
-                _stream_data = match.group('stream')
-                self._stream_data = _stream_data[:-1] if _stream_data[-1] == 10 else _stream_data
+        """Extract the data stream from the AmiraMesh file using the offset table of the header"""
+        try:
+            offset, length = self._header.stream_offsets[int(self.data_index)]
+        except KeyError:
+            raise ValueError("data stream @{} not found in file '{}'".format(self.data_index, self._header.filename))
+        if self._header.mmap and self.is_raw_binary:
+            # the data is mapped straight from the file by get_data; nothing is copied here
+            return
+        if self.is_hxzip:
+            # the data is decompressed block by block straight from the file by get_data
+            return
+        # jump straight to the start of this data stream
+        self._stream_data = self._header.read_at(offset, length)
+
+    @property
+    def is_raw_binary(self):
+        """Whether this data stream is stored as uncompressed binary data"""
+        return self._header.format == 'BINARY' and self.format is None
+
+    @property
+    def stream_length(self):
+        """The number of bytes of the stream data known from the header or ``None``
+
+        Compressed streams declare it (e.g. ``@1(HxZip,123456)``); for uncompressed binary streams it follows
+        from the shape, dimension and type of the data.
+        """
+        if self.data_length is not None:
+            return int(self.data_length)
+        if self.is_raw_binary:
+            try:
+                return int(np.prod(self.data_shape)) * self._binary_dtype().itemsize
+            except (AttributeError, KeyError, TypeError, ValueError):
+                return None
+        return None
+
+    @property
+    def is_hxzip(self):
+        """Whether this data stream is stored as binary data compressed using HxZip"""
+        return self._header.format == 'BINARY' and self.format == 'HxZip'
+
+    @property
+    def data_shape(self):
+        """The shape of the decoded data taking into account shape and dimension"""
+        if isinstance(self.shape, tuple):
+            shape = list(self.shape)
+        else:
+            shape = [self.shape]
+        if self.dimension > 1:
+            shape.append(self.dimension)
+        return tuple(shape)
+
+    def load(self, out=None, workers=None):
+        if 'data' not in self._attrs:
+            key = self._array_cache_key()
+            if self._stream_cache_kind() is not None:
+                data = read_array(self._header.filename, self._header.stream_cache, *self._stream_cache_kind())
+            else:
+                data = self._header.array_cache.get(key) if key is not None else None
+            if data is not None:
+                # neither read nor decoded
+                self._attrs['data'] = data
+        if out is not None and 'data' not in self._attrs and self._stream_data is None and self.is_raw_binary:
+            # read straight into out instead of reading the stream first
+            self._attrs['data'] = self.get_data(out=out)
+        return super(AmiraMeshDataStream, self).load(out=out, workers=workers)
+
+    def get_data(self, out=None, workers=None):
+        """Decode and return the stream data in this stream
+
+        Uncompressed binary streams are returned as read-only views into the file (``numpy.memmap``)
+        or buffer if the header was created with ``mmap=True``. Streams of file-like objects which
+        can not be mapped are read and decoded as usual.
+
+        HxZip streams are decompressed block by block straight from the file into the output array.
+
+        Passing ``out`` decodes the data into an array the caller owns e.g. a slice of a larger array
+        or a ``numpy.memmap``. Uncompressed binary streams are read from the file straight into ``out``
+        and HxZip and HxByteRLE streams are decompressed straight into ``out`` if it is C-contiguous and
+        of the type of the data; otherwise the data is decoded and converted into ``out``.
+
+        With ``native_endian`` binary data in the other byte order is returned in the native byte order; the
+        bytes of each item are reversed as the data is read or decompressed (as they are for an ``out`` array
+        of the type of the data in the other byte order).
+
+        If the header has an ``array_cache`` the decoded data is kept in it and returned as a read-only view
+        when the same stream of the unchanged file is decoded again. Data decoded into ``out`` is not cached.
+
+        If the header has a ``stream_cache`` HxZip and HxByteRLE streams are decompressed into a ``.npy`` file
+        on first use and all uses return a read-only ``numpy.memmap`` of that file.
+
+        :param np.ndarray out: an array of the shape of the data to decode into [default: None i.e. a new array]
+        :param int workers: the number of threads on which to parse a large ASCII data stream
+            [default: None i.e. one]
+        :return np.ndarray data: the decoded data (``out`` if given)
+        """
+        kind = self._stream_cache_kind()
+        if kind is not None:
+            data = read_array(self._header.filename, self._header.stream_cache, *kind)
+            if data is None:
+                data = write_array(self._header.filename, self._header.stream_cache, kind[0], kind[1],
+                                   lambda array: self._decode_data(out=array, workers=workers))
+            if data is None:
+                # the cache could not be written
+                return self._decode_data(out=out, workers=workers)
+        else:
+            key = self._array_cache_key()
+            if key is None:
+                return self._decode_data(out=out, workers=workers)
+            data = self._header.array_cache.get(key)
+            if data is None:
+                if out is not None:
+                    return self._decode_data(out=out, workers=workers)
+                data = self._header.array_cache.put(key, self._decode_data(workers=workers))
+        if out is not None:
+            _check_out(out, data.shape, data.dtype)
+            return _copy_into(out, data)
+        return data
+
+    def _decode_data(self, out=None, workers=None):
+        """Decode the stream data bypassing the array cache (see `get_data`)"""
+        if out is not None:
+            _check_out(out, self.data_shape, self._data_dtype())
+        if self._header.mmap and self.is_raw_binary:
+            offset, length = self._header.stream_offsets[int(self.data_index)]
+            dtype = _type_map[self._header.endian == 'LITTLE'][self.type]
+            shape = self.data_shape
+            try:
+                assert length >= dtype.itemsize * int(np.prod(shape))
+            except AssertionError:
+                raise ValueError('data stream @{} is shorter than its shape {}'.format(self.data_index, shape))
+            data = self._header.map_array(offset, shape, dtype)
+            if data is not None:
+                return data if out is None else _copy_into(out, data)
+            if self._stream_data is None:
+                # the stream can not be mapped so it is read after all
+                self._stream_data = self._header.read_at(offset, length)
+        if out is None and self._swaps_bytes():
+            return self._decode_data(out=np.empty(self.data_shape, dtype=self._data_dtype()), workers=workers)
+        if out is not None and self._header.format == 'BINARY' and \
+                self._binary_dtype().newbyteorder() != self._binary_dtype() and \
+                _out_bytes(out, self._binary_dtype().newbyteorder()) is not None and \
+                (self._stream_data is None or len(self._stream_data) > 0):
+            # decoded straight into out reversing the bytes of each item
+            blocks = self._iter_stream_blocks() if self._stream_data is None else [self._stream_data]
+            self._decode_blocks(blocks, out=out.view(self._binary_dtype()), swap=True)
+            return out
+        elif self.is_raw_binary and self._stream_data is None and out is not None and \
+                _out_bytes(out, self._binary_dtype()) is not None:
+            offset, length = self._header.stream_offsets[int(self.data_index)]
+            output = _out_bytes(out, self._binary_dtype())
+            try:
+                assert length >= len(output) and self._header.read_into(offset, output) == len(output)
+            except AssertionError:
+                raise ValueError('data stream @{} is shorter than its shape {}'.format(self.data_index, out.shape))
+            return out
+        elif self.is_hxzip and self._stream_data is None:
+            return self._decode_blocks(self._iter_stream_blocks(), out=out)
+        elif out is not None and self._stream_data is None:
+            # load did not read the stream so that it could be read straight into out
+            self.read()
+        if out is not None and self._header.format == 'BINARY' and self.format is not None and self._stream_data:
+            return self._decode_blocks([self._stream_data], out=out)
+        return super(AmiraMeshDataStream, self).get_data(out=out, workers=workers)
+
+    def iter_slices(self, chunk=16, start=None, stop=None):
+        """Iterate over the decoded data in blocks of at most ``chunk`` slices along the first axis
+
+        For lattices the first axis is the stack (z) axis. Uncompressed, HxZip and HxByteRLE streams are read
+        from the file and decoded incrementally so that memory use is proportional to ``chunk`` instead of
+        the whole stream. Streams which have already been decoded, memory-mapped streams and ASCII streams
+        are yielded as views into the whole array.
+
+        Uncompressed streams are read from ``start`` onwards. HxZip and HxByteRLE streams are decoded from the
+        nearest preceding access point if the header was created with ``stream_index`` and from the
+        beginning otherwise.
+
+        :param int chunk: the maximum number of slices in each block [default: 16]
+        :param int start: the first slice [default: 0]
+        :param int stop: the slice after the last slice [default: all slices]
+        :return generator blocks: tuples ``(start, array)`` with the index of the first slice in the block and
+            an array of shape ``(n,) + data_shape[1:]`` where ``n <= chunk``
+        """
+        chunk = int(chunk)
+        try:
+            assert chunk > 0
+        except AssertionError:
+            raise ValueError('chunk must be positive: {}'.format(chunk))
+        shape = self.data_shape
+        start, stop, _ = slice(start, stop).indices(shape[0])
+        if 'data' in self._attrs or self._header.format != 'BINARY' or (self._header.mmap and self.is_raw_binary):
+            data = self.load()
+            for first in range(start, stop, chunk):
+                yield first, data[first:min(first + chunk, stop)]
+            return
+        dtype = self._binary_dtype()
+        slice_size = int(np.prod(shape[1:])) * dtype.itemsize
+        if start >= stop:
+            return
+        decoder = self._stream_decoder(start * slice_size)
+        for first in range(start, stop, chunk):
+            count = min(chunk, stop - first)
+            output = decoder.fill(np.empty(count * slice_size, dtype=np.uint8)).view(dtype)
+            if self._swaps_bytes():
+                output = _to_native(output)
+            yield first, output.reshape((count,) + shape[1:])
+
+    def build_index(self, span=None):
+        """Build an index of access points from which this compressed stream can be decoded
+
+        The access points are about ``span`` bytes of decoded data apart. For HxByteRLE streams the count
+        bytes of the runs are scanned without decoding the stream and each access point is a run boundary
+        ``(in, out)`` at byte ``in`` of the raw stream and byte ``out`` of the decoded data. HxZip streams are
+        decompressed once and each access point ``(in, bits, out, window)`` is the end of a deflate block
+        together with the preceding 32 KiB of output (compressed) needed to resume decompression
+        (see ``decoders.hxzip_build_index``), so ``span`` balances the size of the index against the amount of
+        data decompressed to reach any part of the stream.
+
+        :param int span: the number of decoded bytes between access points [default: ``STREAM_INDEX_SPAN``]
+        :return list points: the access points in the order of the stream or ``None`` for HxZip streams if the
+            C-extension was built without zlib or before Python 3.3
+        """
+        try:
+            assert self._header.format == 'BINARY' and self.format in ('HxZip', 'HxByteRLE')
+        except AssertionError:
+            raise ValueError('data stream @{} is not compressed'.format(self.data_index))
+        if span is None:
+            span = STREAM_INDEX_SPAN
+        if self.is_hxzip and hxzip_build_index is None:
+            warnings.warn("HxZip streams can not be indexed without the zlib-enabled C-extension")
+            return None
+        if self.is_hxzip and not _ZLIB_ZDICT:
+            warnings.warn("HxZip streams can not be decompressed from an access point before Python 3.3")
+            return None
+        if self._stream_data is not None:
+            data = self._stream_data
+        else:
+            offset, length = self._header.stream_offsets[int(self.data_index)]
+            # the whole stream is passed to the index builder; map it rather than reading it if possible
+            data = self._header.map_array(offset, (length,), np.uint8)
+            if data is None:
+                data = self._header.read_at(offset, length)
+        if self.format == 'HxByteRLE':
+            return hxbyterle_build_index(data, span)
+        return [(in_, bits, out, zlib.compress(window)) for in_, bits, out, window in hxzip_build_index(data, span)]
+
+    def to_shared_memory(self, name=None):
+        """Decode the stream data into a new block of shared memory
+
+        The data is decoded straight into the shared memory as by ``get_data(out=...)`` (or copied if it has
+        been decoded before). The returned `SharedArray` may be passed to other processes e.g. as an argument of
+        a ``multiprocessing.Pool`` task; only its name, shape and dtype are pickled and it attaches to the
+        shared memory where it is unpickled. The shared memory lives until `SharedArray.unlink` is called.
+
+        .. code:: python
+
+            shared = af.data_streams.Labels.to_shared_memory()
+            try:
+                results = pool.map(analyse, [(shared, z) for z in range(shared.shape[0])])
+            finally:
+                shared.close()
+                shared.unlink()
+
+        :param str name: the name of the shared memory block [default: None i.e. a new unique name]
+        :return SharedArray shared: the decoded data in shared memory
+        """
+        try:
+            assert shared_memory is not None
+        except AssertionError:
+            raise ValueError("shared memory requires Python 3.8 or later")
+        if 'data' in self._attrs:
+            shape, dtype = self._attrs['data'].shape, self._attrs['data'].dtype
+        else:
+            shape, dtype = self.data_shape, self._data_dtype()
+        shared = SharedArray(name, shape, dtype, create=True)
+        try:
+            if 'data' in self._attrs:
+                _copy_into(shared.array, self._attrs['data'])
+            else:
+                self.get_data(out=shared.array)
+        except Exception:
+            shared.close()
+            shared.unlink()
+            raise
+        return shared
+
+    def read_region(self, z=None, y=None, x=None):
+        """Read the region of the lattice selected by slices along the z, y and x axes
+
+        Only the bytes of the region are read from uncompressed binary streams; rows which follow each other
+        in the file are read together. Compressed streams are decoded slice by slice up to the last slice of
+        the region and cropped. Streams which have already been decoded, memory-mapped streams and ASCII
+        streams are sliced from the whole array.
+
+        Two dimensional lattices only have y and x axes and one dimensional lattices only have an x axis.
+
+        :param slice z: the slices of the stack to read [default: all]
+        :param slice y: the rows to read [default: all]
+        :param slice x: the columns to read [default: all]
+        :return np.ndarray region: an array of shape ``(nz, ny, nx)`` (followed by the ``dimension`` of the
+            stream if it is greater than 1)
+        """
+        shape = self.data_shape
+        lattice_shape = shape[:-1] if self.dimension > 1 else shape
+        try:
+            assert 0 < len(lattice_shape) <= 3
+        except AssertionError:
+            raise ValueError('regions can only be read from 1, 2 or 3 dimensional lattices')
+        axes = (('z', z), ('y', y), ('x', x))
+        for name, selection in axes[:3 - len(lattice_shape)]:
+            if selection is not None:
+                raise ValueError("lattice of data stream @{} has no {} axis".format(self.data_index, name))
+        region = list()
+        for (name, selection), size in zip(axes[3 - len(lattice_shape):], lattice_shape):
+            if selection is None:
+                selection = slice(None)
+            elif not isinstance(selection, slice):
+                raise ValueError("{} must be a slice or None: {}".format(name, selection))
+            region.append(range(*selection.indices(size)))
+        region_shape = tuple(len(r) for r in region) + shape[len(lattice_shape):]
+        if 'data' in self._attrs or self._header.format != 'BINARY' or (self._header.mmap and self.is_raw_binary):
+            return self.load()[np.ix_(*region)]
+        if not self.is_raw_binary:
+            return self._crop_slices(region, region_shape)
+        dtype = self._binary_dtype()
+        item_size = dtype.itemsize * int(np.prod(shape[len(lattice_shape):]))
+        output = np.empty((int(np.prod(region_shape[:len(lattice_shape) - 1])), len(region[-1]), item_size),
+                          dtype=np.uint8)
+        if output.size:
+            try:
+                offset, length = self._header.stream_offsets[int(self.data_index)]
+            except KeyError:
+                raise ValueError(
+                    "data stream @{} not found in file '{}'".format(self.data_index, self._header.filename))
+            try:
+                assert length >= item_size * int(np.prod(lattice_shape))
+            except AssertionError:
+                raise ValueError('data stream @{} is shorter than its shape {}'.format(self.data_index, shape))
+            # each row of the region is read from x_start up to and including x_end
+            x_start, x_end = min(region[-1]), max(region[-1])
+            row_size = (x_end - x_start + 1) * item_size
+            if region[-1][0] == x_start and len(region[-1]) == x_end - x_start + 1:
+                columns = slice(None)
+            else:
+                columns = np.array(region[-1]) - x_start
+            # the file offsets of the rows of the region in the order of the output
+            rows = np.zeros(1, dtype=np.int64)
+            for selection, size in zip(region[:-1], lattice_shape[:-1]):
+                rows = (rows[:, np.newaxis] * size + np.asarray(selection, dtype=np.int64)).ravel()
+            row_offsets = offset + (rows * lattice_shape[-1] + x_start) * item_size
+            # rows which follow each other in the file with at most REGION_READ_GAP bytes between them are
+            # grouped into runs which are read at once
+            gaps = row_offsets[1:] - row_offsets[:-1] - row_size
+            starts = np.flatnonzero((gaps < 0) | (gaps > REGION_READ_GAP)) + 1
+            starts = np.concatenate(([0], starts, [len(row_offsets)]))
+            for first, last in zip(starts[:-1].tolist(), starts[1:].tolist()):
+                run_offset = int(row_offsets[first])
+                run_size = int(row_offsets[last - 1]) - run_offset + row_size
+                data = np.frombuffer(self._header.read_at(run_offset, run_size), dtype=np.uint8)
+                if run_size == (last - first) * row_size:
+                    data = data.reshape(last - first, row_size)
+                else:
+                    data = data[(row_offsets[first:last] - run_offset)[:, np.newaxis] + np.arange(row_size)]
+                output[first:last] = data.reshape(last - first, -1, item_size)[:, columns]
+        output = output.view(dtype)
+        if self._swaps_bytes():
+            output = _to_native(output)
+        return output.reshape(region_shape)
+
+    def _crop_slices(self, region, region_shape):
+        """Decode a compressed stream slice by slice up to the last slice of ``region`` and crop the slices"""
+        output = np.empty(region_shape, dtype=self._data_dtype())
+        if output.size:
+            stack = np.array(region[0], dtype=np.intp)
+            for start, block in self.iter_slices(start=stack.min(), stop=stack.max() + 1):
+                selected = (stack >= start) & (stack < start + len(block))
+                if selected.any():
+                    output[selected] = block[np.ix_(stack[selected] - start, *region[1:])]
+                if start + len(block) > stack.max():
+                    break
+        return output
+
+    def _array_cache_key(self):
+        """The key of the decoded data in the array cache of the header or ``None`` if it is not cached
+
+        The key is the identity of the file (see :py:func:`ahds.cache.source_key`), the data index and the type of
+        the decoded data. Memory-mapped streams and streams of unnamed sources are not cached.
+        """
+        if self._header.array_cache is None or self._header.filename is None or \
+                (self._header.mmap and self.is_raw_binary) or self._stream_cache_kind() is not None:
+            return None
+        try:
+            return source_key(self._header.filename) + (int(self.data_index), self._data_dtype().str)
+        except (IOError, OSError):
+            return None
+
+    def _stream_cache_kind(self):
+        """The kind and check of the decompressed data in the stream cache of the header (see
+        :py:func:`ahds.cache.read_array`) or ``None`` if it is not cached
+
+        Only HxZip and HxByteRLE streams are cached.
+        """
+        if not self._header.stream_cache or self._header.format != 'BINARY' or \
+                self.format not in ('HxZip', 'HxByteRLE'):
+            return None
+        dtype = self._data_dtype()
+        kind = 'stream-{}'.format(int(self.data_index)) + ('-native' if self._swaps_bytes() else '')
+        return kind, (self._header.header_hash, self.data_shape, dtype.str)
+
+    def _data_dtype(self):
+        """The dtype of the decoded data"""
+        if self._header.format == 'BINARY':
+            if self._swaps_bytes():
+                return self._binary_dtype().newbyteorder('=')
+            return self._binary_dtype()
+        return _type_map[self.type]
+
+    def _swaps_bytes(self):
+        """Whether decoding reverses the bytes of each item to convert the data to the native byte order"""
+        return self.native_endian and self._header.format == 'BINARY' and not self._binary_dtype().isnative
+
+    def _binary_dtype(self):
+        """The dtype of the decoded data of a binary stream"""
+        if self.format == 'HxByteRLE':
+            return np.dtype(np.uint8)
+        elif self.format in (None, 'HxZip'):
+            return _type_map[self._header.endian == 'LITTLE'][self.type]
+        raise ValueError('unknown data stream format: \'{}\''.format(self.format))
+
+    def _iter_stream_blocks(self, block_size=None, start=0):
+        """Iterate over the raw bytes of this stream in blocks of at most ``block_size`` bytes
+
+        The stream is read block by block from the file unless it has been read already.
+
+        :param int block_size: the size of each block [default: ``STREAM_BLOCK_SIZE``]
+        :param int start: the position in the raw stream of the first byte [default: 0]
+        """
+        if block_size is None:
+            block_size = STREAM_BLOCK_SIZE
+        if self._stream_data is not None:
+            view = memoryview(self._stream_data)
+            for position in range(start, len(view), block_size):
+                yield view[position:position + block_size]
+            return
+        try:
+            offset, length = self._header.stream_offsets[int(self.data_index)]
+        except KeyError:
+            raise ValueError("data stream @{} not found in file '{}'".format(self.data_index, self._header.filename))
+        for position in range(start, length, block_size):
+            yield self._header.read_at(offset + position, min(block_size, length - position))
+
+    def _stream_decoder(self, start):
+        """A `StreamDecoder` for this binary stream positioned at byte ``start`` of the decoded data"""
+        if self.format is None:
+            return StreamDecoder(None, self._iter_stream_blocks(start=start))
+        points = self._header.get_stream_index(self)
+        if not points or (self.is_hxzip and not _ZLIB_ZDICT):
+            # an index read from the cache is of no use without zlib dictionaries
+            decoder = StreamDecoder(self.format, self._iter_stream_blocks())
+        elif self.is_hxzip:
+            # the last access point at or before start
+            in_, bits, out, window = points[max(bisect.bisect_right([p[2] for p in points], start) - 1, 0)]
+            if bits:
+                blocks = _shift_bits(self._iter_stream_blocks(start=in_ - 1), 8 - bits)
             else:
-                data = f.read()
-                _regex = ".*?\n@{}\n(?P<stream>.*)\n@{}\n".format(start, end).encode('ASCII')
-                regex = re.compile(_regex, re.S)
-                match = regex.match(data)
-                self._stream_data = match.group('stream')
+                blocks = self._iter_stream_blocks(start=in_)
+            decoder = StreamDecoder(self.format, blocks, zdict=zlib.decompress(window))
+            start -= out
+        else:
+            in_, out = points[max(bisect.bisect_right([p[1] for p in points], start) - 1, 0)]
+            decoder = StreamDecoder(self.format, self._iter_stream_blocks(start=in_))
+            start -= out
+        decoder.skip(start)
+        return decoder
+
+    def _decode_blocks(self, blocks, out=None, swap=False):
+        """Decode the raw blocks of a binary stream straight into an array of the shape of the stream
 
-    def _decode(self, data):
+        :param np.ndarray out: a checked array to decode into; the data is decoded straight into it
+            if possible [default: None i.e. a new array]
+        :param bool swap: whether to reverse the bytes of each item of a contiguous ``out`` of the type of the
+            stream as the data is decoded [default: False]
+        """
+        dtype = self._binary_dtype()
+        output = _out_bytes(out, dtype) if out is not None else None
+        decoder = StreamDecoder(self.format, blocks)
+        if output is not None:
+            if swap:
+                _fill_swapped(decoder, output, dtype)
+            else:
+                decoder.fill(output)
+            decoder.finish()
+            return out
+        output = np.empty(int(np.prod(self.data_shape)) * dtype.itemsize, dtype=np.uint8)
+        decoder.fill(output)
+        decoder.finish()
+        data = output.view(dtype).reshape(self.data_shape)
+        return data if out is None else _copy_into(out, data)
+
+    def _decode(self, data, workers=None):
         """Performs data stream decoding by introspecting the header information"""
         # determine the new output shape
         # take into account shape and dimension
-        if isinstance(self.shape, tuple):
-            if self.dimension > 1:
-                new_shape = tuple(list(self.shape) + [self.dimension])
-            else:
-                new_shape = (self.shape, )
-        elif isinstance(self.shape, int):
-            if self.dimension > 1:
-                new_shape = tuple([self.shape, self.dimension])
-            else:
-                new_shape = (self.shape, )
+        new_shape = self.data_shape
         # first we handle binary files
         # NOTE ON HOW LATTICES ARE STORED
         # AmiraMesh files state the dimensions of the lattice as nx, ny, nz
@@ -294,27 +1308,25 @@ class AmiraMeshDataStream(AmiraDataStream):
                 return np.frombuffer(
                     data,
                     dtype=_type_map[is_little_endian][self.type]
-                ).reshape(*new_shape)
+                ).reshape(new_shape)
             elif self.format == 'HxZip':
-                return np.frombuffer(
-                    zlib.decompress(data),
-                    dtype=_type_map[is_little_endian][self.type]
-                ).reshape(*new_shape)
+                return self._decode_blocks([data])
             elif self.format == 'HxByteRLE':
                 size = int(np.prod(np.array(self.shape)))
                 return hxbyterle_decode(
                     data,
                     size
-                ).reshape(*new_shape)
+                ).reshape(new_shape)
             else:
                 raise ValueError('unknown data stream format: \'{}\''.format(self.format))
         # explicit instead of assumption
         elif self._header.format == 'ASCII':
-            return np.fromstring(
+            return ascii_decode(
                 data,
-                dtype=_type_map[self.type],
-                sep="\n \t"
-            ).reshape(*new_shape)
+                _type_map[self.type],
+                int(np.prod(new_shape)),
+                workers=workers
+            ).reshape(new_shape)
         else:
             raise ValueError("unknown file format: {}".format(self._header.format))
 
@@ -322,117 +1334,124 @@ class AmiraMeshDataStream(AmiraDataStream):
 class AmiraHxSurfaceDataStream(AmiraDataStream):
     """Class that defines an Amira HxSurface data stream"""
 
-    def read(self):
-        """Extract the data streams from the HxSurface file"""
-        with open(self._header.filename, 'rb') as f:
-            # rewind the file pointer to the end of the header
-            f.seek(len(self._header))
-            data = f.read()
-            # get the vertex count and streams
-            _vertices_regex = r".*?\n" \
-                              r"Vertices (?P<vertex_count>\d+)\n" \
-                              r"(?P<streams>.*)".encode('ASCII')
-            vertices_regex = re.compile(_vertices_regex, re.S)
-            match_vertices = vertices_regex.match(data)
-            # todo: fix for full.surf and simple.surf
-            # print(f"streams: {match_vertices.group('streams')}")
-            vertex_count = int(match_vertices.group('vertex_count'))
-            # get the patches
-            # fixme: general case for NBranchingPoints, NVerticesOnCurves, BoundaryCurves being non-zero
-            stream_regex = r"(?P<vertices>.*?)\n" \
-                           r"NBranchingPoints (?P<branching_point_count>\d+)\n" \
-                           r"NVerticesOnCurves (?P<vertices_on_curves_count>\d+)\n" \
-                           r"BoundaryCurves (?P<boundary_curve_count>\d+)\n" \
-                           r"Patches (?P<patch_count>\d+)\n" \
-                           r"(?P<patches>.*)".encode('ASCII')
-            match_streams = re.match(stream_regex, match_vertices.group('streams'), re.S)
-            # instatiate the vertex block
-            vertices_block = AmiraHxSurfaceDataStream('Vertices', self._header)
-            # set the data for this stream
-            vertices_block._stream_data = match_streams.group('vertices')
-            # length, type and dimension are needed for decoding
-            vertices_block.add_attr('length', vertex_count)
-            vertices_block.add_attr('type', 'float')
-            vertices_block.add_attr('dimension', 3)
-            vertices_block.add_attr('data', vertices_block.get_data())
-            vertices_block.add_attr('NBranchingPoints', 0)
-            vertices_block.add_attr('NVerticesOnCurves', 0)
-            vertices_block.add_attr('BoundaryCurves', 0)
-            # instantiate the patches block
-            patches_block = AmiraHxSurfaceDataStream('Patches', self._header)
-            patch_count = int(match_streams.group('patch_count'))
-            patches_block.add_attr('length', patch_count)
-            # get the triangles and contents of each patch
-            # fixme: general case for BoundaryID, BranchingPoints being non-zero
-            #  i've not seen an example with loaded fields
-            # todo: consider compiling regular expressions
-            # NOTE:
-            # There is a subtlety with this regex:
-            # It might be the case that the last part matches bytes that end in '\n[}]\n'
-            # that are not the end of the stream. The only way to remede this is to include the
-            # extra brace [{] so that it now matches '\n[}]\n[{]', which is more likely to
-            # correspond to the end of the patch. However this introduces a problem:
-            # we will not be able to match the last patch unless we also add [{] to the stream to match.
-            # This also means that start_from argument will be wrong given that it will have past
-            # the starting point of the next patch. This is trivial to solve because we simply
-            # backtrack start_from by 1.
-            # These are noted in NOTE A and NOTE B below.
-            _patch_regex = r"[{]\n" \
-                           r"InnerRegion (?P<patch_inner_region>.*?)\n" \
-                           r"OuterRegion (?P<patch_outer_region>.*?)\n" \
-                           r"BoundaryID (?P<patch_boundary_id>\d+)\n" \
-                           r"BranchingPoints (?P<patch_branching_points>\d+)\n" \
-                           r"\s+\n" \
-                           r"Triangles (?P<triangle_count>.*?)\n" \
-                           r"(?P<triangles>.*?)\n" \
-                           r"[}]\n[{]".encode('ASCII')
-            patch_regex = re.compile(_patch_regex, re.S)
-            # start from the beginning
-            start_from = 0
-            for p_id in range(patch_count):
-                # NOTE A
-                match_patch = patch_regex.match(match_streams.group('patches') + b'{', start_from)
-                patch_block = AmiraHxSurfaceDataStream('Patch', self._header)
-                patch_block.add_attr('InnerRegion', match_patch.group('patch_inner_region').decode('utf-8'))
-                patch_block.add_attr('OuterRegion', match_patch.group('patch_outer_region').decode('utf-8'))
-                patch_block.add_attr('BoundaryID', int(match_patch.group('patch_boundary_id')))
-                patch_block.add_attr('BranchingPoints', int(match_patch.group('patch_branching_points')))
-                # let's now add the triangles from the patch
-                triangles_block = AmiraHxSurfaceDataStream('Triangles', self._header)
-                # set the raw data stream
-                triangles_block._stream_data = match_patch.group('triangles')
-                # decoding needs to have the length, type, and dimension
-                triangles_block.add_attr('length', int(match_patch.group('triangle_count')))
-                triangles_block.add_attr('type', 'int')
-                triangles_block.add_attr('dimension', 3)
-                # print('debug:', int(match_patch.group('triangle_count')), len(match_patch.group('triangles')))
-                # print('debug:', match_patch.group('triangles')[:20])
-                # print('debug:', match_patch.group('triangles')[-20:])
-                triangles_block.add_attr('data', triangles_block.get_data())
-                # now we can add the triangles block to the patch...
-                patch_block.add_attr(triangles_block)
-                # then we collate the patches
-                patches_block.append(patch_block)
-                # the next patch begins where the last patch ended
-                # NOTE B
-                start_from = match_patch.end() - 1  # backtrack by 1
-            # add the patches to the vertices
-            vertices_block.add_attr(patches_block)
-            # add the vertices to the data stream
-            self.add_attr(vertices_block)
-
-    def _decode(self, data):
+    def read(self, workers=None):
+        """Extract the data streams from the HxSurface file
+
+        :param int workers: the number of threads on which to parse large ASCII data streams
+            [default: None i.e. one]
+        """
+        # everything after the header
+        data = self._header.read_at(len(self._header))
+        # get the vertex count and streams
+        _vertices_regex = r".*?\n" \
+                          r"Vertices (?P<vertex_count>\d+)\n" \
+                          r"(?P<streams>.*)".encode('ASCII')
+        vertices_regex = re.compile(_vertices_regex, re.S)
+        match_vertices = vertices_regex.match(data)
+        # todo: fix for full.surf and simple.surf
+        # print(f"streams: {match_vertices.group('streams')}")
+        vertex_count = int(match_vertices.group('vertex_count'))
+        # get the patches
+        # fixme: general case for NBranchingPoints, NVerticesOnCurves, BoundaryCurves being non-zero
+        stream_regex = r"(?P<vertices>.*?)\n" \
+                       r"NBranchingPoints (?P<branching_point_count>\d+)\n" \
+                       r"NVerticesOnCurves (?P<vertices_on_curves_count>\d+)\n" \
+                       r"BoundaryCurves (?P<boundary_curve_count>\d+)\n" \
+                       r"Patches (?P<patch_count>\d+)\n" \
+                       r"(?P<patches>.*)".encode('ASCII')
+        match_streams = re.match(stream_regex, match_vertices.group('streams'), re.S)
+        # instatiate the vertex block
+        vertices_block = AmiraHxSurfaceDataStream('Vertices', self._header)
+        # set the data for this stream
+        vertices_block._stream_data = match_streams.group('vertices')
+        # length, type and dimension are needed for decoding
+        vertices_block.add_attr('length', vertex_count)
+        vertices_block.add_attr('type', 'float')
+        vertices_block.add_attr('dimension', 3)
+        vertices_block.load(workers=workers)
+        vertices_block.add_attr('NBranchingPoints', 0)
+        vertices_block.add_attr('NVerticesOnCurves', 0)
+        vertices_block.add_attr('BoundaryCurves', 0)
+        # instantiate the patches block
+        patches_block = AmiraHxSurfaceDataStream('Patches', self._header)
+        patch_count = int(match_streams.group('patch_count'))
+        patches_block.add_attr('length', patch_count)
+        # get the triangles and contents of each patch
+        # fixme: general case for BoundaryID, BranchingPoints being non-zero
+        #  i've not seen an example with loaded fields
+        # todo: consider compiling regular expressions
+        # NOTE:
+        # There is a subtlety with this regex:
+        # It might be the case that the last part matches bytes that end in '\n[}]\n'
+        # that are not the end of the stream. The only way to remede this is to include the
+        # extra brace [{] so that it now matches '\n[}]\n[{]', which is more likely to
+        # correspond to the end of the patch. However this introduces a problem:
+        # we will not be able to match the last patch unless we also add [{] to the stream to match.
+        # This also means that start_from argument will be wrong given that it will have past
+        # the starting point of the next patch. This is trivial to solve because we simply
+        # backtrack start_from by 1.
+        # These are noted in NOTE A and NOTE B below.
+        _patch_regex = r"[{]\n" \
+                       r"InnerRegion (?P<patch_inner_region>.*?)\n" \
+                       r"OuterRegion (?P<patch_outer_region>.*?)\n" \
+                       r"BoundaryID (?P<patch_boundary_id>\d+)\n" \
+                       r"BranchingPoints (?P<patch_branching_points>\d+)\n" \
+                       r"\s+\n" \
+                       r"Triangles (?P<triangle_count>.*?)\n" \
+                       r"(?P<triangles>.*?)\n" \
+                       r"[}]\n[{]".encode('ASCII')
+        patch_regex = re.compile(_patch_regex, re.S)
+        # start from the beginning
+        start_from = 0
+        for p_id in range(patch_count):
+            # NOTE A
+            match_patch = patch_regex.match(match_streams.group('patches') + b'{', start_from)
+            patch_block = AmiraHxSurfaceDataStream('Patch', self._header)
+            patch_block.add_attr('InnerRegion', match_patch.group('patch_inner_region').decode('utf-8'))
+            patch_block.add_attr('OuterRegion', match_patch.group('patch_outer_region').decode('utf-8'))
+            patch_block.add_attr('BoundaryID', int(match_patch.group('patch_boundary_id')))
+            patch_block.add_attr('BranchingPoints', int(match_patch.group('patch_branching_points')))
+            # let's now add the triangles from the patch
+            triangles_block = AmiraHxSurfaceDataStream('Triangles', self._header)
+            # set the raw data stream
+            triangles_block._stream_data = match_patch.group('triangles')
+            # decoding needs to have the length, type, and dimension
+            triangles_block.add_attr('length', int(match_patch.group('triangle_count')))
+            triangles_block.add_attr('type', 'int')
+            triangles_block.add_attr('dimension', 3)
+            # print('debug:', int(match_patch.group('triangle_count')), len(match_patch.group('triangles')))
+            # print('debug:', match_patch.group('triangles')[:20])
+            # print('debug:', match_patch.group('triangles')[-20:])
+            triangles_block.load(workers=workers)
+            # now we can add the triangles block to the patch...
+            patch_block.add_attr(triangles_block)
+            # then we collate the patches
+            patches_block.append(patch_block)
+            # the next patch begins where the last patch ended
+            # NOTE B
+            start_from = match_patch.end() - 1  # backtrack by 1
+        # add the patches to the vertices
+        vertices_block.add_attr(patches_block)
+        # add the vertices to the data stream
+        self.add_attr(vertices_block)
+
+    def _decode(self, data, workers=None):
         is_little_endian = self._header.endian == 'LITTLE'
         if self._header.format == 'BINARY':
-            return np.frombuffer(
+            data = np.frombuffer(
                 data,
                 dtype=_type_map[is_little_endian][self.type]
             ).reshape(self.length, self.dimension)
+            if self.native_endian and not data.dtype.isnative:
+                # a single pass copying and reversing the bytes of each item
+                return data.astype(data.dtype.newbyteorder('='))
+            return data
         elif self._header.format == 'ASCII':
-            return np.fromstring(
+            return ascii_decode(
                 data,
-                dtype=_type_map[self.type],
-                sep="\n \t"
+                _type_map[self.type],
+                self.length * self.dimension,
+                workers=workers
             ).reshape(self.length, self.dimension)
 
 
@@ -11,6 +11,8 @@ This module also includes several helper functions that use the grammar resource
 
 *   the `get_header` function returns only the header up to the first data stream; data is returned as a decoded string (`UTF-8`);
 
+*   the `get_stream_offsets` function locates the byte range of every data stream in a single pass;
+
 *   the `parse_header` function applies the grammar to return a nested set of Python primitives to be transformed into an `AmiraHeader` object;
 
 *   the `get_parsed_data` function transparently applied both above functions given the Amira (R) filename
@@ -21,14 +23,17 @@ from __future__ import print_function
 
 import re
 import sys
+import threading
 
 # simpleparse
 from simpleparse.parser import Parser
 from simpleparse.common import numbers, strings
 from simpleparse.dispatchprocessor import DispatchProcessor, getString, dispatchList, dispatch, singleMap, multiMap
+from simpleparse.stt.TextTools import tag
 
 from .core import _decode_string, _dict_iter_items, _dict_iter_keys
 from .proc import AmiraDispatchProcessor
+from .source import opened
 
 # on autoformat these two lines disappear; adding them here in case that happens
 # from simpleparse.common import numbers, strings
@@ -179,7 +184,7 @@ else:
 def detect_format(fn, format_bytes=50, verbose=False, *args, **kwargs):
     """Detect Amira (R) file format (AmiraMesh/Avizo or HyperSurface)
     
-    :param str fn: file name
+    :param fn: file name or :py:class:`ahds.source.Source`
     :param int format_bytes: number of bytes in which to search for the format [default: 50]
     :param bool verbose: verbose (default) or not
     :return str file_format: either ``AmiraMesh`` or ``HyperSurface``
@@ -187,8 +192,8 @@ def detect_format(fn, format_bytes=50, verbose=False, *args, **kwargs):
     assert format_bytes > 0
     assert verbose in [True, False]
 
-    with open(fn, 'rb') as f:
-        rough_header = f.read(format_bytes)
+    with opened(fn) as source:
+        rough_header = source.read_at(0, format_bytes)
 
         if _file_format_match[0].match(rough_header):
             file_format = "AmiraMesh"
@@ -223,7 +228,7 @@ def _swap_illegal_chars(byte_seq, seq_map):
 def get_header(fn, file_format, header_bytes=20000, verbose=False, *args, **kwargs):
     """Apply rules for detecting the boundary of the header
     
-    :param str fn: file name
+    :param fn: file name or :py:class:`ahds.source.Source`
     :param str file_format: either ``AmiraMesh`` or ``HyperSurface``
     :param bool verbose: verbose output; default False
     :param int header_bytes: number of bytes in which to search for the header [default: 20000]
@@ -235,9 +240,10 @@ def get_header(fn, file_format, header_bytes=20000, verbose=False, *args, **kwar
     except AssertionError:
         raise ValueError("unknown file format: {}".format(file_format))
 
-    with open(fn, 'rb') as f:
+    with opened(fn) as source:
         # read a first chunk and store it in the first element of the list of header chunks
-        _data = f.read(header_bytes if header_bytes >= _rescan_overlap else _rescan_overlap)
+        _data = source.read_at(0, header_bytes if header_bytes >= _rescan_overlap else _rescan_overlap)
+        position = len(_data)
 
         data = _swap_illegal_chars(_data, SEQ_MAP)
 
@@ -248,7 +254,9 @@ def get_header(fn, file_format, header_bytes=20000, verbose=False, *args, **kwar
             m = _stream_delimiters[0].search(data)
             while m is None:
                 _chunklen = len(data) - _rescan_overlap
-                data += f.read(header_bytes)
+                chunk = source.read_at(position, header_bytes)
+                position += len(chunk)
+                data += chunk
                 m = _stream_delimiters[0].search(data, _chunklen)
         elif file_format == "HyperSurface":
             if verbose:
@@ -258,7 +266,9 @@ def get_header(fn, file_format, header_bytes=20000, verbose=False, *args, **kwar
             m = _stream_delimiters[1].search(data)
             while m is None:
                 _chunklen = len(data) - _rescan_overlap
-                data += f.read(header_bytes)
+                chunk = source.read_at(position, header_bytes)
+                position += len(chunk)
+                data += chunk
                 m = _stream_delimiters[1].search(data, _chunklen)
         elif file_format == "Undefined":
             raise ValueError("Unable to parse undefined file")
@@ -267,6 +277,160 @@ def get_header(fn, file_format, header_bytes=20000, verbose=False, *args, **kwar
     return _decode_string(data[:m.start()])
 
 
+class _MarkerScanner(object):
+    """Find markers in the data section of a file reading each byte at most once while the search advances
+
+    The bytes read are kept in a buffer which only grows at its end and drops what has been passed over;
+    a search starting beyond the buffer (e.g. after skipping the data of a stream) starts a new buffer there.
+    """
+
+    def __init__(self, source, chunk_bytes):
+        self._source = source
+        self._chunk_bytes = chunk_bytes
+        # the bytes read and the file position of the first one
+        self._data = b''
+        self._start = 0
+
+    def at(self, position, marker):
+        """Whether ``marker`` is at the file position ``position``"""
+        offset = position - self._start
+        if 0 <= offset and offset + len(marker) <= len(self._data):
+            return self._data[offset:offset + len(marker)] == marker
+        return self._source.read_at(position, len(marker)) == marker
+
+    def find(self, marker, start):
+        """Return the file position of the first ``marker`` at or after ``start`` or -1 if there is none"""
+        if not self._start <= start <= self._start + len(self._data):
+            self._data, self._start = b'', start
+        position = self._data.find(marker, start - self._start)
+        while position < 0:
+            end = self._start + len(self._data)
+            chunk = self._source.read_at(end, self._chunk_bytes)
+            if not chunk:
+                return -1
+            # only keep enough bytes to match a marker straddling the chunk boundary
+            cut = max(start, end - len(marker) + 1, self._start)
+            self._data = self._data[cut - self._start:] + chunk
+            self._start = cut
+            position = self._data.find(marker)
+        return self._start + position
+
+
+def get_stream_offsets(fn, header_length, stream_indices, stream_lengths=None, chunk_bytes=1048576, verbose=False,
+                       *args, **kwargs):
+    """Locate all data streams of an AmiraMesh file in a single pass over the data section
+
+    The data of each stream starts immediately after its ``@<n>`` marker line and ends at the
+    newline preceding the next marker or, for the last stream, at the end of the file (trailing
+    newlines excluded). Where the header declares the byte length of a stream (e.g.
+    ``@1(HxZip,123456)``) or implies it (uncompressed binary data) the following marker is expected
+    right after that number of bytes and the stream data is skipped; otherwise (or if the marker is
+    not found there) the data section is scanned in chunks of ``chunk_bytes`` for the next marker.
+    Each byte scanned is read once however many markers are found in it.
+
+    :param fn: file name or :py:class:`ahds.source.Source`
+    :param int header_length: number of header bytes preceding the first data stream
+    :param list stream_indices: data stream indices (``<n>`` in ``@<n>``) to locate
+    :param dict stream_lengths: byte lengths of data streams known from the header by data stream index
+        [default: None]
+    :param int chunk_bytes: number of bytes read per chunk [default: 1048576]
+    :param bool verbose: verbose output; default False
+    :return dict offsets: maps each data stream index found to a tuple ``(offset, length)`` in bytes
+    """
+    assert chunk_bytes > 0
+    offsets = dict()
+    stream_indices = sorted(set(stream_indices))
+    if stream_lengths is None:
+        stream_lengths = dict()
+    if not stream_indices:
+        return offsets
+    with opened(fn) as source:
+        scanner = _MarkerScanner(source, chunk_bytes)
+        start = header_length
+        last = None  # (index, offset) of the previously located stream
+        for index in stream_indices:
+            marker = "\n@{}\n".format(index).encode('ASCII')
+            position = -1
+            if last is not None and stream_lengths.get(last[0]) is not None:
+                # the declared length of the previous stream points straight at this marker
+                declared_end = last[1] + stream_lengths[last[0]]
+                if scanner.at(declared_end, marker):
+                    position = declared_end
+            if position < 0:
+                if verbose:
+                    print("Scanning for data stream @{}...".format(index), file=sys.stderr)
+                position = scanner.find(marker, start)
+            if position < 0:
+                break
+            if last is not None:
+                offsets[last[0]] = (last[1], position - last[1])
+            last = (index, position + len(marker))
+            start = last[1]
+        if last is not None:
+            declared_length = stream_lengths.get(last[0])
+            # the size of the file is only needed if the stream has no declared length which fits in the file
+            # because it is expensive to determine for compressed files
+            if declared_length is not None and (
+                    declared_length == 0 or len(source.read_at(last[1] + declared_length - 1, 1)) == 1):
+                offsets[last[0]] = (last[1], declared_length)
+            else:
+                # the last stream extends to the end of the file without its trailing newlines
+                end = source.size
+                tail = source.read_at(max(end - 2, last[1]))
+                for byte in reversed(bytearray(tail)):
+                    if byte != 10:
+                        break
+                    end -= 1
+                offsets[last[0]] = (last[1], max(end - last[1], 0))
+    return offsets
+
+
+# the parser compiled from amira_header_grammar, the dispatch processor and the tag table built from both;
+# compiling the grammar and building the tag table take longer than parsing most headers
+_parser = None
+_processor = None
+_tagger = None
+_parser_lock = threading.Lock()
+
+
+def warm():
+    """Compile the header grammar and build the dispatch processor and tag table now instead of on first use
+
+    They are created once per process and shared by all threads. Pass this function as the ``initializer`` of
+    a process pool to compile the grammar in each worker before the first file is opened e.g.
+    ``multiprocessing.Pool(initializer=ahds.grammar.warm)``.
+    """
+    global _parser, _processor, _tagger
+    if _tagger is not None:
+        return
+    with _parser_lock:
+        if _tagger is None:
+            parser = Parser(amira_header_grammar)
+            processor = AmiraDispatchProcessor()
+            tagger = parser.buildTagger('amira', processor)
+            _parser, _processor = parser, processor
+            # set last as it marks the others as ready
+            _tagger = tagger
+
+
+def get_parser():
+    """The parser for Amira (R) headers, compiled on first use and reused thereafter
+
+    :return parser: the ``simpleparse.parser.Parser`` for ``amira_header_grammar``
+    """
+    warm()
+    return _parser
+
+
+def get_processor():
+    """The dispatch processor for Amira (R) headers, created on first use and reused thereafter
+
+    :return processor: the :py:class:`ahds.proc.AmiraDispatchProcessor`
+    """
+    warm()
+    return _processor
+
+
 def parse_header(data, verbose=False, *args, **kwargs):
     """Parse the data using the grammar specified in this module
     
@@ -274,20 +438,17 @@ def parse_header(data, verbose=False, *args, **kwargs):
     :param bool verbose: verbose output; default False
     :return list parsed_data: structured metadata
     """
-    # the parser
+    # the parser, processor and tag table are created once and reused
     if verbose:
         print("Creating parser object...", file=sys.stderr)
-    parser = Parser(amira_header_grammar)
-
-    # the processor
-    if verbose:
-        print("Defining dispatch processor...", file=sys.stderr)
-    amira_processor = AmiraDispatchProcessor()
+    warm()
 
     # parsing
     if verbose:
         print("Parsing data...", file=sys.stderr)
-    success, parsed_data, next_item = parser.parse(data, production='amira', processor=amira_processor)
+    # the same as get_parser().parse(data, production='amira', processor=get_processor()) without
+    # building the tag table again
+    success, parsed_data, next_item = _processor(tag(data, _tagger, 0, len(data)), data)
 
     if success:
         if verbose:
@@ -300,10 +461,11 @@ def parse_header(data, verbose=False, *args, **kwargs):
 def get_parsed_data(fn, *args, **kwargs):
     """All above functions as a single function
     
-    :param str fn: file name
+    :param fn: file name or :py:class:`ahds.source.Source`
     :return tuple(list,int) parsed_data,header_length: structured metadata and total number of header bytes
     """
-    file_format = detect_format(fn, *args, **kwargs)
-    data = get_header(fn, file_format, *args, **kwargs)
+    with opened(fn) as source:
+        file_format = detect_format(source, *args, **kwargs)
+        data = get_header(source, file_format, *args, **kwargs)
     parsed_data = parse_header(data, *args, **kwargs)
     return data, parsed_data, len(data), file_format
@@ -118,13 +118,17 @@ https://assets.thermofisher.com/TFS-Assets/MSD/Product-Guides/user-guide-amira-s
 """
 from __future__ import print_function
 
+import collections
+import hashlib
 import sys
 import numpy
 import warnings
 
+from .cache import ArrayCache, get_array_cache, read_cache, write_cache
 from .core import Block, deprecated, ListBlock
-from .data_stream import set_data_stream
-from .grammar import get_parsed_data
+from .data_stream import set_data_stream, STREAM_INDEX_SPAN
+from .grammar import detect_format, get_header, get_parsed_data, get_stream_offsets, parse_header
+from .source import CompressedSource, open_source, opened, Source
 
 
 class AmiraHeader(Block):
@@ -135,14 +139,73 @@ class AmiraHeader(Block):
     # which will be stored inside the __dict__ attribute of the Block base class
     __slots__ = (
         '_fn', '_parsed_data', '_header_length', '_file_format', '_parameters', '_load_streams',
-        '_data_stream_count')
+        '_data_stream_count', '_stream_offsets', '_mmap', '_cache', '_source', '_stream_index', '_stream_indexes',
+        '_native_endian', '_array_cache', '_stream_cache', '_owns_source')
 
     # fixme: load_streams should be False by default
-    def __init__(self, fn, load_streams=True, *args, **kwargs):
-        """Construct an AmiraHeader object from parsed data"""
-        self._fn = fn
-        self._literal_data, self._parsed_data, self._header_length, self._file_format = get_parsed_data(fn, *args,
-                                                                                                        **kwargs)
+    def __init__(self, fn, load_streams=True, mmap=False, cache=None, stream_index=None, native_endian=False,
+                 array_cache=None, stream_cache=None, *args, **kwargs):
+        """Construct an AmiraHeader object from parsed data
+
+        :param fn: Amira file name or an open :py:class:`ahds.source.Source` through which all reading is done;
+            compressed files (e.g. ``file.am.gz``) given by name are kept open until `close` so that they are
+            not decompressed again for every read while other files are opened for each read
+        :param bool load_streams: whether (default) or not to load data streams
+        :param bool mmap: whether or not (default) to memory-map uncompressed binary data streams
+        :param cache: ``True`` to keep the parsed header and stream offsets in a sidecar file or the name
+            of a cache directory (see :py:mod:`ahds.cache`) [default: None i.e. no caching]
+        :param stream_index: ``True`` or the number of decoded bytes between access points to index HxZip and
+            HxByteRLE streams for random access by ``iter_slices`` and ``read_region``; indexes are kept in
+            the cache if one is given [default: None i.e. no indexing]
+        :param bool native_endian: whether or not (default) to convert binary data in the other byte order
+            (e.g. big-endian files on little-endian machines) to the native byte order as it is decoded
+        :param array_cache: an :py:class:`ahds.cache.ArrayCache` to keep decoded AmiraMesh data streams in
+            or ``False`` to not cache them [default: None i.e. the process-wide cache if it is enabled]
+        :param stream_cache: ``True`` to keep decompressed HxZip and HxByteRLE streams in ``.npy`` files next to
+            the file or the name of a cache directory for them (see :py:mod:`ahds.cache`); cached streams are
+            mapped as read-only ``numpy.memmap`` arrays [default: None i.e. no caching]
+        """
+        try:
+            assert array_cache is None or array_cache is False or isinstance(array_cache, ArrayCache)
+        except AssertionError:
+            raise ValueError("array_cache must be None, False or an ArrayCache")
+        self._owns_source = False
+        if isinstance(fn, Source):
+            self._source = fn
+            self._fn = fn.name
+        else:
+            self._source = None
+            self._fn = fn
+            source = open_source(fn)
+            if isinstance(source, CompressedSource):
+                # keeps the decompressed blocks and checkpoints of the file between reads
+                self._source = fn = source
+                self._owns_source = True
+            else:
+                source.close()
+        self._mmap = mmap
+        self._native_endian = native_endian
+        self._array_cache = get_array_cache() if array_cache is None else array_cache or None
+        self._cache = cache
+        self._stream_cache = stream_cache
+        self._stream_index = stream_index
+        # indexes of compressed streams by data index; loaded or built on first use
+        self._stream_indexes = None
+        # byte ranges of the data streams; located on first access
+        self._stream_offsets = None
+        # only files with a name can be cached
+        if self._fn is None:
+            self._cache = cache = None
+            self._stream_cache = None
+        cached = read_cache(self._fn, cache, 'header') if cache else None
+        if cached is None:
+            self._literal_data, self._parsed_data, self._header_length, self._file_format = get_parsed_data(
+                fn, *args, **kwargs)
+            if cache:
+                self._write_cache()
+        else:
+            self._literal_data, self._parsed_data, self._header_length, self._file_format, \
+                self._stream_offsets = cached
         # load the streams
         self._load_streams = load_streams
         # data stream count
@@ -161,6 +224,44 @@ class AmiraHeader(Block):
     def filename(self):
         return self._fn
 
+    def read_at(self, offset, length=-1):
+        """Read ``length`` bytes of the file at ``offset``
+
+        The shared :py:class:`ahds.source.Source` is used if the header was created from one;
+        otherwise the file is opened for the duration of the read.
+        """
+        with opened(self._source if self._source is not None else self._fn) as source:
+            return source.read_at(offset, length)
+
+    def read_into(self, offset, buffer):
+        """Read the bytes of the file at ``offset`` into the writable ``buffer``
+
+        :return int count: the number of bytes read
+        """
+        with opened(self._source if self._source is not None else self._fn) as source:
+            return source.read_into(offset, buffer)
+
+    def map_array(self, offset, shape, dtype):
+        """Map ``shape`` items of ``dtype`` at ``offset`` into a read-only array without copying them
+
+        :return np.ndarray array: the mapped array or ``None`` if the file can not be mapped
+        """
+        with opened(self._source if self._source is not None else self._fn) as source:
+            return source.map_array(offset, shape, dtype)
+
+    def close(self):
+        """Close the compressed file the header keeps open; headers of other files have nothing to close"""
+        if self._owns_source:
+            self._source.close()
+
+    def __del__(self):
+        # the compressed file is closed even if close() is never called
+        try:
+            self.close()
+        except AttributeError:
+            # not fully initialised
+            pass
+
     @property
     def literal_data(self):
         return self._literal_data
@@ -183,10 +284,85 @@ class AmiraHeader(Block):
             raise TypeError("must be a bool")
         self._load_streams = value
 
+    @property
+    def mmap(self):
+        """Reports whether uncompressed binary data streams are memory-mapped"""
+        return self._mmap
+
+    @property
+    def native_endian(self):
+        """Reports whether binary data streams are converted to the native byte order"""
+        return self._native_endian
+
+    @property
+    def array_cache(self):
+        """The :py:class:`ahds.cache.ArrayCache` decoded data streams are kept in or ``None``"""
+        return self._array_cache
+
+    @property
+    def stream_cache(self):
+        """Where decompressed data streams are cached (see :py:mod:`ahds.cache`) or ``None``"""
+        return self._stream_cache
+
+    @property
+    def header_hash(self):
+        """A hash of the text of the header"""
+        literal_data = self._literal_data
+        if not isinstance(literal_data, bytes):
+            literal_data = literal_data.encode('utf-8')
+        return hashlib.sha1(literal_data).hexdigest()
+
     @property
     def data_stream_count(self):
         return self._data_stream_count
 
+    @property
+    def stream_offsets(self):
+        """Table mapping each data stream index to the ``(offset, length)`` of its data in bytes
+
+        The table is built by a single scan over the data section on first access which skips
+        the data of streams of a known byte length (see ``AmiraMeshDataStream.stream_length``).
+        """
+        if self._stream_offsets is None:
+            self._stream_offsets = get_stream_offsets(
+                self._source if self._source is not None else self._fn, len(self), [int(ds.data_index) for ds in self._data_streams_block_list],
+                stream_lengths=dict(
+                    (int(ds.data_index), ds.stream_length) for ds in self._data_streams_block_list
+                )
+            )
+            if self._cache:
+                self._write_cache()
+        return self._stream_offsets
+
+    def get_stream_index(self, stream):
+        """The index of access points into the compressed data stream ``stream``
+
+        The index is read from the cache or built on first use (see ``AmiraMeshDataStream.build_index``).
+
+        :param stream: an HxZip or HxByteRLE `AmiraMeshDataStream` of this header
+        :return list points: the access points or ``None`` if streams are not indexed
+        """
+        if not self._stream_index:
+            return None
+        span = STREAM_INDEX_SPAN if self._stream_index is True else int(self._stream_index)
+        if self._stream_indexes is None:
+            self._stream_indexes = (read_cache(self._fn, self._cache, 'index') if self._cache else None) or dict()
+        data_index = int(stream.data_index)
+        if data_index not in self._stream_indexes or self._stream_indexes[data_index][0] != span:
+            points = stream.build_index(span)
+            if points is None:
+                return None
+            self._stream_indexes[data_index] = span, points
+            if self._cache:
+                write_cache(self._fn, self._cache, 'index', self._stream_indexes)
+        return self._stream_indexes[data_index][1]
+
+    def _write_cache(self):
+        """Store the parsed header and stream offsets in the cache"""
+        write_cache(self._fn, self._cache, 'header', (
+            self._literal_data, self._parsed_data, self._header_length, self._file_format, self._stream_offsets
+        ))
+
     def load(self):
         """Public loading method"""
         self._load()
@@ -385,6 +561,7 @@ class AmiraHeader(Block):
             else:
                 block.add_attr('shape', _shape)
             block.add_attr('format', defn.get('data_format', None))
+            block.add_attr('data_length', defn.get('data_length', None))
             # insert this definition as an attribute
             # parent.add_attr(block)
             # keep track of data streams
@@ -393,3 +570,90 @@ class AmiraHeader(Block):
     def __repr__(self):
         return "AmiraHeader('{}')".format(self.filename)
 
+
+# the records returned by peek
+HeaderRecord = collections.namedtuple('HeaderRecord', [
+    'filetype', 'format', 'endian', 'version', 'dimension', 'arrays', 'streams', 'materials', 'header_length'])
+StreamRecord = collections.namedtuple('StreamRecord', [
+    'name', 'data_index', 'array', 'type', 'dimension', 'shape', 'format', 'data_length'])
+MaterialRecord = collections.namedtuple('MaterialRecord', ['name', 'id'])
+
+
+def _peek_designation(designation):
+    """The format and endianness of the file as set by `AmiraHeader`"""
+    format = designation.get('format')
+    if format == 'BINARY':
+        return format, 'BIG'
+    elif format == 'ASCII':
+        return format, None
+    elif format == 'BINARY-LITTLE-ENDIAN':
+        return 'BINARY', 'LITTLE'
+    raise ValueError(
+        u'unsupported format {format}; kindly consider contacting the maintainer to include support. Thanks.'.format(
+            format=format))
+
+
+def _peek_materials(parameters):
+    """The names and Ids of the materials in the parsed parameters"""
+    for param in parameters:
+        if param.get('parameter_name') == 'Materials' and isinstance(param.get('parameter_value'), list):
+            materials = list()
+            for material in param['parameter_value']:
+                material_id = None
+                if isinstance(material.get('parameter_value'), list):
+                    for attr in material['parameter_value']:
+                        if isinstance(attr, dict) and attr.get('parameter_name') == 'Id':
+                            material_id = attr['parameter_value']
+                materials.append(MaterialRecord(material.get('parameter_name'), material_id))
+            return tuple(materials)
+    return tuple()
+
+
+def peek(fn, header_bytes=4096, verbose=False):
+    """Read the essentials of the header of an Amira (R) file without building an `AmiraHeader`
+
+    Only the header up to the first data stream is read and parsed; no ``Block`` objects are created and
+    no data stream is located or read. This is meant for cataloguing many files:
+
+    .. code:: python
+
+        record = ahds.peek('file.am')
+        print(record.filetype, record.format, [(stream.name, stream.shape) for stream in record.streams])
+
+    :param fn: Amira file name or any other object accepted by `AmiraFile`
+    :param int header_bytes: the number of bytes read at a time while looking for the end of the header
+        [default: 4096]
+    :param bool verbose: verbose output; default False
+    :return record: a `HeaderRecord` of the ``filetype``, ``format`` (``BINARY`` or ``ASCII``), ``endian``,
+        ``version``, ``dimension`` (e.g. ``3D``), ``arrays`` (an ordered dict of the array declarations
+        by name with their shapes in C order), ``streams`` (a tuple of `StreamRecord` of the AmiraMesh data
+        stream definitions in the order of the header; empty for HyperSurface files), ``materials``
+        (a tuple of `MaterialRecord`) and ``header_length``
+    """
+    with opened(fn) as source:
+        file_format = detect_format(source, verbose=verbose)
+        data = get_header(source, file_format, header_bytes=header_bytes, verbose=verbose)
+    block_data = AmiraHeader.flatten_dict(parse_header(data, verbose=verbose))
+    designation = block_data['designation']
+    format, endian = _peek_designation(designation)
+    arrays = collections.OrderedDict()
+    for decl in block_data.get('array_declarations', []):
+        shape = decl['array_dimension']
+        arrays[decl['array_name']] = tuple(shape.tolist()[::-1]) if isinstance(shape, numpy.ndarray) else shape
+    streams = list()
+    if designation.get('filetype') != 'HyperSurface':
+        for defn in block_data.get('data_definitions', []):
+            dimension = defn.get('data_dimension', 1)
+            shape = arrays.get(defn['array_reference'])
+            if shape is not None:
+                shape = list(shape) if isinstance(shape, tuple) else [shape]
+                if dimension > 1:
+                    shape.append(dimension)
+                shape = tuple(shape)
+            streams.append(StreamRecord(
+                defn['data_name'], defn['data_index'], defn['array_reference'], defn['data_type'], dimension,
+                shape, defn.get('data_format', None), defn.get('data_length', None)))
+    return HeaderRecord(
+        designation.get('filetype', None), format, endian, designation.get('version', None),
+        designation.get('dimension', None), arrays, tuple(streams),
+        _peek_materials(block_data.get('parameters', [])), len(data))
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+"""
+source
+======
+
+Random access to the bytes of Amira (R) files.
+
+All reading of Amira (R) files (format detection, header extraction and reading data streams) goes through
+a `Source` object which reads a number of bytes at a given offset using ``read_at``. This allows a single
+open file to be shared by all phases of reading instead of opening the file again for each of them.
+
+* `FileSource` reads a file on disk through a single file descriptor
+* `BufferSource` slices an in-memory buffer such as ``bytes``, ``bytearray``, ``memoryview`` or ``mmap.mmap``
+* `FileObjectSource` seeks and reads any seekable binary file-like object such as ``io.BytesIO``
+* `CompressedSource` decompresses the content of a gzip, bzip2 or xz compressed file read by another `Source`
+
+The `open_source` function picks the right `Source` for a file name, buffer or file-like object. Files
+compressed with gzip, bzip2 or xz (e.g. ``file.am.gz``) are recognised by their magic bytes and read
+through a `CompressedSource` without decompressing them to disk.
+
+The `opened` context manager is used by functions which accept either a file name or a `Source`; a file
+name is opened for the duration of the call while a `Source` is used as is and left open.
+
+"""
+from __future__ import print_function
+
+import bz2
+import collections
+import contextlib
+import os
+import sys
+import threading
+import zlib
+
+try:
+    import lzma
+except ImportError:  # Python2
+    lzma = None
+
+import numpy as np
+
+if sys.version_info[0] > 2:
+    _path_types = (str,)
+else:
+    _path_types = (str, unicode)  # noqa: F821
+
+# largest number of bytes requested from a single os.pread call; some platforms fail on larger reads
+_MAX_READ = 1 << 30
+
+# the magic bytes at the start of compressed files and the names of the compression formats
+_COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bzip2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+
+
+def _byte_view(buffer):
+    """A flat array of the bytes of ``buffer`` sharing its memory (``memoryview.cast`` is Python 3 only)"""
+    return np.frombuffer(buffer, dtype=np.uint8)
+
+
+class Source(object):
+    """Base class for random access to the bytes of an Amira (R) file"""
+
+    def __init__(self, name):
+        self._name = name
+        self._closed = False
+
+    @property
+    def name(self):
+        """The name of the file or ``None`` if it has none"""
+        return self._name
+
+    @property
+    def size(self):
+        """The total number of bytes"""
+        raise NotImplementedError
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def read_at(self, offset, length=-1):
+        """Read ``length`` bytes starting at ``offset``
+
+        Fewer bytes are returned if the end is reached before.
+
+        :param int offset: the position of the first byte to read
+        :param int length: the number of bytes to read; all remaining bytes if negative [default: -1]
+        :return bytes data: the bytes read
+        """
+        raise NotImplementedError
+
+    def read_into(self, offset, buffer):
+        """Read bytes starting at ``offset`` into the writable ``buffer``
+
+        Fewer bytes are read if the end is reached before the buffer is full.
+
+        :param int offset: the position of the first byte to read
+        :param buffer: a writable object supporting the buffer protocol e.g. a ``numpy`` array of bytes
+        :return int count: the number of bytes read
+        """
+        view = _byte_view(buffer)
+        data = self.read_at(offset, len(view))
+        if data:
+            view[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        return len(data)
+
+    def map_array(self, offset, shape, dtype):
+        """Return a read-only array viewing the bytes at ``offset`` without copying them
+
+        :param int offset: the position of the first byte of the array
+        :param tuple shape: the shape of the array
+        :param dtype: the ``numpy.dtype`` of the array
+        :return np.ndarray array: the array or ``None`` if this source can not be mapped
+        """
+        return None
+
+    def close(self):
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return "{}('{}')".format(type(self).__name__, self._name)
+
+
+class FileSource(Source):
+    """Random access to a file on disk through a single file descriptor
+
+    Reads use ``os.pread`` where available so that concurrent reads need no locking; otherwise the
+    file position is moved under a lock.
+    """
+
+    def __init__(self, fn):
+        super(FileSource, self).__init__(fn)
+        self._file = open(fn, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read_at(self, offset, length=-1):
+        if self._closed:
+            raise ValueError("I/O operation on closed file '{}'".format(self._name))
+        if length < 0:
+            length = max(self._size - offset, 0)
+        if hasattr(os, 'pread'):
+            chunks = list()
+            while length > 0:
+                chunk = os.pread(self._file.fileno(), min(length, _MAX_READ), offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+                length -= len(chunk)
+            return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def read_into(self, offset, buffer):
+        if self._closed:
+            raise ValueError("I/O operation on closed file '{}'".format(self._name))
+        view = _byte_view(buffer)
+        count = 0
+        while count < len(view):
+            if hasattr(os, 'preadv'):
+                size = os.preadv(self._file.fileno(), [view[count:count + _MAX_READ]], offset + count)
+            else:
+                with self._lock:
+                    self._file.seek(offset + count)
+                    size = self._file.readinto(view[count:count + _MAX_READ])
+            if not size:
+                break
+            count += size
+        return count
+
+    def map_array(self, offset, shape, dtype):
+        return np.memmap(self._file, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    def __reduce__(self):
+        # the file is opened again by name where the source is unpickled e.g. in another process
+        return type(self), (self._name,)
+
+    def close(self):
+        if not self._closed:
+            self._file.close()
+        super(FileSource, self).close()
+
+
+class BufferSource(Source):
+    """Random access to an in-memory buffer by slicing it
+
+    Any object supporting the buffer protocol may be used e.g. ``bytes``, ``bytearray``, ``memoryview``
+    or ``mmap.mmap``.
+    """
+
+    def __init__(self, data, name=None):
+        super(BufferSource, self).__init__(name)
+        self._view = memoryview(data)
+        if self._view.ndim != 1 or self._view.itemsize != 1:
+            self._view = memoryview(_byte_view(data))
+
+    @property
+    def size(self):
+        return len(self._view)
+
+    def read_at(self, offset, length=-1):
+        if self._closed:
+            raise ValueError("I/O operation on closed buffer")
+        if length < 0:
+            return self._view[offset:].tobytes()
+        return self._view[offset:offset + length].tobytes()
+
+    def read_into(self, offset, buffer):
+        if self._closed:
+            raise ValueError("I/O operation on closed buffer")
+        view = _byte_view(buffer)
+        data = self._view[offset:offset + len(view)]
+        if len(data):
+            view[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        return len(data)
+
+    def map_array(self, offset, shape, dtype):
+        if self._closed:
+            raise ValueError("I/O operation on closed buffer")
+        count = int(np.prod(shape))
+        array = np.frombuffer(self._view, dtype=dtype, count=count, offset=offset).reshape(shape)
+        array.flags.writeable = False
+        return array
+
+    def close(self):
+        self._view = memoryview(b'')
+        super(BufferSource, self).close()
+
+
+class FileObjectSource(Source):
+    """Random access to a seekable binary file-like object by seeking and reading under a lock
+
+    The file-like object is not closed when the source is closed.
+    """
+
+    def __init__(self, fileobj):
+        name = getattr(fileobj, 'name', None)
+        super(FileObjectSource, self).__init__(name if isinstance(name, _path_types) else None)
+        self._fileobj = fileobj
+        self._lock = threading.Lock()
+        with self._lock:
+            self._size = fileobj.seek(0, 2)
+            if self._size is None:  # Python2 file objects return None from seek
+                self._size = fileobj.tell()
+
+    @property
+    def size(self):
+        return self._size
+
+    def read_at(self, offset, length=-1):
+        if self._closed:
+            raise ValueError("I/O operation on closed file-like object")
+        if length < 0:
+            length = max(self._size - offset, 0)
+        chunks = list()
+        with self._lock:
+            self._fileobj.seek(offset)
+            # unbuffered file-like objects may return fewer bytes than requested
+            while length > 0:
+                chunk = self._fileobj.read(length)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                length -= len(chunk)
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+
+class CompressedSource(Source):
+    """Random access to the decompressed content of a gzip, bzip2 or xz compressed file
+
+    The compressed file is read through another `Source` and decompressed sequentially as it is read.
+    Recently used blocks of ``BLOCK_SIZE`` decompressed bytes are kept so that the header and neighbouring
+    reads are only decompressed once. Reading before the current position resumes decompression from the
+    nearest preceding checkpoint: a copy of the decompressor is kept every ``CHECKPOINT_SPAN`` decompressed
+    bytes of gzip files and at the start of every stream of multi-stream files (e.g. from ``pigz``,
+    ``pbzip2`` or ``xz -T``); otherwise decompression restarts from the beginning.
+
+    Determining the ``size`` decompresses the whole file.
+    """
+    # number of decompressed bytes per cached block
+    BLOCK_SIZE = 1 << 20
+    # number of cached blocks
+    CACHED_BLOCKS = 32
+    # number of decompressed bytes between checkpoints of gzip files
+    CHECKPOINT_SPAN = 1 << 24
+
+    def __init__(self, raw, compression):
+        """
+        :param raw: the `Source` of the compressed file which is closed with this source
+        :param str compression: the compression format: ``gzip``, ``bzip2`` or ``xz``
+        """
+        super(CompressedSource, self).__init__(raw.name)
+        if compression == 'gzip':
+            self._new_decompressor = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif compression == 'bzip2' and sys.version_info[0] > 2:
+            self._new_decompressor = bz2.BZ2Decompressor
+        elif compression == 'xz' and lzma is not None:
+            self._new_decompressor = lzma.LZMADecompressor
+        else:
+            raise ValueError("unable to read {} compressed data with this Python".format(compression))
+        self._raw = raw
+        self._compression = compression
+        self._lock = threading.RLock()
+        self._blocks = collections.OrderedDict()
+        # (decompressed position, compressed position, copy of the decompressor or None for a new stream)
+        self._checkpoints = [(0, 0, None)]
+        self._size = None
+        self._restart(self._checkpoints[0])
+
+    @property
+    def compression(self):
+        """The compression format: ``gzip``, ``bzip2`` or ``xz``"""
+        return self._compression
+
+    @property
+    def size(self):
+        with self._lock:
+            if self._size is None:
+                while self._decompress(self.BLOCK_SIZE):
+                    pass
+                self._size = self._position
+            return self._size
+
+    def read_at(self, offset, length=-1):
+        if self._closed:
+            raise ValueError("I/O operation on closed file '{}'".format(self._name))
+        with self._lock:
+            if length < 0:
+                length = max(self.size - offset, 0)
+            chunks = list()
+            block_index = offset // self.BLOCK_SIZE
+            start = offset - block_index * self.BLOCK_SIZE
+            while length > 0:
+                block = self._block(block_index)
+                chunk = block[start:start + length]
+                chunks.append(chunk)
+                length -= len(chunk)
+                if len(block) < self.BLOCK_SIZE:
+                    break  # end of content
+                block_index += 1
+                start = 0
+            return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def close(self):
+        if not self._closed:
+            self._raw.close()
+            self._blocks.clear()
+            self._checkpoints = list()
+            self._decompressor = None
+        super(CompressedSource, self).close()
+
+    def __reduce__(self):
+        # decompression starts afresh where the source is unpickled
+        return type(self), (self._raw, self._compression)
+
+    def _block(self, index):
+        """The decompressed block ``index`` which is shorter than ``BLOCK_SIZE`` at the end of the content"""
+        block = self._blocks.pop(index, None)
+        if block is None:
+            start = index * self.BLOCK_SIZE
+            if start < self._position:
+                self._restart([c for c in self._checkpoints if c[0] <= start][-1])
+            while self._position < start:
+                if not self._decompress(min(start - self._position, self.BLOCK_SIZE)):
+                    break
+            chunks = list()
+            length = 0
+            while self._position >= start and length < self.BLOCK_SIZE:
+                chunk = self._decompress(self.BLOCK_SIZE - length)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                length += len(chunk)
+            block = b''.join(chunks)
+            if len(self._blocks) >= self.CACHED_BLOCKS:
+                self._blocks.popitem(last=False)
+        # the most recently used block is last
+        self._blocks[index] = block
+        return block
+
+    def _restart(self, checkpoint):
+        """Resume decompression at a checkpoint"""
+        self._position, self._raw_position, decompressor = checkpoint
+        self._decompressor = self._new_decompressor() if decompressor is None else decompressor.copy()
+        # whether the current decompressor has been given any data
+        self._started = decompressor is not None
+        self._input = b''
+
+    def _decompress(self, max_length):
+        """Decompress at most ``max_length`` bytes at the current position
+
+        :return bytes data: the decompressed bytes; empty only at the end of the content
+        """
+        while True:
+            decompressor = self._decompressor
+            if self._started and decompressor.eof:
+                # another stream may follow; the data after the end of the stream (including the unconsumed
+                # input of zlib) is in unused_data
+                self._input = decompressor.unused_data
+                self._decompressor = self._new_decompressor()
+                self._started = False
+                if self._checkpoints[-1][0] < self._position:
+                    self._checkpoints.append((self._position, self._raw_position - len(self._input), None))
+                continue
+            if not self._input and (self._compression == 'gzip' or decompressor.needs_input):
+                self._input = self._raw.read_at(self._raw_position, self.BLOCK_SIZE)
+                self._raw_position += len(self._input)
+            if not self._started:
+                if self._compression == 'gzip':
+                    # gzip files may be padded with zeros after the last stream
+                    self._input = self._input.lstrip(b'\x00')
+                if not self._input:
+                    if self._raw_position >= self._raw.size:
+                        return b''
+                    continue
+                self._started = True
+            if self._compression == 'gzip':
+                data = decompressor.decompress(self._input, max_length)
+                self._input = decompressor.unconsumed_tail
+            elif decompressor.needs_input:
+                data = decompressor.decompress(self._input, max_length)
+                self._input = b''
+            else:
+                data = decompressor.decompress(b'', max_length)
+            if data:
+                self._position += len(data)
+                if self._compression == 'gzip' and \
+                        self._position - self._checkpoints[-1][0] >= self.CHECKPOINT_SPAN:
+                    self._checkpoints.append(
+                        (self._position, self._raw_position - len(self._input), decompressor.copy()))
+                return data
+            if not decompressor.eof and not self._input and self._raw_position >= self._raw.size and \
+                    (self._compression == 'gzip' or decompressor.needs_input):
+                raise ValueError("compressed file '{}' is truncated".format(self._name))
+
+
+def is_path(fn):
+    """Whether ``fn`` is a file name or path-like object (which can be opened again by name)"""
+    return isinstance(fn, _path_types) or (hasattr(os, 'PathLike') and isinstance(fn, os.PathLike))
+
+
+def open_source(fn):
+    """Return a `Source` for ``fn``
+
+    Compressed content is recognised by its magic bytes and decompressed through a `CompressedSource`.
+
+    :param fn: a file name, an object supporting the buffer protocol (e.g. ``bytes``, ``memoryview``,
+        ``mmap.mmap``), a seekable binary file-like object or a `Source` (which is returned unchanged)
+    :return source: a `Source` to read ``fn``
+    """
+    if isinstance(fn, Source):
+        return fn
+    if isinstance(fn, _path_types):
+        source = FileSource(fn)
+    elif hasattr(os, 'PathLike') and isinstance(fn, os.PathLike):
+        source = FileSource(os.fspath(fn))
+    else:
+        try:
+            source = BufferSource(fn)
+        except TypeError:
+            if hasattr(fn, 'read') and hasattr(fn, 'seek'):
+                source = FileObjectSource(fn)
+            else:
+                raise TypeError("unable to read Amira (R) data from object of type {}".format(type(fn)))
+    magic = source.read_at(0, 6)
+    for compression_magic, compression in _COMPRESSION_MAGIC:
+        if magic.startswith(compression_magic):
+            try:
+                return CompressedSource(source, compression)
+            except Exception:
+                source.close()
+                raise
+    return source
+
+
+@contextlib.contextmanager
+def opened(fn):
+    """Context manager providing a `Source` for ``fn``
+
+    A `Source` is provided as is and left open; anything else is opened and closed on exit.
+    """
+    if isinstance(fn, Source):
+        yield fn
+    else:
+        source = open_source(fn)
+        try:
+            yield source
+        finally:
+            source.close()
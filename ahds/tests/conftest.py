@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+import sys
+
+# the asyncio front end and its tests need Python 3.5 or later
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 5) else []
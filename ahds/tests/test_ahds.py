@@ -7,7 +7,7 @@ import sys
 
 import ahds
 from . import Py23FixTestCase, TEST_DATA_PATH
-from ..ahds import parse_args, get_debug, get_literal, get_paths, set_file_and_paths, get_amira_file
+from ..ahds import parse_args, get_debug, get_literal, get_paths, set_file_and_paths, get_amira_file, get_streams
 from ..core import _str, _print
 import numpy
 
@@ -88,115 +88,122 @@ class TestMain(Py23FixTestCase):
         """Test that we can get the Amira (R) file"""
         args = _parse_with_shlex("ahds -d {}".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        self.assertIsInstance(af, ahds.AmiraFile)
+        with get_amira_file(f, args) as af:
+            self.assertIsInstance(af, ahds.AmiraFile)
+
+    def test_get_amira_file_streams(self):
+        """Test that selecting streams loads them"""
+        args = _parse_with_shlex("ahds --stream Labels {}".format(os.path.join(TEST_DATA_PATH, 'test9.am')))
+        f, p = set_file_and_paths(args)
+        with get_amira_file(f, args) as af:
+            self.assertIn('data', af.data_streams.Labels.attrs())
 
     def test_get_debug(self):
         """Test that we can get debug info"""
         args = _parse_with_shlex("ahds -d {}".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        string = get_debug(af, args)
-        self.assertIsInstance(string, _str)
-        des = re.compile(r".*\'designation\'.*", re.S)
-        com = re.compile(r".*\'comment\'.*", re.S)
-        par = re.compile(r".*\'parameters\'.*", re.S)
-        dat = re.compile(r".*\'data_definitions\'.*", re.S)
-        des_m = des.match(string)
-        self.assertIsNotNone(des_m)
-        com_m = com.match(string)
-        self.assertIsNotNone(com_m)
-        par_m = par.match(string)
-        self.assertIsNotNone(par_m)
-        dat_m = dat.match(string)
-        self.assertIsNotNone(dat_m)
+        with get_amira_file(f, args) as af:
+            string = get_debug(af, args)
+            self.assertIsInstance(string, _str)
+            des = re.compile(r".*\'designation\'.*", re.S)
+            com = re.compile(r".*\'comment\'.*", re.S)
+            par = re.compile(r".*\'parameters\'.*", re.S)
+            dat = re.compile(r".*\'data_definitions\'.*", re.S)
+            des_m = des.match(string)
+            self.assertIsNotNone(des_m)
+            com_m = com.match(string)
+            self.assertIsNotNone(com_m)
+            par_m = par.match(string)
+            self.assertIsNotNone(par_m)
+            dat_m = dat.match(string)
+            self.assertIsNotNone(dat_m)
 
     def test_get_literal(self):
         """Test that we can get literal header info"""
         args = _parse_with_shlex("ahds -l {}".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        string = get_literal(af, args)
-        self.assertIsInstance(string, _str)
-        am = re.compile(r".*AmiraMesh 3D BINARY.*", re.S)
-        cd = re.compile(r".*CreationDate.*", re.S)
-        de = re.compile(r".*define Lattice.*", re.S)
-        par = re.compile(r".*Parameters.*", re.S)
-        mat = re.compile(r".*Materials.*", re.S)
-        am_m = am.match(string)
-        self.assertIsNotNone(am_m)
-        cd_m = cd.match(string)
-        self.assertIsNotNone(cd_m)
-        de_m = de.match(string)
-        self.assertIsNotNone(de_m)
-        par_m = par.match(string)
-        self.assertIsNotNone(par_m)
-        mat_m = mat.match(string)
-        self.assertIsNotNone(mat_m)
+        with get_amira_file(f, args) as af:
+            string = get_literal(af, args)
+            self.assertIsInstance(string, _str)
+            am = re.compile(r".*AmiraMesh 3D BINARY.*", re.S)
+            cd = re.compile(r".*CreationDate.*", re.S)
+            de = re.compile(r".*define Lattice.*", re.S)
+            par = re.compile(r".*Parameters.*", re.S)
+            mat = re.compile(r".*Materials.*", re.S)
+            am_m = am.match(string)
+            self.assertIsNotNone(am_m)
+            cd_m = cd.match(string)
+            self.assertIsNotNone(cd_m)
+            de_m = de.match(string)
+            self.assertIsNotNone(de_m)
+            par_m = par.match(string)
+            self.assertIsNotNone(par_m)
+            mat_m = mat.match(string)
+            self.assertIsNotNone(mat_m)
 
     def test_get_paths_full(self):
         """Test that we can view the paths full"""
         args = _parse_with_shlex("ahds {}".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        string = get_paths(p, af)
-        print(string, file=sys.stderr)
-        self.assertIsInstance(string, _str)
-        am = re.compile(r".*AmiraFile.*", re.S)
-        m = re.compile(r".*meta.*", re.S)
-        h = re.compile(r".*header.*", re.S)
-        ds = re.compile(r".*data_streams.*", re.S)
-        am_m = am.match(string)
-        self.assertIsNotNone(am_m)
-        m_m = m.match(string)
-        self.assertIsNotNone(m_m)
-        h_m = h.match(string)
-        self.assertIsNotNone(h_m)
-        ds_m = ds.match(string)
-        self.assertIsNotNone(ds_m)
+        with get_amira_file(f, args) as af:
+            string = get_paths(p, af)
+            print(string, file=sys.stderr)
+            self.assertIsInstance(string, _str)
+            am = re.compile(r".*AmiraFile.*", re.S)
+            m = re.compile(r".*meta.*", re.S)
+            h = re.compile(r".*header.*", re.S)
+            ds = re.compile(r".*data_streams.*", re.S)
+            am_m = am.match(string)
+            self.assertIsNotNone(am_m)
+            m_m = m.match(string)
+            self.assertIsNotNone(m_m)
+            h_m = h.match(string)
+            self.assertIsNotNone(h_m)
+            ds_m = ds.match(string)
+            self.assertIsNotNone(ds_m)
 
     def test_get_paths_meta(self):
         """Test that we can fiew partial paths"""
         args = _parse_with_shlex("ahds {} meta.streams_loaded".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        string = get_paths(p, af)
-        print(string, file=sys.stderr)
-        self.assertIsInstance(string, _str)
-        am = re.compile(r".*AmiraFile.*", re.S)
-        m = re.compile(r".*streams_loaded.*", re.S)
-        am_m = am.match(string)
-        self.assertIsNone(am_m)
-        m_m = m.match(string)
-        self.assertIsNotNone(m_m)
+        with get_amira_file(f, args) as af:
+            string = get_paths(p, af)
+            print(string, file=sys.stderr)
+            self.assertIsInstance(string, _str)
+            am = re.compile(r".*AmiraFile.*", re.S)
+            m = re.compile(r".*streams_loaded.*", re.S)
+            am_m = am.match(string)
+            self.assertIsNone(am_m)
+            m_m = m.match(string)
+            self.assertIsNotNone(m_m)
 
     def test_get_paths_header(self):
         """Test that we can fiew partial paths"""
         args = _parse_with_shlex("ahds {} header.Parameters.Materials".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        string = get_paths(p, af)
-        self.assertIsInstance(string, _str)
-        am = re.compile(r".*AmiraFile.*", re.S)
-        m = re.compile(r".*Inside.*", re.S)
-        am_m = am.match(string)
-        self.assertIsNone(am_m)
-        m_m = m.match(string)
-        self.assertIsNotNone(m_m)
+        with get_amira_file(f, args) as af:
+            string = get_paths(p, af)
+            self.assertIsInstance(string, _str)
+            am = re.compile(r".*AmiraFile.*", re.S)
+            m = re.compile(r".*Inside.*", re.S)
+            am_m = am.match(string)
+            self.assertIsNone(am_m)
+            m_m = m.match(string)
+            self.assertIsNotNone(m_m)
 
     def test_get_paths_data_streams(self):
         """Test that we can fiew partial paths"""
         args = _parse_with_shlex("ahds {} data_streams".format(self.af_fn))
         f, p = set_file_and_paths(args)
-        af = get_amira_file(f, args)
-        string = get_paths(p, af)
-        self.assertIsInstance(string, _str)
-        am = re.compile(r".*AmiraFile.*", re.S)
-        m = re.compile(r".*data_streams.*", re.S)
-        am_m = am.match(string)
-        self.assertIsNone(am_m)
-        m_m = m.match(string)
-        self.assertIsNotNone(m_m)
+        with get_amira_file(f, args) as af:
+            string = get_paths(p, af)
+            self.assertIsInstance(string, _str)
+            am = re.compile(r".*AmiraFile.*", re.S)
+            m = re.compile(r".*data_streams.*", re.S)
+            am_m = am.match(string)
+            self.assertIsNone(am_m)
+            m_m = m.match(string)
+            self.assertIsNotNone(m_m)
 
     # def test_data(self):
     #     """Test that the data is correctly oriented"""
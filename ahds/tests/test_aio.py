@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import asyncio
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from .. import AmiraFile
+from ..aio import AsyncLoader, open_amira
+from . import TEST_DATA_PATH
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAio(unittest.TestCase):
+    def test_open_amira(self):
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        expected = AmiraFile(fn)
+
+        async def read():
+            async with await open_amira(fn, load_streams='lazy') as af:
+                self.assertEqual(af.header.data_stream_count, expected.header.data_stream_count)
+                self.assertEqual([stream.name for stream in af.streams], expected.data_streams.attrs())
+                column = await af.stream('__Column0003').aread()
+                same_column = await af.stream(4).aread()
+                await af.aread()
+            return column, same_column
+
+        column, same_column = _run(read())
+        numpy.testing.assert_array_equal(column, getattr(expected.data_streams, '__Column0003').data)
+        self.assertIs(column, same_column)
+
+    def test_slices(self):
+        fn = os.path.join(TEST_DATA_PATH, 'test9.am')
+        expected = AmiraFile(fn).data_streams.Labels.data
+
+        async def read():
+            async with await open_amira(fn, load_streams='lazy') as af:
+                stream = af.stream('Labels')
+                blocks = []
+                async for start, block in stream.aiter_slices(chunk=50, start=10):
+                    blocks.append((start, block))
+                region = await stream.aread_region(z=slice(3, 5), y=slice(10, 20))
+            return blocks, region
+
+        blocks, region = _run(read())
+        self.assertEqual([start for start, _ in blocks], list(range(10, 284, 50)))
+        self.assertTrue(numpy.array_equal(numpy.concatenate([block for _, block in blocks]), expected[10:]))
+        self.assertTrue(numpy.array_equal(region, expected[3:5, 10:20]))
+
+    def test_limit(self):
+        """Test that no more than limit blocking calls run at once"""
+        fn = os.path.join(TEST_DATA_PATH, 'testscalar.am')
+        lock = threading.Lock()
+        running = [0, 0]  # now, most
+
+        def opened(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            try:
+                return AmiraFile(*args, **kwargs)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        loader = AsyncLoader(executor=ThreadPoolExecutor(8), limit=2)
+
+        async def open_all():
+            return await asyncio.gather(*[loader.run(opened, fn) for _ in range(12)])
+
+        files = _run(open_all())
+        self.assertEqual(len(files), 12)
+        for af in files:
+            af.close()
+        self.assertLessEqual(running[1], 2)
+        with self.assertRaises(ValueError):
+            AsyncLoader(limit=0)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+
+import numpy
+
+from ahds import AmiraFile, cache, header
+from ahds.tests import Py23FixTestCase, TEST_DATA_PATH
+
+
+class TestCache(Py23FixTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.cache_dir, 'test.am')
+        shutil.copy(os.path.join(TEST_DATA_PATH, 'BinaryCustomLandmarks.elm'), self.fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_filename(self):
+        self.assertEqual(cache.cache_filename(self.fn, True, 'header'), self.fn + '.ahds-header')
+        cache_fn = cache.cache_filename(self.fn, self.cache_dir, 'header')
+        self.assertEqual(os.path.dirname(cache_fn), self.cache_dir)
+        self.assertTrue(cache_fn.endswith('.ahds-header'))
+
+    def test_read_write(self):
+        self.assertIsNone(cache.read_cache(self.fn, True, 'header'))
+        cache.write_cache(self.fn, True, 'header', {'x': 1})
+        self.assertEqual(cache.read_cache(self.fn, True, 'header'), {'x': 1})
+        # a modified file invalidates the entry
+        with open(self.fn, 'ab') as f:
+            f.write(b'\n')
+        self.assertIsNone(cache.read_cache(self.fn, True, 'header'))
+
+    def test_header_cache(self):
+        """Test that a cached header is not parsed again"""
+        ah = header.AmiraHeader(self.fn, cache=self.cache_dir)
+        offsets = ah.stream_offsets
+        get_parsed_data = header.get_parsed_data
+
+        def fail(*args, **kwargs):
+            raise AssertionError('header parsed again')
+
+        header.get_parsed_data = fail
+        try:
+            ah_cached = header.AmiraHeader(self.fn, cache=self.cache_dir)
+        finally:
+            header.get_parsed_data = get_parsed_data
+        self.assertEqual(ah_cached.literal_data, ah.literal_data)
+        self.assertEqual(len(ah_cached), len(ah))
+        self.assertEqual(ah_cached._stream_offsets, offsets)
+        self.assertEqual(ah_cached.data_stream_count, ah.data_stream_count)
+        self.assertEqual(ah_cached.Parameters.ContentType, ah.Parameters.ContentType)
+
+
+class TestArrayCache(Py23FixTestCase):
+    def test_lru(self):
+        array_cache = cache.ArrayCache(300)
+        for key in 'abc':
+            array_cache.put(key, numpy.zeros(100, dtype=numpy.uint8))
+        self.assertEqual(array_cache.nbytes, 300)
+        # using 'a' makes 'b' the least recently used
+        self.assertIsNotNone(array_cache.get('a'))
+        array_cache.put('d', numpy.zeros(150, dtype=numpy.uint8))
+        self.assertNotIn('b', array_cache)
+        self.assertNotIn('c', array_cache)
+        self.assertIn('a', array_cache)
+        self.assertEqual(array_cache.nbytes, 250)
+        # too large to cache at all
+        view = array_cache.put('e', numpy.zeros(301, dtype=numpy.uint8))
+        self.assertNotIn('e', array_cache)
+        self.assertFalse(view.flags.writeable)
+        array_cache.clear()
+        self.assertEqual((len(array_cache), array_cache.nbytes), (0, 0))
+        with self.assertRaises(ValueError):
+            cache.ArrayCache(-1)
+
+    def test_read_only(self):
+        array_cache = cache.ArrayCache(1000)
+        array_cache.put('a', numpy.arange(10))
+        view = array_cache.get('a')
+        self.assertFalse(view.flags.writeable)
+        with self.assertRaises(ValueError):
+            view[0] = 1
+        with self.assertRaises(ValueError):
+            view.flags.writeable = True
+
+    def test_threads(self):
+        array_cache = cache.ArrayCache(8 * 100 * 10)
+
+        def use(offset):
+            for index in range(200):
+                key = (index + offset) % 25
+                if array_cache.get(key) is None:
+                    array_cache.put(key, numpy.full(100, key, dtype=numpy.int64))
+
+        threads = [threading.Thread(target=use, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(array_cache.nbytes, array_cache.max_bytes)
+        self.assertEqual(array_cache.nbytes, 800 * len(array_cache))
+
+
+class TestDataStreamCache(Py23FixTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.cache_dir, 'test9.am')
+        shutil.copy(os.path.join(TEST_DATA_PATH, 'test9.am'), self.fn)
+        self.array_cache = cache.get_array_cache()
+        cache.set_array_cache(1 << 26)
+
+    def tearDown(self):
+        cache.set_array_cache(None)
+        cache._array_cache = self.array_cache
+        shutil.rmtree(self.cache_dir)
+
+    def test_hit(self):
+        data = AmiraFile(self.fn).data_streams.Labels.data
+        self.assertFalse(data.flags.writeable)
+        self.assertEqual(len(cache.get_array_cache()), 1)
+        # neither read nor decoded again
+        with AmiraFile(self.fn, load_streams='lazy') as af:
+            stream = af.data_streams.Labels
+            cached = stream.data
+            self.assertIsNone(stream._stream_data)
+            self.assertIs(cached.base, data.base)
+            out = numpy.zeros(data.shape, dtype=data.dtype)
+            self.assertIs(af.data_streams.Labels.load(out=out), out)
+        self.assertTrue(numpy.array_equal(out, data))
+        # not cached
+        uncached = AmiraFile(self.fn, array_cache=False).data_streams.Labels.data
+        self.assertTrue(uncached.flags.writeable)
+        self.assertTrue(numpy.array_equal(uncached, data))
+
+    def test_modified(self):
+        data = AmiraFile(self.fn).data_streams.Labels.data
+        with open(self.fn, 'ab') as f:
+            f.write(b'\n')
+        self.assertIsNot(AmiraFile(self.fn).data_streams.Labels.data.base, data.base)
+        self.assertEqual(len(cache.get_array_cache()), 2)
+
+    def test_disabled(self):
+        cache.set_array_cache(None)
+        af = AmiraFile(self.fn)
+        self.assertIsNone(af.header.array_cache)
+        self.assertTrue(af.data_streams.Labels.data.flags.writeable)
+        with self.assertRaises(ValueError):
+            AmiraFile(self.fn, array_cache=True)
+
+
+class TestStreamCache(Py23FixTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.cache_dir, 'test9.am')
+        shutil.copy(os.path.join(TEST_DATA_PATH, 'test9.am'), self.fn)
+        self.expected = AmiraFile(self.fn).data_streams.Labels.data
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_byterle(self):
+        with AmiraFile(self.fn, load_streams='lazy', stream_cache=True) as af:
+            data = af.data_streams.Labels.data
+        self.assertIsInstance(data, numpy.memmap)
+        self.assertTrue(numpy.array_equal(data, self.expected))
+        self.assertTrue(os.path.exists(self.fn + '.ahds-stream-1.npy'))
+        # mapped without reading or decoding the stream
+        with AmiraFile(self.fn, load_streams='lazy', stream_cache=True) as af:
+            stream = af.data_streams.Labels
+            data = stream.data
+            self.assertIsInstance(data, numpy.memmap)
+            self.assertIsNone(stream._stream_data)
+            self.assertFalse(data.flags.writeable)
+            self.assertTrue(numpy.array_equal(data, self.expected))
+            out = numpy.empty_like(self.expected)
+            af.data_streams.Labels.load(out=out)
+        self.assertTrue(numpy.array_equal(out, self.expected))
+
+    def test_hxzip(self):
+        cache_dir = os.path.join(self.cache_dir, 'cache')
+        os.mkdir(cache_dir)
+        fn = os.path.join(self.cache_dir, 'hxzip.am')
+        expected = (numpy.arange(10 * 20 * 30) % 7).astype('>f8').reshape(30, 20, 10)
+        compressed = zlib.compress(expected.tobytes())
+        with open(fn, 'wb') as f:
+            f.write(b"# AmiraMesh BINARY 2.1\n\n"
+                    b"define Lattice 10 20 30\n\n"
+                    b"Lattice { double Data } @1(HxZip," + str(len(compressed)).encode('ascii') + b")\n\n"
+                    b"# Data section follows\n"
+                    b"@1\n" + compressed + b"\n")
+        for native_endian in [False, True, False, True]:
+            data = AmiraFile(fn, stream_cache=cache_dir, native_endian=native_endian).data_streams.Data.data
+            self.assertIsInstance(data, numpy.memmap)
+            self.assertEqual(data.dtype.isnative, native_endian)
+            self.assertTrue(numpy.array_equal(data, expected))
+        self.assertEqual(len([name for name in os.listdir(cache_dir) if name.endswith('.npy')]), 2)
+
+    def test_invalidated(self):
+        AmiraFile(self.fn, stream_cache=True).data_streams.Labels.data
+        # the cached array is used while its record is valid
+        numpy.save(self.fn + '.ahds-stream-1.npy', numpy.zeros_like(self.expected))
+        data = AmiraFile(self.fn, stream_cache=True).data_streams.Labels.data
+        self.assertFalse(data.any())
+        with open(self.fn, 'ab') as f:
+            f.write(b'\n')
+        data = AmiraFile(self.fn, stream_cache=True).data_streams.Labels.data
+        self.assertTrue(numpy.array_equal(data, self.expected))
+
+    def test_header_hash(self):
+        kind, check = AmiraFile(self.fn, stream_cache=True).data_streams.Labels._stream_cache_kind()
+        cache.write_cache(self.fn, True, kind, ('0' * 40,) + check[1:])
+        self.assertIsNone(cache.read_array(self.fn, True, kind, check))
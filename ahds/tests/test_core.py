@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import bz2
+import io
+import mmap
 import os
 import random
+import shutil
 import sys
+import tempfile
 import unittest
+import zlib
+
+import numpy
 
 from . import TEST_DATA_PATH, Py23FixTestCase
-from .. import AmiraFile
+from .. import AmiraFile, header, open_many, source
 from ..core import Block, ListBlock, _print
 
 
@@ -440,6 +448,238 @@ class TestAmiraFile(unittest.TestCase):
         self.assertEqual(data.shape, tuple(af.header.Lattice.length.tolist()))
         print(data.shape)
 
+    def test_mmap(self):
+        """Test that uncompressed binary streams can be memory-mapped"""
+        for fn in ['testscalar.am', 'testvector3c.am', 'BinaryHxSpreadSheet62x200.am']:
+            af = AmiraFile(os.path.join(TEST_DATA_PATH, fn))
+            af_mmap = AmiraFile(os.path.join(TEST_DATA_PATH, fn), mmap=True)
+            self.assertTrue(af_mmap.header.mmap)
+            for ds, ds_mmap in zip(af.header._data_streams_block_list, af_mmap.header._data_streams_block_list):
+                self.assertIsInstance(ds_mmap.data, numpy.memmap)
+                self.assertIsNone(ds_mmap._stream_data)
+                self.assertEqual(ds_mmap.data.dtype, ds.data.dtype)
+                self.assertTrue(numpy.array_equal(ds_mmap.data, ds.data))
+        # compressed streams are decoded as usual
+        af = AmiraFile(os.path.join(TEST_DATA_PATH, 'test9.am'), mmap=True)
+        self.assertNotIsInstance(af.data_streams.Labels.data, numpy.memmap)
+
+    def test_declared_stream_length(self):
+        """Test that declared stream lengths prevent false marker matches inside compressed data"""
+        data = b"# AmiraMesh BINARY-LITTLE-ENDIAN 2.1\n\n" \
+               b"define Lattice 2 2 2\n\n" \
+               b"Lattice { byte Labels } @1(HxByteRLE,9)\n" \
+               b"Lattice { byte Mask } @2(HxByteRLE,2)\n\n" \
+               b"# Data section follows\n" \
+               b"@1\n\x88\n@2\n\n@2\n\n" \
+               b"@2\n\x08\x01\n"
+        fd, fn = tempfile.mkstemp(suffix='.am')
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            af = AmiraFile(fn)
+            self.assertEqual(af.data_streams.Labels.data_length, 9)
+            self.assertEqual(af.data_streams.Labels.data.tobytes(), b"\n@2\n\n@2\n")
+            self.assertTrue(numpy.array_equal(af.data_streams.Mask.data, numpy.ones((2, 2, 2), dtype=numpy.uint8)))
+        finally:
+            os.remove(fn)
+
+    def test_lazy(self):
+        """Test that lazy loading reads and decodes only the streams that are accessed"""
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        af = AmiraFile(fn)
+        with AmiraFile(fn, load_streams='lazy') as af_lazy:
+            self.assertEqual(af_lazy.meta.streams_loaded, 'lazy')
+            self.assertEqual(len(af_lazy.data_streams.attrs()), af.header.data_stream_count)
+            for ds in af_lazy.header._data_streams_block_list:
+                self.assertIsNone(ds._stream_data)
+                self.assertNotIn('data', ds.attrs())
+            column = getattr(af_lazy.data_streams, '__Column0003')
+            self.assertTrue(numpy.array_equal(column.data, getattr(af.data_streams, '__Column0003').data))
+            # the decoded data is kept
+            self.assertIs(column.data, column.data)
+            self.assertIn('data', column.attrs())
+            self.assertIsNone(getattr(af_lazy.data_streams, '__Column0004')._stream_data)
+        with self.assertRaises(ValueError):
+            AmiraFile(fn, load_streams='eager')
+
+    def test_not_lazy(self):
+        """Test that data is only read on access in lazy mode"""
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        af = AmiraFile(fn, load_streams=False)
+        af.read()
+        af_selected = AmiraFile(fn, streams=['__Column0001'])
+        with AmiraFile(fn, load_streams=False) as af_unloaded:
+            unloaded = af_unloaded.header._data_streams_block_list
+        for ds in [getattr(af_selected.data_streams, '__Column0002')] + unloaded:
+            self.assertFalse(ds.lazy)
+            self.assertFalse(hasattr(ds, 'data'))
+            self.assertIsNone(ds._stream_data)
+            with self.assertRaises(AttributeError):
+                ds.data
+        # callers may attach data themselves
+        ds = getattr(af_selected.data_streams, '__Column0002')
+        ds.add_attr('data', numpy.zeros(62))
+        self.assertFalse(ds.data.any())
+        self.assertTrue(hasattr(getattr(af.data_streams, '__Column0002'), 'data'))
+
+    def test_streams(self):
+        """Test that only the selected streams are loaded"""
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        af = AmiraFile(fn, streams=['__Column0001', 3])
+        self.assertEqual(len(af.data_streams.attrs()), af.header.data_stream_count)
+        loaded = [ds.name for ds in af.header._data_streams_block_list if 'data' in ds.attrs()]
+        self.assertCountEqual(loaded, ['__Column0001', '__Column0002'])
+        self.assertIsNone(getattr(af.data_streams, '__Column0004')._stream_data)
+        with self.assertRaises(ValueError):
+            AmiraFile(fn, streams=['Labels'])
+        # a single name or index selects that data stream alone
+        for streams in ['__Column0001', 2]:
+            af = AmiraFile(fn, streams=streams)
+            loaded = [ds.name for ds in af.header._data_streams_block_list if 'data' in ds.attrs()]
+            self.assertEqual(loaded, ['__Column0001'])
+        # not a substring of a name
+        with self.assertRaises(ValueError):
+            AmiraFile(fn, streams='__Column000')
+        for streams in [1.0, [None], [True]]:
+            with self.assertRaises(ValueError):
+                AmiraFile(fn, streams=streams)
+
+    def test_workers(self):
+        """Test that data streams decoded concurrently match and are attached in file order"""
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        af = AmiraFile(fn)
+        af_workers = AmiraFile(fn, workers=4)
+        self.assertEqual(af_workers.data_streams.attrs(), af.data_streams.attrs())
+        for name in af.data_streams.attrs():
+            numpy.testing.assert_array_equal(getattr(af.data_streams, name).data,
+                                             getattr(af_workers.data_streams, name).data)
+        # deferred reads may use workers too
+        af_read = AmiraFile(fn, load_streams=False, streams=['__Column0001', 3])
+        af_read.read(workers=2)
+        loaded = [ds.name for ds in af_read.header._data_streams_block_list if 'data' in ds.attrs()]
+        self.assertCountEqual(loaded, ['__Column0001', '__Column0002'])
+        with self.assertRaises(ValueError):
+            AmiraFile(fn, workers=0)
+
+    def test_workers_single_scan(self):
+        """Test that the data streams are located by a single scan however many workers decode them"""
+        scans = list()
+        get_stream_offsets = header.get_stream_offsets
+
+        def counting_get_stream_offsets(*args, **kwargs):
+            scans.append(args[0])
+            return get_stream_offsets(*args, **kwargs)
+
+        cache_dir = tempfile.mkdtemp()
+        header.get_stream_offsets = counting_get_stream_offsets
+        try:
+            AmiraFile(os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am'), workers=8, cache=cache_dir)
+        finally:
+            header.get_stream_offsets = get_stream_offsets
+            shutil.rmtree(cache_dir)
+        self.assertEqual(len(scans), 1)
+
+    def test_single_open(self):
+        """Test that the file is opened once and closed on leaving the context"""
+        opened_files = list()
+
+        def _open(*args, **kwargs):
+            f = open(*args, **kwargs)
+            opened_files.append(f)
+            return f
+
+        source.open = _open
+        try:
+            with AmiraFile(os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am'), load_streams='lazy') as af:
+                self.assertEqual(getattr(af.data_streams, '__Column0000').data.shape, (62,))
+                self.assertEqual(getattr(af.data_streams, '__Column0199').data.shape, (62,))
+            self.assertEqual(len(opened_files), 1)
+            self.assertTrue(opened_files[0].closed)
+            # streams that were not read can not be read any more
+            with self.assertRaises(ValueError):
+                getattr(af.data_streams, '__Column0001').data
+        finally:
+            del source.open
+
+    def test_released(self):
+        """Test that a file read eagerly is closed once read and that lazy streams outlive their Amira file"""
+        opened_files = list()
+
+        def _open(*args, **kwargs):
+            f = open(*args, **kwargs)
+            opened_files.append(f)
+            return f
+
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        source.open = _open
+        try:
+            af = AmiraFile(fn)
+            self.assertEqual(len(opened_files), 1)
+            self.assertTrue(opened_files[0].closed)
+            self.assertEqual(getattr(af.data_streams, '__Column0000').data.shape, (62,))
+            # the file is opened again by name to read a stream of a discarded Amira file
+            stream = getattr(AmiraFile(fn, load_streams='lazy').data_streams, '__Column0001')
+            self.assertTrue(opened_files[1].closed)
+            self.assertEqual(stream.data.shape, (62,))
+            self.assertGreater(len(opened_files), 2)
+            self.assertTrue(all(f.closed for f in opened_files))
+        finally:
+            del source.open
+
+    def test_file_like(self):
+        """Test that Amira files can be read from file-like objects and buffers"""
+        for fn in ['test9.am', 'testvector2c.am', 'BinaryCustomLandmarks.elm', 'test7.surf']:
+            path = os.path.join(TEST_DATA_PATH, fn)
+            af = AmiraFile(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                for obj in [io.BytesIO(data), data, memoryview(data), f, mapped]:
+                    af_obj = AmiraFile(obj)
+                    self.assertEqual(af_obj.meta.header_length, af.meta.header_length)
+                    if af.header.filetype == 'AmiraMesh':
+                        for ds, ds_obj in zip(af.header._data_streams_block_list,
+                                              af_obj.header._data_streams_block_list):
+                            self.assertTrue(numpy.array_equal(ds.data, ds_obj.data))
+                    else:
+                        self.assertTrue(numpy.array_equal(af.data_streams.Data.Vertices.data,
+                                                          af_obj.data_streams.Data.Vertices.data))
+                    af_obj.close()
+                mapped.close()
+        # uncompressed streams in buffers are mapped without copying
+        with open(os.path.join(TEST_DATA_PATH, 'testscalar.am'), 'rb') as f:
+            data = f.read()
+        af = AmiraFile(data, mmap=True)
+        self.assertEqual(af.name, '<bytes>')
+        self.assertIsNone(af.meta.file)
+        self.assertTrue(numpy.shares_memory(af.data_streams.Data.data, numpy.frombuffer(data, dtype=numpy.uint8)))
+
+    def test_compressed(self):
+        """Test that gzip and bzip2 compressed Amira files are read without decompressing them to disk"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for fn in ['test9.am', 'BinaryHxSpreadSheet62x200.am', 'BinaryHyperSurface.surf']:
+                path = os.path.join(TEST_DATA_PATH, fn)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                gzip_compress = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                for suffix, compressed in [('.gz', gzip_compress.compress(data) + gzip_compress.flush()),
+                                           ('.bz2', bz2.compress(data))]:
+                    compressed_path = os.path.join(tmp_dir, fn + suffix)
+                    with open(compressed_path, 'wb') as f:
+                        f.write(compressed)
+                    af = AmiraFile(path)
+                    with AmiraFile(compressed_path, load_streams='lazy') as af_compressed:
+                        self.assertEqual(af_compressed.name, compressed_path)
+                        self.assertEqual(af_compressed.header.literal_data, af.header.literal_data)
+                        self.assertEqual(af_compressed.header.stream_offsets, af.header.stream_offsets)
+                        for ds, ds_compressed in zip(af.header._data_streams_block_list,
+                                                     af_compressed.header._data_streams_block_list):
+                            if isinstance(ds.data, numpy.ndarray):
+                                self.assertTrue(numpy.array_equal(ds.data, ds_compressed.data))
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_amreader_hxsurface(self):
         """Test that it correctly handles AmirMesh hxsurf files"""
         af = AmiraFile(os.path.join(TEST_DATA_PATH, 'test8.am'), load_streams=True)
@@ -505,5 +745,63 @@ class TestAmiraFile(unittest.TestCase):
         #             """.format(s.id, s.name, s.colour, len(s.vertices), len(s.triangles)))
 
 
+def _stream_shapes(af):
+    """Function applied to each file by open_many in the tests"""
+    return [getattr(af.data_streams, name).data.shape for name in af.data_streams.attrs()]
+
+
+class TestOpenMany(unittest.TestCase):
+    """Tests for ahds.open_many"""
+
+    def setUp(self):
+        self.paths = [os.path.join(TEST_DATA_PATH, fn) for fn in
+                      ['testscalar.am', 'testvector2c.am', 'BinaryHxSpreadSheet62x200.am', 'test9.am']]
+        self.missing = os.path.join(TEST_DATA_PATH, 'missing.am')
+
+    def test_func(self):
+        """Test that the results of func are returned for every file and errors are returned"""
+        expected = dict((path, _stream_shapes(AmiraFile(path))) for path in self.paths)
+        for workers in [1, 2]:
+            results = list(open_many(self.paths + [self.missing], workers=workers, func=_stream_shapes))
+            self.assertCountEqual([path for path, _, _ in results], self.paths + [self.missing])
+            for path, result, error in results:
+                if path == self.missing:
+                    self.assertIsNone(result)
+                    self.assertIsInstance(error, (IOError, OSError))
+                else:
+                    self.assertIsNone(error)
+                    self.assertEqual(result, expected[path])
+
+    def test_amira_files(self):
+        """Test that AmiraFile objects are returned and data streams not loaded can be read"""
+        for path, af, error in open_many(self.paths[:3], workers=2, load_streams='lazy', max_pending=1):
+            self.assertIsNone(error)
+            self.assertIsInstance(af, AmiraFile)
+            with af:
+                expected = AmiraFile(path)
+                for name in expected.data_streams.attrs():
+                    numpy.testing.assert_array_equal(getattr(af.data_streams, name).data,
+                                                     getattr(expected.data_streams, name).data)
+
+    def test_lazy_without_func(self):
+        """Test that without func the data is not loaded in the workers unless asked for"""
+        for path, af, error in open_many(self.paths[:2], workers=2):
+            self.assertIsNone(error)
+            with af:
+                self.assertEqual(af._load_streams, 'lazy')
+                for name in af.data_streams.attrs():
+                    self.assertNotIn('data', getattr(af.data_streams, name)._attrs)
+                    self.assertIsNotNone(getattr(af.data_streams, name).data)
+        for path, af, error in open_many(self.paths[:1], workers=1, load_streams=True):
+            with af:
+                self.assertEqual(af._load_streams, True)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            list(open_many(self.paths, workers=0))
+        with self.assertRaises(ValueError):
+            list(open_many(self.paths, max_pending=0))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import multiprocessing
 import os
+import pickle
+import shutil
+import tempfile
 import unittest
+import warnings
+import zlib
 
 import numpy
 
@@ -10,6 +16,27 @@ import ahds
 from ahds import data_stream, AmiraFile, header
 from ahds.tests import TEST_DATA_PATH
 
+# the Amira (R) names of the types of synthetic data streams
+_AMIRA_TYPES = {'u1': b'byte', 'i4': b'int', 'f8': b'double'}
+
+
+def _synthetic_amira(data, compressed=None):
+    """An AmiraMesh file with ``data`` in the HxZip-compressed Lattice data stream ``Data``
+
+    :param np.ndarray data: a 3D array of bytes, ints or doubles in either byte order
+    :param bytes compressed: the raw stream in place of ``data`` compressed e.g. to corrupt it [default: None]
+    """
+    if compressed is None:
+        compressed = zlib.compress(data.tobytes())
+    file_format = b"BINARY" if data.dtype.str[0] == '>' else b"BINARY-LITTLE-ENDIAN"
+    shape = b" ".join(str(size).encode('ascii') for size in data.shape[::-1])
+    return b"# AmiraMesh " + file_format + b" 2.1\n\n" \
+           b"define Lattice " + shape + b"\n\n" \
+           b"Lattice { " + _AMIRA_TYPES[data.dtype.str[1:]] + b" Data } " \
+           b"@1(HxZip," + str(len(compressed)).encode('ascii') + b")\n\n" \
+           b"# Data section follows\n" \
+           b"@1\n" + compressed + b"\n"
+
 
 class TestDataStreams(unittest.TestCase):
     @classmethod
@@ -77,3 +104,568 @@ class TestDataStreams(unittest.TestCase):
     #     # get the middle slice of the image set
     #     contours = imgs[128].as_contours
     #     self.assertIsInstance(contours, dict)
+
+
+class TestIterSlices(unittest.TestCase):
+    def setUp(self):
+        self.block_size = data_stream.STREAM_BLOCK_SIZE
+        # small blocks so that runs and slices straddle reads
+        data_stream.STREAM_BLOCK_SIZE = 1000
+
+    def tearDown(self):
+        data_stream.STREAM_BLOCK_SIZE = self.block_size
+
+    def _assert_slices_equal(self, stream, data, chunk):
+        starts = list()
+        for start, block in stream.iter_slices(chunk=chunk):
+            starts.append(start)
+            self.assertEqual(block.dtype, data.dtype)
+            self.assertTrue(numpy.array_equal(block, data[start:start + chunk]))
+        self.assertEqual(starts, list(range(0, data.shape[0], chunk)))
+
+    def test_hxbyterle(self):
+        fn = os.path.join(TEST_DATA_PATH, 'test9.am')
+        data = AmiraFile(fn).data_streams.Labels.data
+        with AmiraFile(fn, load_streams='lazy') as af:
+            stream = af.data_streams.Labels
+            for chunk in [1, 16, 100, 1000]:
+                self._assert_slices_equal(stream, data, chunk)
+            # the stream is decoded one block at a time
+            self.assertIsNone(stream._stream_data)
+            self.assertNotIn('data', stream.attrs())
+
+    def test_uncompressed(self):
+        fn = os.path.join(TEST_DATA_PATH, 'testvector2c.am')
+        data = AmiraFile(fn).data_streams.Data.data
+        with AmiraFile(fn, load_streams='lazy') as af:
+            stream = af.data_streams.Data
+            self._assert_slices_equal(stream, data, 3)
+            self.assertIsNone(stream._stream_data)
+            # loaded streams are yielded from the decoded data
+            stream.load()
+            self._assert_slices_equal(stream, data, 3)
+
+    def test_hxzip(self):
+        data = numpy.arange(4 * 5 * 6, dtype='<i4').reshape(6, 5, 4)
+        amira = _synthetic_amira(data)
+        stream = AmiraFile(amira, load_streams='lazy').data_streams.Data
+        self.assertTrue(numpy.array_equal(AmiraFile(amira).data_streams.Data.data, data))
+        for chunk in [1, 4, 6]:
+            self._assert_slices_equal(stream, data, chunk)
+        with self.assertRaises(ValueError):
+            next(stream.iter_slices(chunk=0))
+
+    def test_hxbyterle_decode_into(self):
+        with AmiraFile(os.path.join(TEST_DATA_PATH, 'test9.am'), load_streams='lazy') as af:
+            stream = af.data_streams.Labels
+            stream.read()
+        encoded = stream._stream_data
+        size = 284 ** 3
+        decoded = data_stream.hxbyterle_decode(encoded, size)
+        output = numpy.empty(size, dtype=numpy.uint8)
+        state = (0, 0, 0)
+        filled = consumed = 0
+        # feed the input in pieces and take the output in pieces
+        while filled < size:
+            produced, used, state = data_stream.hxbyterle_decode_into(
+                encoded[consumed:consumed + 777], output[filled:filled + 12345], state)
+            filled += produced
+            consumed += used
+        self.assertTrue(numpy.array_equal(output, decoded))
+        # runs reaching past the end of the output are cut short instead of overrunning it
+        self.assertEqual(data_stream.hxbyterle_decode(b'\x05\x07', 3).tolist(), [7, 7, 7])
+
+
+class TestReadRegion(unittest.TestCase):
+    def _assert_regions_equal(self, stream, data):
+        for z, y, x in [(None, None, None), (slice(2, 5), slice(1, 4), slice(0, 2)),
+                        (slice(None, None, 3), slice(4, 0, -2), slice(1, None)), (slice(3, 3), None, None)]:
+            region = stream.read_region(z=z, y=y, x=x)
+            self.assertEqual(region.dtype, data.dtype)
+            self.assertTrue(numpy.array_equal(region, data[z or slice(None), y or slice(None), x or slice(None)]))
+
+    def test_uncompressed(self):
+        fn = os.path.join(TEST_DATA_PATH, 'testvector2c.am')
+        data = AmiraFile(fn).data_streams.Data.data
+        with AmiraFile(fn, load_streams='lazy') as af:
+            stream = af.data_streams.Data
+            self._assert_regions_equal(stream, data)
+            self.assertIsNone(stream._stream_data)
+            self.assertNotIn('data', stream.attrs())
+
+    def test_coalesced_reads(self):
+        """Test that only the rows of the region are read and that adjacent rows are read together"""
+        fn = os.path.join(TEST_DATA_PATH, 'testscalar.am')
+        with AmiraFile(fn, load_streams='lazy') as af:
+            reads = list()
+            read_at = af.header.read_at
+
+            def _read_at(offset, length=-1):
+                reads.append(length)
+                return read_at(offset, length)
+
+            af.header.read_at = _read_at
+            stream = af.data_streams.Data
+            # whole z slices are contiguous
+            self.assertEqual(stream.read_region(z=slice(2, 5)).shape, (3, 6, 4))
+            self.assertEqual(reads, [3 * 6 * 4 * 4])
+            # whole rows are contiguous within each slice and the slices are close together
+            del reads[:]
+            self.assertEqual(stream.read_region(z=slice(2, 5, 2), y=slice(1, 3)).shape, (2, 2, 4))
+            self.assertEqual(reads, [(4 * 6 + 2 - (2 * 6 + 1) + 1) * 4 * 4])
+            # partial rows are read together with the small gaps between them
+            del reads[:]
+            data = AmiraFile(fn).data_streams.Data.data
+            self.assertTrue(numpy.array_equal(stream.read_region(z=slice(0, 2), x=slice(1, 3)), data[0:2, :, 1:3]))
+            self.assertEqual(reads, [11 * 4 * 4 + 2 * 4])
+            # and one by one if the gaps are too large
+            del reads[:]
+            read_gap = data_stream.REGION_READ_GAP
+            data_stream.REGION_READ_GAP = 0
+            try:
+                self.assertTrue(numpy.array_equal(stream.read_region(z=slice(0, 2), x=slice(1, 3)), data[0:2, :, 1:3]))
+            finally:
+                data_stream.REGION_READ_GAP = read_gap
+            self.assertEqual(reads, [2 * 4] * 12)
+            # rows in reverse order are not read together
+            del reads[:]
+            self.assertTrue(numpy.array_equal(stream.read_region(z=slice(1, 2), y=slice(None, None, -1)),
+                                              data[1:2, ::-1]))
+            self.assertEqual(reads, [4 * 4] * 6)
+
+    def test_hxbyterle(self):
+        fn = os.path.join(TEST_DATA_PATH, 'test9.am')
+        data = AmiraFile(fn).data_streams.Labels.data
+        with AmiraFile(fn, load_streams='lazy') as af:
+            stream = af.data_streams.Labels
+            self._assert_regions_equal(stream, data)
+
+    def test_loaded(self):
+        fn = os.path.join(TEST_DATA_PATH, 'testvector2c.am')
+        for kwargs in [dict(), dict(mmap=True)]:
+            stream = AmiraFile(fn, **kwargs).data_streams.Data
+            self._assert_regions_equal(stream, stream.data)
+
+    def test_invalid(self):
+        with AmiraFile(os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am'), load_streams='lazy') as af:
+            stream = getattr(af.data_streams, '__Column0000')
+            self.assertEqual(stream.read_region(x=slice(60, None)).shape, (2,))
+            with self.assertRaises(ValueError):
+                stream.read_region(z=slice(0, 1))
+            with self.assertRaises(ValueError):
+                stream.read_region(x=1)
+
+
+class TestDecodeInto(unittest.TestCase):
+    def test_uncompressed(self):
+        """Test that uncompressed streams are read straight into out"""
+        fn = os.path.join(TEST_DATA_PATH, 'testvector2c.am')
+        data = AmiraFile(fn).data_streams.Data.data
+        with AmiraFile(fn, load_streams='lazy') as af:
+            stream = af.data_streams.Data
+            stack = numpy.zeros((3,) + data.shape, dtype=data.dtype)
+            out = stack[1]
+            self.assertIs(stream.load(out=out), out)
+            self.assertIsNone(stream._stream_data)
+            self.assertTrue(numpy.array_equal(stack[1], data))
+            self.assertFalse(stack[0].any() or stack[2].any())
+            # converted into arrays of other types and copied if decoded before
+            out = numpy.empty(data.shape, dtype=numpy.float64)
+            self.assertIs(stream.load(out=out), out)
+            self.assertTrue(numpy.array_equal(out, data))
+        with AmiraFile(fn, load_streams='lazy', mmap=True) as af:
+            mapped = af.data_streams.Data
+            self.assertTrue(numpy.array_equal(mapped.get_data(out=numpy.empty_like(data)), data))
+
+    def test_hxbyterle(self):
+        fn = os.path.join(TEST_DATA_PATH, 'test9.am')
+        data = AmiraFile(fn).data_streams.Labels.data
+        with AmiraFile(fn, load_streams='lazy') as af:
+            stream = af.data_streams.Labels
+            out = numpy.empty(data.shape, dtype=numpy.uint8)
+            self.assertIs(stream.get_data(out=out), out)
+            self.assertTrue(numpy.array_equal(out, data))
+            out = numpy.empty(data.shape, dtype=numpy.int32)
+            self.assertTrue(numpy.array_equal(stream.get_data(out=out), data))
+
+    def test_invalid(self):
+        with AmiraFile(os.path.join(TEST_DATA_PATH, 'testvector2c.am'), load_streams='lazy') as af:
+            stream = af.data_streams.Data
+            for out in [numpy.empty((8, 6, 4)), numpy.empty((8, 6, 4, 2), dtype=numpy.int32), [0] * 384]:
+                with self.assertRaises(ValueError):
+                    stream.get_data(out=out)
+            out = numpy.empty((8, 6, 4, 2), dtype=numpy.float32)
+            out.flags.writeable = False
+            with self.assertRaises(ValueError):
+                stream.get_data(out=out)
+
+    def test_read_into(self):
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        expected = AmiraFile(fn)
+        columns = numpy.zeros((2, 62), dtype='>f4')
+        first, second = columns
+        af = AmiraFile(fn, load_streams=False, streams=[])
+        af.read(into={'__Column0001': first, 3: second}, workers=2)
+        self.assertIs(getattr(af.data_streams, '__Column0001').data, first)
+        self.assertIs(getattr(af.data_streams, '__Column0002').data, second)
+        numpy.testing.assert_array_equal(columns[1], getattr(expected.data_streams, '__Column0002').data)
+        # streams which have been read are copied
+        out = numpy.zeros(62, dtype=numpy.float64)
+        af.read(into={'__Column0002': out})
+        numpy.testing.assert_array_equal(out, columns[1])
+        with self.assertRaises(ValueError):
+            af.read(into={'Labels': out})
+
+
+class TestHxZip(unittest.TestCase):
+    def setUp(self):
+        self.block_size = data_stream.STREAM_BLOCK_SIZE
+        data_stream.STREAM_BLOCK_SIZE = 100
+        self.data = (numpy.arange(10 * 20 * 30) % 7).astype('>f8').reshape(30, 20, 10)
+        self.compressed = zlib.compress(self.data.tobytes())
+
+    def tearDown(self):
+        data_stream.STREAM_BLOCK_SIZE = self.block_size
+
+    def test_streamed(self):
+        """Test that HxZip streams are decompressed from the file without reading the whole stream"""
+        stream = AmiraFile(_synthetic_amira(self.data)).data_streams.Data
+        self.assertIsNone(stream._stream_data)
+        self.assertEqual(stream.data.dtype, self.data.dtype)
+        self.assertTrue(numpy.array_equal(stream.data, self.data))
+
+    def test_out(self):
+        """Test that HxZip streams are decompressed straight into out"""
+        stream = AmiraFile(_synthetic_amira(self.data), load_streams='lazy').data_streams.Data
+        out = numpy.empty(self.data.shape, dtype=self.data.dtype)
+        self.assertIs(stream.get_data(out=out), out)
+        self.assertTrue(numpy.array_equal(out, self.data))
+
+    def test_hxzip_decode(self):
+        output = data_stream.hxzip_decode(self.compressed, self.data.nbytes)
+        self.assertEqual(output.tobytes(), self.data.tobytes())
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            AmiraFile(_synthetic_amira(self.data, self.compressed[:len(self.compressed) // 2]))
+        with self.assertRaises(ValueError):
+            data_stream.hxzip_decode(self.compressed, self.data.nbytes + 1)
+
+    def test_verified(self):
+        """Test that the checksum and the length of whole HxZip streams are verified"""
+        # more data than the shape of the stream
+        with self.assertRaises(ValueError):
+            data_stream.hxzip_decode(self.compressed, self.data.nbytes - 1)
+        longer = zlib.compress(self.data.tobytes() + b'\0' * 8)
+        with self.assertRaises(ValueError):
+            AmiraFile(_synthetic_amira(self.data, longer))
+        stream = AmiraFile(_synthetic_amira(self.data, longer), load_streams='lazy').data_streams.Data
+        with self.assertRaises(ValueError):
+            stream.load()
+        with self.assertRaises(ValueError):
+            stream.get_data(out=numpy.empty(self.data.shape, dtype=self.data.dtype))
+        # a wrong checksum
+        corrupt = self.compressed[:-1] + bytes(bytearray([self.compressed[-1] ^ 1]))
+        with self.assertRaises(ValueError):
+            data_stream.hxzip_decode(corrupt, self.data.nbytes)
+        with self.assertRaises(ValueError):
+            AmiraFile(_synthetic_amira(self.data, corrupt))
+
+
+class TestNativeEndian(unittest.TestCase):
+    def setUp(self):
+        self.block_size = data_stream.STREAM_BLOCK_SIZE
+        data_stream.STREAM_BLOCK_SIZE = 100
+        self.data = (numpy.arange(10 * 20 * 30) % 7).astype('>f8').reshape(30, 20, 10)
+
+    def tearDown(self):
+        data_stream.STREAM_BLOCK_SIZE = self.block_size
+
+    def test_raw(self):
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        expected = AmiraFile(fn)
+        for load_streams in [True, 'lazy']:
+            with AmiraFile(fn, load_streams=load_streams, native_endian=True) as af:
+                self.assertTrue(af.header.native_endian)
+                for name in ['__Column0000', '__Column0199']:
+                    data = getattr(af.data_streams, name).data
+                    self.assertTrue(data.dtype.isnative)
+                    numpy.testing.assert_array_equal(data, getattr(expected.data_streams, name).data)
+
+    def test_hxzip(self):
+        stream = AmiraFile(_synthetic_amira(self.data), native_endian=True).data_streams.Data
+        self.assertTrue(stream.data.dtype.isnative)
+        self.assertTrue(numpy.array_equal(stream.data, self.data))
+
+    def test_lazy(self):
+        stream = AmiraFile(_synthetic_amira(self.data), load_streams='lazy').data_streams.Data
+        self.assertFalse(stream.native_endian)
+        stream.native_endian = True
+        blocks = [block for _, block in stream.iter_slices(chunk=7)]
+        self.assertTrue(all(block.dtype.isnative for block in blocks))
+        self.assertTrue(numpy.array_equal(numpy.concatenate(blocks), self.data))
+        region = stream.read_region(z=slice(3, 9), x=slice(2, 5))
+        self.assertTrue(region.dtype.isnative)
+        self.assertTrue(numpy.array_equal(region, self.data[3:9, :, 2:5]))
+        self.assertTrue(stream.data.dtype.isnative)
+        self.assertTrue(numpy.array_equal(stream.data, self.data))
+
+    def test_surface(self):
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHyperSurface.surf')
+        expected = AmiraFile(fn).data_streams.Data.Vertices.data
+        vertices = AmiraFile(fn, native_endian=True).data_streams.Data.Vertices.data
+        self.assertTrue(vertices.dtype.isnative)
+        numpy.testing.assert_array_equal(vertices, expected)
+
+
+@unittest.skipIf(data_stream.hxzip_build_index is None, "C-extension built without zlib")
+class TestHxZipIndex(unittest.TestCase):
+    def setUp(self):
+        self.data = numpy.random.RandomState(0).randint(0, 4, (40, 100, 100)).astype(numpy.uint8)
+        self.amira = _synthetic_amira(self.data)
+
+    def test_index(self):
+        stream = AmiraFile(self.amira, load_streams='lazy', stream_index=20000).data_streams.Data
+        points = stream.build_index(20000)
+        self.assertGreater(len(points), 2)
+        self.assertEqual(points[0][2], 0)
+        for z in [39, 20, 0, 7]:
+            self.assertTrue(numpy.array_equal(stream.read_region(z=slice(z, z + 1), x=slice(5, 50)),
+                                              self.data[z:z + 1, :, 5:50]))
+        for start, block in stream.iter_slices(chunk=3, start=11, stop=27):
+            self.assertTrue(numpy.array_equal(block, self.data[start:start + len(block)]))
+        self.assertIsNone(stream._stream_data)
+        with AmiraFile(os.path.join(TEST_DATA_PATH, 'testscalar.am'), load_streams='lazy') as af:
+            with self.assertRaises(ValueError):
+                af.data_streams.Data.build_index()
+
+    def test_no_zdict(self):
+        """Test that HxZip streams are decoded from the start where zlib takes no preset dictionary"""
+        zlib_zdict = data_stream._ZLIB_ZDICT
+        with AmiraFile(self.amira, load_streams='lazy', stream_index=20000) as af:
+            stream = af.data_streams.Data
+            # an index built before is ignored
+            self.assertGreater(len(af.header.get_stream_index(stream)), 2)
+            data_stream._ZLIB_ZDICT = False
+            try:
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter('always')
+                    self.assertIsNone(stream.build_index(20000))
+                self.assertEqual(len(caught), 1)
+                self.assertTrue(numpy.array_equal(stream.read_region(z=slice(30, 31)), self.data[30:31]))
+                with self.assertRaises(ValueError):
+                    data_stream.StreamDecoder('HxZip', [], zdict=b'')
+            finally:
+                data_stream._ZLIB_ZDICT = zlib_zdict
+
+    def test_cached_index(self):
+        """Test that the index is kept in the cache and not built again"""
+        cache_dir = tempfile.mkdtemp()
+        try:
+            fn = os.path.join(cache_dir, 'test.am')
+            with open(fn, 'wb') as f:
+                f.write(self.amira)
+            with AmiraFile(fn, load_streams='lazy', cache=True, stream_index=20000) as af:
+                self.assertTrue(numpy.array_equal(af.data_streams.Data.read_region(z=slice(30, 31)), self.data[30:31]))
+            self.assertTrue(os.path.exists(fn + '.ahds-index'))
+            hxzip_build_index = data_stream.hxzip_build_index
+
+            def fail(*args, **kwargs):
+                raise AssertionError('index built again')
+
+            data_stream.hxzip_build_index = fail
+            try:
+                with AmiraFile(fn, load_streams='lazy', cache=True, stream_index=20000) as af:
+                    self.assertTrue(numpy.array_equal(af.data_streams.Data.read_region(z=slice(25, 26)),
+                                                      self.data[25:26]))
+            finally:
+                data_stream.hxzip_build_index = hxzip_build_index
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class TestHxByteRLEIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fn = os.path.join(TEST_DATA_PATH, 'test9.am')
+        cls.data = AmiraFile(cls.fn).data_streams.Labels.data
+
+    def test_index(self):
+        with AmiraFile(self.fn, load_streams='lazy', stream_index=284 * 284 * 10) as af:
+            stream = af.data_streams.Labels
+            points = stream.build_index(284 * 284 * 10)
+            self.assertEqual(points[0], (0, 0))
+            self.assertGreater(len(points), 20)
+            # every point is a run boundary from which decoding can resume
+            stream.read()
+            for in_, out in points[1::7]:
+                output = numpy.empty(1000, dtype=numpy.uint8)
+                data_stream.hxbyterle_decode_into(stream._stream_data[in_:], output)
+                self.assertTrue(numpy.array_equal(output, self.data.ravel()[out:out + 1000]))
+
+    def test_partial_decode(self):
+        """Test that slices are decoded from the nearest run boundary"""
+        with AmiraFile(self.fn, load_streams='lazy', stream_index=284 * 284 * 10) as af:
+            stream = af.data_streams.Labels
+            points = stream._header.get_stream_index(stream)
+            decoded = list()
+            skip = data_stream.StreamDecoder.skip
+
+            def _skip(decoder, size):
+                decoded.append(size)
+                return skip(decoder, size)
+
+            data_stream.StreamDecoder.skip = _skip
+            try:
+                for z in [270, 140, 3]:
+                    self.assertTrue(numpy.array_equal(stream.read_region(z=slice(z, z + 1), y=slice(100, 200)),
+                                                      self.data[z:z + 1, 100:200]))
+            finally:
+                data_stream.StreamDecoder.skip = skip
+            self.assertTrue(all(size < 284 * 284 * 11 for size in decoded))
+            self.assertIs(stream._header.get_stream_index(stream), points)
+            self.assertIsNone(stream._stream_data)
+
+
+class TestAsciiDecode(unittest.TestCase):
+    def setUp(self):
+        self.chunk_size = data_stream.ASCII_CHUNK_SIZE
+        # small chunks so that even the sample files are parsed in parallel
+        data_stream.ASCII_CHUNK_SIZE = 16
+
+    def tearDown(self):
+        data_stream.ASCII_CHUNK_SIZE = self.chunk_size
+
+    def test_ascii_decode(self):
+        values = numpy.random.RandomState(0).rand(3000) * 1000 - 500
+        separators = [b' ', b'\n', b'\t', b'  \n', b'\r\n']
+        text = b''.join('{:g}'.format(v).encode('ASCII') + separators[i % 5] for i, v in enumerate(values))
+        # leading and trailing space, too few numbers and text which is not a number
+        for data in [text, b'\n ' + text + b' \n', text[:-10], text.replace(b'\n', b' x ', 1)]:
+            for workers in [2, 5]:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    expected = numpy.fromstring(data, dtype=numpy.float32, sep="\n \t")
+                    decoded = data_stream.ascii_decode(data, numpy.dtype(numpy.float32), 3000, workers=workers)
+                self.assertEqual(decoded.dtype, expected.dtype)
+                self.assertTrue(numpy.array_equal(decoded, expected))
+
+    def test_words(self):
+        """Test that words which are hard to parse give what numpy gives for every type"""
+        words = ['1', '+5', '-1', '-0', '0.0', '-0.0', '300', '-300', '70000', '00012', '99999999999999999999',
+                 '-99999999999999999999', '18446744073709551615', '1.5', '1.', '.5', '1e', 'e5', '-', '+', '1e400',
+                 '-1e400', '1e-400', '0e999', 'nan', '-nan', 'NaN', 'inf', '-Inf', 'Infinity', '1e3', '1E-5',
+                 '0x10', '1_0', '1.2.3', '--1', '1-', '3.4028235e38', '3.4028236e38', '4.9e-324', '0.1',
+                 '123456789.123456789', '0.30000000000000004', '1234567890123456', '9007199254740993']
+        for dtype in [numpy.int8, numpy.uint8, numpy.int16, numpy.uint16, numpy.int32, numpy.uint32, numpy.int64,
+                      numpy.uint64, numpy.float32, numpy.float64]:
+            for word in words:
+                for data in [word, '7 ' + word + ' 8', ' ' + word + '\n']:
+                    data = data.encode('ASCII')
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        expected = numpy.fromstring(data, dtype=dtype, sep="\n \t")
+                        decoded = data_stream.ascii_decode(data, numpy.dtype(dtype), len(data.split()))
+                    self.assertEqual(decoded.dtype, expected.dtype)
+                    self.assertEqual(decoded.tobytes(), expected.tobytes(), (dtype, data))
+
+    def test_native(self):
+        """Test that numbers are parsed by the C-extension rather than numpy"""
+        if data_stream.ascii_decode_into is None:
+            self.skipTest('the C-extension is not available')
+        values = numpy.random.RandomState(1).rand(1000) * 2000 - 1000
+        text = b'\n'.join('{:.17g} {:.9g} {:e}'.format(v, v, v).encode('ASCII') for v in values)
+        expected = numpy.fromstring(text, dtype=numpy.float64, sep="\n \t")
+        parse = data_stream._ascii_parse
+
+        def fail(data, dtype):
+            raise AssertionError('parsed by numpy')
+
+        data_stream._ascii_parse = fail
+        try:
+            for workers in [1, 3]:
+                decoded = data_stream.ascii_decode(text, numpy.dtype(numpy.float64), 3000, workers=workers)
+                self.assertEqual(decoded.tobytes(), expected.tobytes())
+        finally:
+            data_stream._ascii_parse = parse
+
+    def test_file(self):
+        with AmiraFile(os.path.join(TEST_DATA_PATH, 'BinaryCustomLandmarks.elm'), load_streams='lazy') as af:
+            for stream in af.header._data_streams_block_list:
+                stream.read()
+                expected = numpy.fromstring(stream._stream_data, dtype=data_stream._type_map[stream.type],
+                                            sep="\n \t").reshape(stream.data_shape)
+                self.assertTrue(numpy.array_equal(stream.load(workers=4), expected))
+
+    def test_workers(self):
+        """Only the caller's workers parse in parallel; by default and in a pool of data streams one thread does"""
+        pools = []
+        thread_pool = data_stream.ThreadPool
+
+        def counting_pool(processes):
+            pools.append(processes)
+            return thread_pool(processes)
+
+        text = b' '.join(str(i).encode('ASCII') for i in range(1000))
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryCustomLandmarks.elm')
+        data_stream.ThreadPool = counting_pool
+        try:
+            decoded = data_stream.ascii_decode(text, numpy.dtype(numpy.int32), 1000)
+            self.assertTrue(numpy.array_equal(decoded, numpy.arange(1000)))
+            self.assertEqual(pools, [])
+            decoded = data_stream.ascii_decode(text, numpy.dtype(numpy.int32), 1000, workers=3)
+            self.assertTrue(numpy.array_equal(decoded, numpy.arange(1000)))
+            self.assertEqual(pools, [3])
+            # both data streams on a pool of two threads and each parsed on its thread
+            del pools[:]
+            AmiraFile(fn, workers=3)
+            self.assertEqual(pools, [2])
+            # a single data stream parsed on the threads
+            del pools[:]
+            with AmiraFile(fn, load_streams=False) as af:
+                data_stream.load_data_streams(af.header._data_streams_block_list[:1], workers=3)
+                self.assertEqual(pools, [3])
+        finally:
+            data_stream.ThreadPool = thread_pool
+
+
+def _shared_sum(shared):
+    """Function run in another process with a SharedArray"""
+    with shared:
+        return float(shared.array.sum())
+
+
+@unittest.skipIf(data_stream.shared_memory is None, "no multiprocessing.shared_memory")
+class TestSharedMemory(unittest.TestCase):
+    def test_to_shared_memory(self):
+        for fn, name in [('test9.am', 'Labels'), ('testvector2c.am', 'Data')]:
+            path = os.path.join(TEST_DATA_PATH, fn)
+            data = getattr(AmiraFile(path).data_streams, name).data
+            for load_streams in ['lazy', True]:
+                with AmiraFile(path, load_streams=load_streams) as af:
+                    shared = getattr(af.data_streams, name).to_shared_memory()
+                try:
+                    self.assertEqual(shared.shape, data.shape)
+                    self.assertEqual(shared.dtype, data.dtype)
+                    self.assertTrue(numpy.array_equal(shared.array, data))
+                    # unpickling attaches to the same memory
+                    attached = pickle.loads(pickle.dumps(shared))
+                    self.assertEqual(attached.name, shared.name)
+                    attached.array[0] = 0
+                    self.assertFalse(shared.array[0].any())
+                    attached.close()
+                finally:
+                    shared.close()
+                    shared.unlink()
+
+    def test_process(self):
+        with AmiraFile(os.path.join(TEST_DATA_PATH, 'testvector2c.am'), load_streams='lazy') as af:
+            stream = af.data_streams.Data
+            with stream.to_shared_memory() as shared:
+                pool = multiprocessing.Pool(2)
+                try:
+                    self.assertEqual(pool.map(_shared_sum, [shared, shared]), [float(shared.array.sum())] * 2)
+                finally:
+                    pool.close()
+                    pool.join()
+                shared.unlink()
@@ -2,9 +2,14 @@
 from __future__ import print_function
 
 import os
+import threading
 import unittest
 
+from simpleparse.parser import Parser
+
 from ahds import grammar
+from ahds.proc import AmiraDispatchProcessor
+from ahds.source import BufferSource
 from ahds.tests import TEST_DATA_PATH
 
 
@@ -24,4 +29,99 @@ class TestGrammar(unittest.TestCase):
     def test_parse_header(self):
         self.assertTrue(len(self.parsed_header) > 0)
 
+    def test_get_stream_offsets(self):
+        """Test that stream offsets are independent of the chunk size used for scanning"""
+        fn = os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am')
+        file_format = grammar.detect_format(fn)
+        header = grammar.get_header(fn, file_format)
+        indices = list(range(1, 501))
+        offsets = grammar.get_stream_offsets(fn, len(header), indices)
+        self.assertEqual(len(offsets), 500)
+        # a small chunk size forces markers to straddle chunk boundaries
+        self.assertEqual(grammar.get_stream_offsets(fn, len(header), indices, chunk_bytes=7), offsets)
+        with open(fn, 'rb') as f:
+            data = f.read()
+        for index, (offset, length) in offsets.items():
+            self.assertEqual(data[offset - len(str(index)) - 3:offset], "\n@{}\n".format(index).encode('ASCII'))
+            # each column holds 62 big-endian floats
+            self.assertEqual(length, 62 * 4)
+
+    def test_get_stream_offsets_reads(self):
+        """Test that locating the data streams reads each byte of the data section about once"""
+        header = b'# AmiraMesh BINARY-LITTLE-ENDIAN 2.1\n\n'
+        streams = [(index, b'x' * (index % 7 * 100 + 50)) for index in range(1, 2001)]
+        data = header + b''.join(b'\n@' + str(index).encode('ASCII') + b'\n' + payload for index, payload in streams)
+        source = _CountingSource(data)
+        offsets = grammar.get_stream_offsets(source, len(header), [index for index, _ in streams],
+                                             chunk_bytes=1 << 16)
+        self.assertEqual(offsets[1000][1], len(streams[999][1]))
+        self.assertEqual(len(offsets), len(streams))
+        self.assertLess(source.count, len(data) + 1024)
+        # with the lengths known only the markers are read
+        source = _CountingSource(data)
+        stream_lengths = dict((index, len(payload)) for index, payload in streams)
+        self.assertEqual(grammar.get_stream_offsets(source, len(header), list(stream_lengths), stream_lengths,
+                                                    chunk_bytes=1024), offsets)
+        self.assertLess(source.count, len(streams) * 16 + 1024)
+
+
+class _CountingSource(BufferSource):
+    """A source which counts the bytes read"""
+
+    def __init__(self, data):
+        super(_CountingSource, self).__init__(data)
+        self.count = 0
+
+    def read_at(self, offset, length=-1):
+        data = super(_CountingSource, self).read_at(offset, length)
+        self.count += len(data)
+        return data
+
+
+
+class TestParserReuse(unittest.TestCase):
+    def test_reuse(self):
+        grammar.warm()
+        parser, processor = grammar.get_parser(), grammar.get_processor()
+        grammar.warm()
+        self.assertIs(grammar.get_parser(), parser)
+        self.assertIs(grammar.get_processor(), processor)
+        self.assertIsInstance(processor, AmiraDispatchProcessor)
+
+    def test_parse_header(self):
+        """Test that the reused tag table parses the same as a freshly compiled parser"""
+        for fn in ['testscalar.am', 'test9.am', 'BinaryHxSpreadSheet62x200.am', 'test7.surf']:
+            path = os.path.join(TEST_DATA_PATH, fn)
+            header = grammar.get_header(path, grammar.detect_format(path))
+            success, expected, _ = Parser(grammar.amira_header_grammar).parse(
+                header, production='amira', processor=AmiraDispatchProcessor())
+            self.assertTrue(success)
+            self.assertEqual(repr(grammar.parse_header(header)), repr(expected))
+
+    def test_threads(self):
+        """Test that the grammar is compiled once by concurrent first uses"""
+        saved = grammar._parser, grammar._processor, grammar._tagger
+        grammar._parser = grammar._processor = grammar._tagger = None
+        compiled = []
+        parser_class = grammar.Parser
+
+        def counting_parser(*args, **kwargs):
+            compiled.append(1)
+            return parser_class(*args, **kwargs)
 
+        header = grammar.get_header(os.path.join(TEST_DATA_PATH, 'testscalar.am'), 'AmiraMesh')
+        results = []
+        grammar.Parser = counting_parser
+        try:
+            threads = [threading.Thread(target=lambda: results.append(repr(grammar.parse_header(header))))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            grammar.Parser = parser_class
+            grammar._parser, grammar._processor, grammar._tagger = saved
+        self.assertEqual(len(compiled), 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(results)), 1)
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import gzip
 import os
+import shutil
 import sys
+import tempfile
 
-from ahds import header
+from ahds import header, source
 from ahds.tests import Py23FixTestCase, TEST_DATA_PATH
 
 
@@ -26,3 +29,101 @@ class TestHeaderBlock(Py23FixTestCase):
         self.assertTrue(hasattr(self.header, 'Parameters'))
         self.assertTrue(hasattr(self.header.Parameters, 'Materials'))
         self.assertCountEqual(self.header.Parameters.Materials.ids, [3])
+
+    def test_stream_offsets(self):
+        """Test that the header locates its data streams"""
+        self.assertIsNone(self.header._stream_offsets)
+        offsets = self.header.stream_offsets
+        self.assertCountEqual(offsets.keys(), [1])
+        offset, length = offsets[1]
+        self.assertTrue(offset > len(self.header))
+        self.assertTrue(length >= 0)
+
+    def test_stream_length(self):
+        """Test that the length of uncompressed binary data streams follows from their shape"""
+        ah = header.AmiraHeader(os.path.join(TEST_DATA_PATH, 'BinaryHxSpreadSheet62x200.am'))
+        for ds in ah._data_streams_block_list:
+            self.assertEqual(ds.stream_length, 62 * 4)
+            self.assertEqual(ah.stream_offsets[int(ds.data_index)][1], 62 * 4)
+
+
+class TestCompressedHeader(Py23FixTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.tmp_dir, 'test9.am.gz')
+        with open(os.path.join(TEST_DATA_PATH, 'test9.am'), 'rb') as f, gzip.open(self.fn, 'wb') as g:
+            shutil.copyfileobj(f, g)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_kept_open(self):
+        """Test that a standalone header keeps a compressed file open instead of decompressing it for each read"""
+        ah = header.AmiraHeader(self.fn, load_streams=False)
+        self.assertIsInstance(ah._source, source.CompressedSource)
+        compressed_source = ah._source
+        opened = []
+        open_source = source.open_source
+
+        def counting_open_source(fn):
+            opened.append(fn)
+            return open_source(fn)
+
+        source.open_source = counting_open_source
+        try:
+            offset, length = ah.stream_offsets[1]
+            self.assertEqual(len(ah.read_at(offset, 100)), 100)
+            self.assertEqual(len(ah.read_at(offset + length - 100, 100)), 100)
+        finally:
+            source.open_source = open_source
+        self.assertEqual(opened, [])
+        self.assertIs(ah._source, compressed_source)
+        ah.close()
+        self.assertTrue(compressed_source.closed)
+        # other files are opened for each read
+        self.assertIsNone(header.AmiraHeader(os.path.join(TEST_DATA_PATH, 'test9.am'), load_streams=False)._source)
+
+
+class TestPeek(Py23FixTestCase):
+    def test_amira_mesh(self):
+        fn = os.path.join(TEST_DATA_PATH, 'test12.am')
+        record = header.peek(fn)
+        ah = header.AmiraHeader(fn, load_streams=False)
+        self.assertEqual(
+            (record.filetype, record.format, record.endian, record.version, record.dimension),
+            (ah.filetype, ah.format, ah.endian, ah.version, ah.dimension))
+        self.assertEqual(record.header_length, len(ah))
+        self.assertEqual(dict(record.arrays), {'Lattice': (280, 286, 319)})
+        self.assertEqual(len(record.streams), 1)
+        stream = record.streams[0]
+        self.assertEqual((stream.name, stream.data_index, stream.type, stream.format, stream.data_length),
+                         ('Labels', 1, 'byte', 'HxByteRLE', 404583))
+        self.assertEqual(stream.shape, (280, 286, 319))
+        self.assertEqual([tuple(material) for material in record.materials],
+                         [('Exterior', None), ('Inside', None), ('Spikes', 3)])
+
+    def test_streams(self):
+        for fn in ['BinaryHxSpreadSheet62x200.am', 'testvector2c.am', 'FieldOnTetraMesh.am']:
+            path = os.path.join(TEST_DATA_PATH, fn)
+            ah = header.AmiraHeader(path, load_streams=False)
+            streams = dict()
+            for stream in header.peek(path).streams:
+                streams.setdefault(stream.data_index, stream)
+            self.assertEqual(
+                [(ds.name, ds.type, ds.format, ds.data_shape) for ds in ah._data_streams_block_list],
+                [(stream.name, stream.type, stream.format, stream.shape) for _, stream in sorted(streams.items())])
+
+    def test_hyper_surface(self):
+        record = header.peek(os.path.join(TEST_DATA_PATH, 'test7.surf'))
+        self.assertEqual((record.filetype, record.format, record.endian), ('HyperSurface', 'BINARY', 'BIG'))
+        self.assertEqual(record.streams, ())
+        self.assertEqual(record.materials[1], ('Background', 1))
+
+    def test_no_stream_read(self):
+        """Test that only the header is read"""
+        with open(os.path.join(TEST_DATA_PATH, 'test9.am'), 'rb') as f:
+            data = f.read()
+        header_length = header.peek(data).header_length
+        # the data after the header may be anything
+        record = header.peek(data[:header_length] + b'\n@1\n')
+        self.assertEqual(record.streams[0].shape, (284, 284, 284))
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import io
+import os
+
+import numpy
+
+from ahds import source
+from ahds.tests import Py23FixTestCase, TEST_DATA_PATH
+
+
+class TestSource(Py23FixTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fn = os.path.join(TEST_DATA_PATH, 'testscalar.am')
+        with open(cls.fn, 'rb') as f:
+            cls.data = f.read()
+
+    def _check(self, src):
+        self.assertEqual(src.size, len(self.data))
+        self.assertEqual(src.read_at(0, 11), self.data[:11])
+        self.assertEqual(src.read_at(100, 50), self.data[100:150])
+        self.assertEqual(src.read_at(len(self.data) - 5), self.data[-5:])
+        self.assertEqual(src.read_at(len(self.data) + 5, 10), b'')
+        # into arrays of any item size and fewer bytes at the end
+        out = numpy.zeros((2, 3), dtype=numpy.float32)
+        self.assertEqual(src.read_into(100, out), 24)
+        self.assertEqual(out.tobytes(), self.data[100:124])
+        self.assertEqual(src.read_into(len(self.data) - 5, out), 5)
+        self.assertEqual(out.tobytes()[:5], self.data[-5:])
+        self.assertEqual(src.read_into(len(self.data) + 5, out), 0)
+
+    def test_file_source(self):
+        with source.open_source(self.fn) as src:
+            self.assertIsInstance(src, source.FileSource)
+            self.assertEqual(src.name, self.fn)
+            self._check(src)
+            self.assertIsInstance(src.map_array(4, (2, 3), numpy.uint8), numpy.memmap)
+        self.assertTrue(src.closed)
+        with self.assertRaises(ValueError):
+            src.read_at(0, 1)
+
+    def test_buffer_source(self):
+        for data in [self.data, bytearray(self.data), memoryview(self.data),
+                     numpy.frombuffer(self.data, dtype=numpy.uint8).reshape(1, -1)]:
+            src = source.open_source(data)
+            self.assertIsInstance(src, source.BufferSource)
+            self.assertIsNone(src.name)
+            self._check(src)
+            array = src.map_array(4, (2, 3), numpy.uint8)
+            self.assertEqual(array.tobytes(), self.data[4:10])
+            self.assertFalse(array.flags.writeable)
+
+    def test_file_object_source(self):
+        src = source.open_source(io.BytesIO(self.data))
+        self.assertIsInstance(src, source.FileObjectSource)
+        self._check(src)
+        self.assertIsNone(src.map_array(4, (2, 3), numpy.uint8))
+        with open(self.fn, 'rb') as f:
+            src = source.open_source(f)
+            self.assertEqual(src.name, self.fn)
+            self._check(src)
+            src.close()
+            # the file object belongs to the caller
+            self.assertFalse(f.closed)
+
+    def test_opened(self):
+        src = source.open_source(self.data)
+        with source.opened(src) as _src:
+            self.assertIs(_src, src)
+        self.assertFalse(src.closed)
+        with source.opened(self.fn) as _src:
+            self.assertIsInstance(_src, source.FileSource)
+        self.assertTrue(_src.closed)
+
+    def test_unsupported(self):
+        with self.assertRaises(TypeError):
+            source.open_source(1.5)
+
+
+class TestCompressedSource(Py23FixTestCase):
+    @classmethod
+    def setUpClass(cls):
+        import bz2
+        import gzip
+        import zlib
+        with open(os.path.join(TEST_DATA_PATH, 'test9.am'), 'rb') as f:
+            cls.data = f.read()
+        # gzip.compress is missing from Python2
+        gzip_compress = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        cls.compressed = {
+            'gzip': gzip_compress.compress(cls.data) + gzip_compress.flush(),
+            'bzip2': bz2.compress(cls.data),
+        }
+        try:
+            import lzma
+            cls.compressed['xz'] = lzma.compress(cls.data)
+        except ImportError:
+            pass
+
+    def setUp(self):
+        self.block_size = source.CompressedSource.BLOCK_SIZE
+        self.checkpoint_span = source.CompressedSource.CHECKPOINT_SPAN
+        source.CompressedSource.BLOCK_SIZE = 4000
+        source.CompressedSource.CHECKPOINT_SPAN = 40000
+
+    def tearDown(self):
+        source.CompressedSource.BLOCK_SIZE = self.block_size
+        source.CompressedSource.CHECKPOINT_SPAN = self.checkpoint_span
+
+    def _check(self, src):
+        self.assertEqual(src.size, len(self.data))
+        # backwards, forwards and across blocks
+        for offset, length in [(len(self.data) - 100, 50), (0, 11), (123456, 54321), (5, 30000), (299999, -1)]:
+            if length < 0:
+                self.assertEqual(src.read_at(offset), self.data[offset:])
+            else:
+                self.assertEqual(src.read_at(offset, length), self.data[offset:offset + length])
+        self.assertEqual(src.read_at(len(self.data) + 5, 10), b'')
+        # into arrays of any item size and fewer bytes at the end
+        out = numpy.zeros((2, 3), dtype=numpy.float32)
+        self.assertEqual(src.read_into(100, out), 24)
+        self.assertEqual(out.tobytes(), self.data[100:124])
+        self.assertEqual(src.read_into(len(self.data) - 5, out), 5)
+        self.assertEqual(out.tobytes()[:5], self.data[-5:])
+        self.assertEqual(src.read_into(len(self.data) + 5, out), 0)
+
+    def test_compressed(self):
+        for compression, data in self.compressed.items():
+            src = source.open_source(data)
+            self.assertIsInstance(src, source.CompressedSource)
+            self.assertEqual(src.compression, compression)
+            self._check(src)
+            src = source.open_source(io.BytesIO(data))
+            self.assertIsInstance(src, source.CompressedSource)
+            self._check(src)
+
+    def test_multiple_streams(self):
+        """Test that concatenated (and zero padded gzip) streams are read as one and used as checkpoints"""
+        import bz2
+        half = len(self.data) // 2
+        src = source.open_source(bz2.compress(self.data[:half]) + bz2.compress(self.data[half:]))
+        self._check(src)
+        self.assertIn(half, [checkpoint[0] for checkpoint in src._checkpoints])
+        gzipped = self.compressed['gzip']
+        src = source.open_source(gzipped + b'\x00' * 10 + gzipped)
+        self.assertEqual(src.read_at(0), self.data + self.data)
+
+    def test_gzip_checkpoints(self):
+        src = source.open_source(self.compressed['gzip'])
+        self._check(src)
+        self.assertGreater(len(src._checkpoints), 5)
+
+    def test_truncated(self):
+        for data in self.compressed.values():
+            with self.assertRaises(ValueError):
+                source.open_source(data[:len(data) // 2]).read_at(0)
@@ -18,9 +18,16 @@ open /Library/Developer/CommandLineTools/Packages/macOS_SDK_headers_for_macOS_10
 
 Credits: https://blog.driftingruby.com/updated-to-mojave/
 """
+# the index of access points into HxZip streams needs zlib which is not linked on Windows
+if sys.platform == 'win32':
+    decoders_zlib = dict()
+else:
+    decoders_zlib = dict(libraries=['z'], define_macros=[('AHDS_ZLIB', None)])
+
 decoders = Extension(
     'ahds.decoders',
     sources=['src/decodersmodule.cpp'],
+    **decoders_zlib
 )
 
 here = os.path.abspath(os.path.dirname(__file__))
@@ -13,6 +13,15 @@
 #define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION // to avoid complaint
 #include <numpy/arrayobject.h> // the numpy array object definitions
 
+#include <ctype.h>
+#include <errno.h>
+#include <stdlib.h>
+
+#ifdef AHDS_ZLIB
+#include <limits.h>
+#include <zlib.h>
+#endif
+
 // typedefs
 typedef unsigned long ulong;
 typedef unsigned char uchar;
@@ -40,13 +49,28 @@ static struct module_state _state;
 
 // prototypes
 static PyObject *decoders_byterle_decode(PyObject *, PyObject *);
+static PyObject *decoders_byterle_decode_into(PyObject *, PyObject *);
+static PyObject *decoders_byterle_build_index(PyObject *, PyObject *);
+static PyObject *decoders_ascii_count(PyObject *, PyObject *);
+static PyObject *decoders_ascii_decode_into(PyObject *, PyObject *);
+#ifdef AHDS_ZLIB
+static PyObject *decoders_hxzip_build_index(PyObject *, PyObject *);
+#endif
+static int ascii_fast(const uchar *, Py_ssize_t, char, double *, long long *);
+static int ascii_word(const uchar *, Py_ssize_t, char, char *);
 static void get_multiple(uchar *, uchar *, ulong, ulong);
-static void set_multiple_diff(uchar *, uchar *, ulong, ulong);
 static void set_multiple_same(uchar *, uchar, ulong, ulong);
 
 // methods in this module
 static PyMethodDef HxMethods[] = {
 	{"byterle_decoder", (PyCFunction)decoders_byterle_decode, METH_VARARGS, "Decode byte RLE stream."},
+	{"byterle_decode_into", (PyCFunction)decoders_byterle_decode_into, METH_VARARGS, "Decode part of a byte RLE stream into a buffer."},
+	{"byterle_build_index", (PyCFunction)decoders_byterle_build_index, METH_VARARGS, "Build an index of run boundaries in a byte RLE stream."},
+	{"ascii_count", (PyCFunction)decoders_ascii_count, METH_VARARGS, "Count the whitespace separated words of ASCII data."},
+	{"ascii_decode_into", (PyCFunction)decoders_ascii_decode_into, METH_VARARGS, "Parse the whitespace separated numbers of ASCII data into a buffer."},
+#ifdef AHDS_ZLIB
+	{"hxzip_build_index", (PyCFunction)decoders_hxzip_build_index, METH_VARARGS, "Build an index of access points into a zlib stream."},
+#endif
 	{NULL, NULL, 0, NULL}
 };
 
@@ -117,13 +141,21 @@ decoders_byterle_decode(PyObject *self, PyObject *args)
 	if (!PyArg_ParseTuple(args, "s#k", &input, &input_size, &output_size))
 		return NULL;
 
-	uchar *output = PyMem_New(uchar, output_size);
+	int nd=1;
+	npy_intp dims[1] = {static_cast<npy_intp>(output_size)};
+	// the array owns its memory so that it is freed with the array
+	PyObject *output_array = PyArray_ZEROS(nd, dims, NPY_UINT8, 0);
+	if (output_array == NULL)
+		return NULL;
+	uchar *output = (uchar *)PyArray_DATA((PyArrayObject *)output_array);
 	ulong i=0, j=0;
 	int count=1, repeat=0; // count/repeat: true = 1; false = 0
 	uchar no=0;
 
+	// the input and output buffers are not touched by Python while decoding so other threads may run
+	Py_BEGIN_ALLOW_THREADS
 	// two state machine that oscillates between getting counts and getting data
-	while (i < input_size) { // while we still have some input
+	while (i < input_size && j < output_size) { // while we still have some input and room for output
 		if (count) { // get count
 			no = input[i];
 			// determine if this is a repeat or a non-repeat
@@ -138,19 +170,19 @@ decoders_byterle_decode(PyObject *self, PyObject *args)
 				count = 0;
 				repeat = 0;
 			}
+			// runs of a truncated or corrupt stream must not overrun either buffer
+			if (no > output_size - j)
+				no = (uchar)(output_size - j);
+			if (repeat && no > input_size - i)
+				no = (uchar)(input_size - i);
 		}
 		else { // get data
 			if (repeat) {
-				if (no > 0) {
-					uchar *value = (uchar *)malloc(no*sizeof(uchar));
-					get_multiple(input, value, i, i+no);
-					repeat = 0;
-					count = 1;
-					set_multiple_diff(output, value, j, j+no);
-					free(value);
-					i += no;
-					j += no;
-				}
+				get_multiple(input, output + j, i, i+no);
+				repeat = 0;
+				count = 1;
+				i += no;
+				j += no;
 			}
 			else {
 				uchar value;
@@ -163,32 +195,509 @@ decoders_byterle_decode(PyObject *self, PyObject *args)
 			}
 		}
 	}
+	Py_END_ALLOW_THREADS
 
-	int nd=1;
-	npy_intp dims[1] = {static_cast<npy_intp>(j)};
-	// create a numpy array using the buffer as the data source
-	PyObject *output_array = PyArray_SimpleNewFromData(nd, dims, NPY_UINT8, output);
-	Py_INCREF(output_array); // ... because it will be managed from Python
+	if (j < output_size) {
+		// a short stream yields only as many values as were decoded
+		PyObject *short_array = PySequence_GetSlice(output_array, 0, (Py_ssize_t)j);
+		Py_DECREF(output_array);
+		return short_array;
+	}
 	return output_array;
 }
 
-static void
-get_multiple(uchar *input, uchar *value, ulong start_index, ulong end_index)
+/*
+ * Resumable byte RLE decoding
+ *
+ * Decodes as much of the input as fits into the writable output buffer. Runs may be split across
+ * calls in both the input and the output; the position within the current run is kept in the state
+ * tuple (mode, remaining, value) which is returned and passed to the next call.
+ *
+ * mode: 0 = expecting a count byte, 1 = copying `remaining` literal bytes,
+ *       2 = expecting the byte to repeat `remaining` times, 3 = repeating `value` `remaining` more times
+ *
+ * Python usage: produced, consumed, state = decoders.byterle_decode_into(input, output[, state])
+ */
+static PyObject *
+decoders_byterle_decode_into(PyObject *self, PyObject *args)
 {
-	ulong i;
+	Py_buffer input, output;
+	int mode=0, value=0;
+	Py_ssize_t remaining=0;
 
-	for (i=0; i < end_index - start_index; i++) {
-		value[i] = input[i + start_index];
+	if (!PyArg_ParseTuple(args, "s*w*|(ini)", &input, &output, &mode, &remaining, &value))
+		return NULL;
+
+	uchar *in = (uchar *)input.buf, *out = (uchar *)output.buf;
+	Py_ssize_t input_size = input.len, output_size = output.len;
+	Py_ssize_t i=0, j=0, n;
+
+	Py_BEGIN_ALLOW_THREADS
+	for (;;) {
+		if (mode == 0) { // get count
+			if (i >= input_size || j >= output_size)
+				break;
+			uchar no = in[i++];
+			remaining = no & 0x7f;
+			mode = no > 127 ? 1 : 2;
+		}
+		else if (mode == 1) { // copy literal bytes
+			n = remaining;
+			if (n > output_size - j) n = output_size - j;
+			if (n > input_size - i) n = input_size - i;
+			memcpy(out + j, in + i, n);
+			i += n;
+			j += n;
+			remaining -= n;
+			if (remaining == 0)
+				mode = 0;
+			else
+				break; // out of input or output
+		}
+		else if (mode == 2) { // get the value to repeat
+			if (i >= input_size)
+				break;
+			value = in[i++];
+			mode = 3;
+		}
+		else { // repeat value
+			n = remaining;
+			if (n > output_size - j) n = output_size - j;
+			memset(out + j, value, n);
+			j += n;
+			remaining -= n;
+			if (remaining == 0)
+				mode = 0;
+			else
+				break; // out of output
+		}
 	}
+	Py_END_ALLOW_THREADS
+
+	PyBuffer_Release(&input);
+	PyBuffer_Release(&output);
+	return Py_BuildValue("nn(ini)", j, i, mode, remaining, value);
+}
+
+/*
+ * Index of run boundaries in a byte RLE stream
+ *
+ * Only the count bytes are visited so the stream is not decoded. A run boundary is recorded as a tuple
+ * (in, out) at the first run to start at least `span` bytes of output after the previous one; decoding
+ * can be restarted with byterle_decode_into from byte `in` of the input to produce the output from byte
+ * `out` onwards. The first point is always (0, 0).
+ *
+ * Python usage: points = decoders.byterle_build_index(input, span)
+ */
+static PyObject *
+decoders_byterle_build_index(PyObject *self, PyObject *args)
+{
+	Py_buffer input;
+	Py_ssize_t span;
+
+	if (!PyArg_ParseTuple(args, "s*n", &input, &span))
+		return NULL;
+
+	PyObject *points = PyList_New(0);
+	if (points == NULL) {
+		PyBuffer_Release(&input);
+		return NULL;
+	}
+
+	uchar *in = (uchar *)input.buf;
+	Py_ssize_t input_size = input.len, i=0;
+	unsigned long long j=0, last=0;
+	int first=1;
+
+	while (i < input_size) {
+		if (first || j - last >= (unsigned long long)span) {
+			PyObject *point = Py_BuildValue("(nK)", i, j);
+			if (point == NULL || PyList_Append(points, point) < 0) {
+				Py_XDECREF(point);
+				Py_DECREF(points);
+				PyBuffer_Release(&input);
+				return NULL;
+			}
+			Py_DECREF(point);
+			last = j;
+			first = 0;
+		}
+		uchar no = in[i++];
+		if (no > 127) { // literal bytes follow the count
+			i += no & 0x7f;
+			j += no & 0x7f;
+		}
+		else { // a single byte to repeat follows the count
+			i++;
+			j += no;
+		}
+	}
+
+	PyBuffer_Release(&input);
+	return points;
+}
+
+#ifdef AHDS_ZLIB
+#define WINDOW_SIZE 32768 // the size of the deflate window
+
+#if PY_MAJOR_VERSION >= 3
+#define BYTES_FORMAT "y#"
+#else
+#define BYTES_FORMAT "s#"
+#endif
+
+/*
+ * Index of access points into a zlib (HxZip) stream
+ *
+ * Decompresses the whole stream and records an access point at the first deflate block boundary after
+ * every `span` bytes of output (after the approach of zran.c in the zlib distribution). Each access point is
+ * a tuple (in, bits, out, window): decompression can be restarted at byte `in` of the compressed stream
+ * preceded by the high `bits` bits of byte `in - 1` (raw deflate) with the preceding 32 KiB of output
+ * `window` as dictionary, producing the output from byte `out` onwards.
+ *
+ * Python usage: points = decoders.hxzip_build_index(input, span)
+ */
+static PyObject *
+decoders_hxzip_build_index(PyObject *self, PyObject *args)
+{
+	Py_buffer input;
+	Py_ssize_t span;
+
+	if (!PyArg_ParseTuple(args, "s*n", &input, &span))
+		return NULL;
+
+	PyObject *points = PyList_New(0);
+	if (points == NULL) {
+		PyBuffer_Release(&input);
+		return NULL;
+	}
+
+	uchar window[WINDOW_SIZE], point_window[WINDOW_SIZE];
+	memset(window, 0, WINDOW_SIZE);
+	z_stream strm;
+	memset(&strm, 0, sizeof(strm));
+	int ret = inflateInit2(&strm, 47); // zlib or gzip header
+	if (ret != Z_OK) {
+		PyBuffer_Release(&input);
+		Py_DECREF(points);
+		PyErr_SetString(PyExc_MemoryError, "unable to initialise zlib");
+		return NULL;
+	}
+
+	uchar *next_in = (uchar *)input.buf;
+	Py_ssize_t input_left = input.len;
+	unsigned long long total_in = 0, total_out = 0, last = 0;
+	int failed = 0;
+
+	do {
+		if (strm.avail_in == 0) {
+			if (input_left == 0) { // the stream is truncated
+				ret = Z_DATA_ERROR;
+				break;
+			}
+			strm.next_in = next_in;
+			strm.avail_in = input_left > UINT_MAX ? UINT_MAX : (uInt)input_left;
+			next_in += strm.avail_in;
+			input_left -= strm.avail_in;
+		}
+		do {
+			if (strm.avail_out == 0) {
+				strm.avail_out = WINDOW_SIZE;
+				strm.next_out = window;
+			}
+			total_in += strm.avail_in;
+			total_out += strm.avail_out;
+			Py_BEGIN_ALLOW_THREADS
+			ret = inflate(&strm, Z_BLOCK); // stop at the end of each deflate block
+			Py_END_ALLOW_THREADS
+			total_in -= strm.avail_in;
+			total_out -= strm.avail_out;
+			if (ret == Z_NEED_DICT || ret == Z_BUF_ERROR)
+				ret = Z_DATA_ERROR;
+			if (ret == Z_MEM_ERROR || ret == Z_DATA_ERROR)
+				break;
+			if (ret == Z_STREAM_END)
+				break;
+			// at the end of a block that is not the last block
+			if ((strm.data_type & 128) && !(strm.data_type & 64) && (total_out == 0 || total_out - last > (unsigned long long)span)) {
+				// the window is circular; put it in order
+				unsigned left = strm.avail_out;
+				if (left)
+					memcpy(point_window, window + WINDOW_SIZE - left, left);
+				if (left < WINDOW_SIZE)
+					memcpy(point_window + left, window, WINDOW_SIZE - left);
+				PyObject *point = Py_BuildValue("(KiK" BYTES_FORMAT ")", total_in, strm.data_type & 7, total_out,
+				                                point_window, (Py_ssize_t)WINDOW_SIZE);
+				if (point == NULL || PyList_Append(points, point) < 0) {
+					Py_XDECREF(point);
+					failed = 1;
+					break;
+				}
+				Py_DECREF(point);
+				last = total_out;
+			}
+		} while (strm.avail_in != 0);
+	} while (!failed && ret != Z_STREAM_END && ret != Z_MEM_ERROR && ret != Z_DATA_ERROR);
+
+	inflateEnd(&strm);
+	PyBuffer_Release(&input);
+	if (failed) {
+		Py_DECREF(points);
+		return NULL;
+	}
+	if (ret != Z_STREAM_END) {
+		Py_DECREF(points);
+		PyErr_SetString(PyExc_ValueError, ret == Z_MEM_ERROR ? "out of memory decompressing stream" : "invalid or truncated zlib stream");
+		return NULL;
+	}
+	return points;
+}
+#endif
+
+/*
+ * Number of whitespace separated words in ASCII data
+ *
+ * Python usage: count = decoders.ascii_count(input)
+ */
+static PyObject *
+decoders_ascii_count(PyObject *self, PyObject *args)
+{
+	Py_buffer input;
+
+	if (!PyArg_ParseTuple(args, "s*", &input))
+		return NULL;
+
+	const uchar *in = (const uchar *)input.buf;
+	Py_ssize_t input_size = input.len, i, count=0;
+	int space=1;
+
+	Py_BEGIN_ALLOW_THREADS
+	for (i=0; i < input_size; i++) {
+		if (isspace(in[i]))
+			space = 1;
+		else if (space) {
+			space = 0;
+			count++;
+		}
+	}
+	Py_END_ALLOW_THREADS
+
+	PyBuffer_Release(&input);
+	return Py_BuildValue("n", count);
+}
+
+// the longest word parsed as a number; longer words end parsing
+#define ASCII_WORD_SIZE 64
+
+// the powers of ten which are exact doubles
+static const double ascii_powers[] = {
+	1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+	1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22
+};
+
+/*
+ * Parse a short decimal number of ASCII data without strtod/strtoll
+ *
+ * Floats of at most 15 significant digits with a decimal exponent of at most 22 are exact: the digits and
+ * the power of ten are both exact doubles so a single multiplication or division rounds correctly and gives
+ * the double strtod gives. Integers of at most 18 digits fit into a long long. Returns 0 for any other word
+ * which is then parsed by strtod/strtoll.
+ */
+static int
+ascii_fast(const uchar *in, Py_ssize_t size, char kind, double *real, long long *integer)
+{
+	Py_ssize_t i=0;
+	int negative=0, digits=0, significant=0, exponent=0, point=0;
+	unsigned long long mantissa=0;
+
+	if (i < size && (in[i] == '+' || in[i] == '-')) {
+		if (kind == 'u')
+			return 0;
+		negative = in[i++] == '-';
+	}
+	for (; i < size; i++) {
+		if (in[i] >= '0' && in[i] <= '9') {
+			digits++;
+			if (point)
+				exponent--;
+			if (mantissa == 0 && in[i] == '0') // leading zeros
+				continue;
+			if (++significant > (kind == 'f' ? 15 : 18))
+				return 0;
+			mantissa = mantissa * 10 + (in[i] - '0');
+		}
+		else if (in[i] == '.' && kind == 'f' && !point)
+			point = 1;
+		else
+			break;
+	}
+	if (!digits)
+		return 0;
+	if (i < size && kind == 'f' && (in[i] == 'e' || in[i] == 'E')) {
+		int sign=1, value=0, exponent_digits=0;
+		if (++i < size && (in[i] == '+' || in[i] == '-'))
+			sign = in[i++] == '-' ? -1 : 1;
+		for (; i < size && in[i] >= '0' && in[i] <= '9'; i++) {
+			if (++exponent_digits > 4)
+				return 0;
+			value = value * 10 + (in[i] - '0');
+		}
+		if (!exponent_digits)
+			return 0;
+		exponent += sign * value;
+	}
+	if (i != size)
+		return 0;
+	if (kind == 'f') {
+		double value = (double)mantissa;
+		if (mantissa != 0) {
+			if (exponent < -22 || exponent > 22)
+				return 0;
+			value = exponent < 0 ? value / ascii_powers[-exponent] : value * ascii_powers[exponent];
+		}
+		*real = negative ? -value : value;
+	}
+	else
+		*integer = negative ? -(long long)mantissa : (long long)mantissa;
+	return 1;
+}
+
+/*
+ * Copy a word of ASCII data into the NUL-terminated `word` if it only holds the characters of a decimal
+ * number of the `kind` of the output: digits, a sign (except for unsigned integers) and for floats a decimal
+ * point and an exponent or the words inf, infinity or nan. Anything else (e.g. hexadecimal numbers which
+ * strtod reads and numpy does not, or negative NaN and unsigned integers which numpy reads in its own way)
+ * ends parsing so that it is left to numpy.
+ */
+static int
+ascii_word(const uchar *in, Py_ssize_t size, char kind, char *word)
+{
+	Py_ssize_t i, start=0;
+
+	if (size >= ASCII_WORD_SIZE)
+		return 0;
+	for (i=0; i < size; i++)
+		word[i] = (char)tolower(in[i]);
+	word[size] = '\0';
+	if (size > 0 && (word[0] == '+' || word[0] == '-')) {
+		if (kind == 'u')
+			return 0;
+		start = 1;
+	}
+	if (kind == 'f' && (!strcmp(word + start, "inf") || !strcmp(word + start, "infinity") ||
+			!strcmp(word, "nan") || !strcmp(word, "+nan")))
+		return 1;
+	for (i=start; i < size; i++) {
+		if (isdigit((uchar)word[i]))
+			continue;
+		if (kind != 'f' || !strchr("+-.e", word[i]))
+			return 0;
+	}
+	return 1;
+}
+
+/*
+ * Parse the whitespace separated numbers of ASCII data into a buffer without holding the GIL
+ *
+ * Each number is parsed as numpy.fromstring(input, dtype, sep=" ") parses it: by strtod converted to the
+ * type of the output for floats and by strtoll (or strtoull for 64-bit unsigned integers) converted to the
+ * type of the output for integers. Parsing stops once the output is full or at the first word which is not
+ * a number, numpy may read differently or is an integer out of the range of long long; `consumed` is the
+ * number of bytes of input parsed including the whitespace following the last number.
+ *
+ * kind: 'f' (float), 'i' (signed integer) or 'u' (unsigned integer) with itemsize 1, 2, 4 or 8 for items
+ *       in the native byte order
+ *
+ * Python usage: items, consumed = decoders.ascii_decode_into(input, output, kind, itemsize)
+ */
+static PyObject *
+decoders_ascii_decode_into(PyObject *self, PyObject *args)
+{
+	Py_buffer input, output;
+	const char *kinds;
+	int itemsize;
+
+	if (!PyArg_ParseTuple(args, "s*w*si", &input, &output, &kinds, &itemsize))
+		return NULL;
+	char kind = kinds[0];
+	if (!((kind == 'f' && (itemsize == 4 || itemsize == 8)) ||
+			((kind == 'i' || kind == 'u') && (itemsize == 1 || itemsize == 2 || itemsize == 4 || itemsize == 8)))) {
+		PyBuffer_Release(&input);
+		PyBuffer_Release(&output);
+		PyErr_SetString(PyExc_ValueError, "unsupported type of numbers");
+		return NULL;
+	}
+
+	const uchar *in = (const uchar *)input.buf;
+	char *out = (char *)output.buf;
+	Py_ssize_t input_size = input.len, count = output.len / itemsize, i=0, j=0, start;
+	char word[ASCII_WORD_SIZE], *end;
+	double real=0;
+	long long integer=0;
+
+	Py_BEGIN_ALLOW_THREADS
+	while (i < input_size && isspace(in[i]))
+		i++;
+	while (i < input_size && j < count) {
+		for (start=i; i < input_size && !isspace(in[i]); i++)
+			;
+		if (!ascii_fast(in + start, i - start, kind, &real, &integer)) {
+			if (!ascii_word(in + start, i - start, kind, word)) {
+				i = start;
+				break;
+			}
+			errno = 0;
+			if (kind == 'f')
+				real = strtod(word, &end);
+			else if (kind == 'u' && itemsize == 8)
+				integer = (long long)strtoull(word, &end, 10);
+			else
+				integer = strtoll(word, &end, 10);
+			if (end == word || *end != '\0' || (kind != 'f' && errno == ERANGE)) {
+				// e.g. a lone sign, a decimal point in the wrong place or an integer out of range
+				i = start;
+				break;
+			}
+		}
+		if (kind == 'f') {
+			if (itemsize == 4)
+				((float *)out)[j] = (float)real;
+			else
+				((double *)out)[j] = real;
+		}
+		else {
+			switch (itemsize) {
+			case 1:
+				if (kind == 'i') ((signed char *)out)[j] = (signed char)integer; else ((uchar *)out)[j] = (uchar)integer;
+				break;
+			case 2:
+				if (kind == 'i') ((short *)out)[j] = (short)integer; else ((unsigned short *)out)[j] = (unsigned short)integer;
+				break;
+			case 4:
+				if (kind == 'i') ((int *)out)[j] = (int)integer; else ((unsigned int *)out)[j] = (unsigned int)integer;
+				break;
+			default:
+				((long long *)out)[j] = integer;
+			}
+		}
+		j++;
+		while (i < input_size && isspace(in[i]))
+			i++;
+	}
+	Py_END_ALLOW_THREADS
+
+	PyBuffer_Release(&input);
+	PyBuffer_Release(&output);
+	return Py_BuildValue("nn", j, i);
 }
 
 static void
-set_multiple_diff(uchar *output, uchar *value, ulong start_index, ulong end_index)
+get_multiple(uchar *input, uchar *value, ulong start_index, ulong end_index)
 {
 	ulong i;
 
 	for (i=0; i < end_index - start_index; i++) {
-		output[i + start_index] = value[i];
+		value[i] = input[i + start_index];
 	}
 }
 